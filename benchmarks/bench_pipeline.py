@@ -0,0 +1,298 @@
+# benchmarks/bench_pipeline.py
+"""
+Benchmark the full analysis pipeline on synthetic videos.
+
+    python -m benchmarks.bench_pipeline --sizes 640x360 1280x720 --densities 4 16 \\
+        --seconds 20 --output before.json
+    python -m benchmarks.bench_pipeline ... --output after.json --compare before.json
+
+Every scenario (resolution x density) runs in a fresh interpreter so peak
+RSS is its own. Stages are timed separately with the deterministic
+stub detector:
+
+    decode     sampled frames read from the video      latency per frame
+    detect     stub detector on the decoded frames     latency per batch
+    aggregate  services.summarize_detections           latency per call
+    db_write   services.store_result (SQLite test DB)  latency per call
+    pipeline   extract_and_sample_frames end to end    per-stage PipelineStats
+
+The report is JSON: run metadata plus, per scenario, frames/s and
+p50/p95 latency per stage and peak RSS in MiB.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import mock
+
+from traffic_app.processing.frame_sampler import STRATEGIES, STRATEGY_GRAB
+
+ROOT = Path(__file__).resolve().parent.parent
+STAGES = ("decode", "detect", "aggregate", "db_write", "pipeline")
+# What one latency sample covers, per stage
+LATENCY_UNITS = {"decode": "frame", "detect": "batch", "aggregate": "call", "db_write": "call", "pipeline": "run"}
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(q / 100.0 * len(ordered))) - 1))]
+
+
+def stage_report(stage, frames, seconds, latencies):
+    """frames/s over all repeats, latency percentiles in milliseconds."""
+    return {
+        "latency_unit": LATENCY_UNITS[stage],
+        "frames": frames,
+        "seconds": round(seconds, 4),
+        "frames_per_second": round(frames / seconds, 1) if seconds else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+    }
+
+
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def setup_django(tmp):
+    """
+    Configure Django against a throwaway test database, with the cache in
+    tmp and congestion alerts never queued; returns a teardown callable.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "intelligent_traffic_monitoring.settings")
+    import django
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    overrides = override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                            "LOCATION": os.path.join(tmp, "cache")}},
+        ALERT_DISPATCH_THREAD=False,
+    )
+    overrides.enable()
+    no_alerts = mock.patch("traffic_app.alerts.queue_alert")
+    no_alerts.start()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+
+    def teardown():
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        no_alerts.stop()
+        overrides.disable()
+    return teardown
+
+
+def run_scenario(scenario):
+    """Run one scenario in this process and return its report."""
+    import cv2
+
+    from benchmarks.synthetic import stub_detector, write_synthetic_video
+    from traffic_app.processing.extract_frames import extract_and_sample_frames
+    from traffic_app.processing.frame_sampler import iter_sampled_frames
+    from traffic_app.processing.pipeline import PipelineStats
+
+    width, height = scenario["size"]
+    sample_rate, batch_size, repeat = scenario["sample_rate"], scenario["batch_size"], scenario["repeat"]
+    timings = {stage: {"frames": 0, "seconds": 0.0, "latencies": []} for stage in STAGES}
+    pipeline_stats = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        teardown = setup_django(tmp)
+        from traffic_app import services
+        from traffic_app.models import VideoUpload
+
+        path = os.path.join(tmp, "synthetic.mp4")
+        total_frames = write_synthetic_video(path, width, height, scenario["fps"], scenario["seconds"],
+                                             vehicles=scenario["density"], seed=scenario["seed"])
+        video = VideoUpload.objects.create(title="benchmark", video_file="benchmarks/synthetic.mp4")
+
+        for _ in range(repeat):
+            # Decode
+            cap = cv2.VideoCapture(path)
+            frames = []
+            started = last = time.perf_counter()
+            for _, frame in iter_sampled_frames(cap, sample_rate, scenario["strategy"]):
+                now = time.perf_counter()
+                timings["decode"]["latencies"].append(now - last)
+                frames.append(frame)
+                last = time.perf_counter()
+            timings["decode"]["seconds"] += time.perf_counter() - started
+            timings["decode"]["frames"] += len(frames)
+            cap.release()
+
+            # Detect
+            detections = []
+            for start in range(0, len(frames), batch_size):
+                batch = frames[start:start + batch_size]
+                started = time.perf_counter()
+                detections.extend(stub_detector(batch))
+                elapsed = time.perf_counter() - started
+                timings["detect"]["latencies"].append(elapsed)
+                timings["detect"]["seconds"] += elapsed
+            timings["detect"]["frames"] += len(frames)
+
+            # Aggregate
+            breakdown = {
+                "cars": sum(d["car"] for d in detections), "bikes": sum(d["bike"] for d in detections),
+                "trucks": sum(d["truck"] for d in detections), "buses": sum(d["bus"] for d in detections),
+            }
+            started = time.perf_counter()
+            values = services.summarize_detections(total_frames, len(detections), detections, breakdown)
+            elapsed = time.perf_counter() - started
+            values.update(sample_rate=sample_rate, fps=float(scenario["fps"]))
+            timings["aggregate"]["latencies"].append(elapsed)
+            timings["aggregate"]["seconds"] += elapsed
+            timings["aggregate"]["frames"] += len(detections)
+
+            # DB write (the congestion alert is not queued, see setup_django)
+            started = time.perf_counter()
+            services.store_result(video, values)
+            elapsed = time.perf_counter() - started
+            timings["db_write"]["latencies"].append(elapsed)
+            timings["db_write"]["seconds"] += elapsed
+            timings["db_write"]["frames"] += len(detections)
+
+            # End to end, stages overlapping in the threaded pipeline
+            stats = PipelineStats()
+            started = time.perf_counter()
+            _, sampled, _, _ = extract_and_sample_frames(
+                path, sample_rate=sample_rate, batch_size=batch_size, detector=stub_detector,
+                strategy=scenario["strategy"], stats=stats,
+            )
+            elapsed = time.perf_counter() - started
+            timings["pipeline"]["latencies"].append(elapsed)
+            timings["pipeline"]["seconds"] += elapsed
+            timings["pipeline"]["frames"] += sampled
+            pipeline_stats.append(stats.as_dict())
+
+        teardown()
+    report = {
+        "scenario": scenario,
+        "video_frames": total_frames,
+        "stages": {stage: stage_report(stage, t["frames"], t["seconds"], t["latencies"]) for stage, t in timings.items()},
+        "pipeline_stats": pipeline_stats[-1] if pipeline_stats else None,
+        "peak_rss_mib": peak_rss_mib(),
+    }
+    return report
+
+
+def run_isolated(scenario):
+    """Run a scenario in a fresh interpreter; returns its report or an error entry."""
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_pipeline", "--scenario", json.dumps(scenario)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"scenario": scenario, "error": proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("scenario", "output", "compare")},
+    }
+
+
+def scenario_key(scenario):
+    return f"{scenario['size'][0]}x{scenario['size'][1]} density={scenario['density']}"
+
+
+def compare(report, baseline):
+    """Print frames/s of this run relative to a baseline report."""
+    previous = {scenario_key(r["scenario"]): r for r in baseline.get("scenarios", []) if "stages" in r}
+    for result in report["scenarios"]:
+        old = previous.get(scenario_key(result["scenario"]))
+        if old is None or "stages" not in result:
+            continue
+        parts = []
+        for stage in STAGES:
+            new_fps = result["stages"][stage]["frames_per_second"]
+            old_fps = old["stages"].get(stage, {}).get("frames_per_second")
+            if new_fps and old_fps:
+                parts.append(f"{stage} {new_fps / old_fps:5.2f}x")
+        rss = result["peak_rss_mib"] - old["peak_rss_mib"]
+        print(f"{scenario_key(result['scenario']):>24}: " + "  ".join(parts) + f"  rss {rss:+.1f} MiB")
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=[(640, 360), (1280, 720)],
+                        help="Resolutions as WIDTHxHEIGHT")
+    parser.add_argument("--densities", type=int, nargs="+", default=[4, 16],
+                        help="Vehicles on screen at once")
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--sample-rate", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--strategy", choices=STRATEGIES, default=STRATEGY_GRAB,
+                        help="Frame sampling strategy (fixed so runs compare like for like)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare frames/s against")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        # Child process: one scenario, report on the last stdout line
+        print(json.dumps(run_scenario(json.loads(args.scenario))))
+        return
+
+    report = {"meta": metadata(args), "scenarios": []}
+    for size in args.sizes:
+        for density in args.densities:
+            scenario = {
+                "size": list(size), "density": density, "seconds": args.seconds, "fps": args.fps,
+                "sample_rate": args.sample_rate, "batch_size": args.batch_size, "strategy": args.strategy,
+                "repeat": args.repeat, "seed": args.seed,
+            }
+            result = run_isolated(scenario)
+            report["scenarios"].append(result)
+            if "error" in result:
+                print(f"{scenario_key(scenario):>24}: failed: {result['error']}")
+                continue
+            stages = result["stages"]
+            print(f"{scenario_key(scenario):>24}: " + "  ".join(
+                f"{stage} {stages[stage]['frames_per_second']:.0f} f/s" for stage in STAGES
+            ) + f"  peak {result['peak_rss_mib']:.0f} MiB")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/bench_postprocess.py
+"""
+Micro-benchmark of YOLO box post-processing on synthetic box tensors.
+
+    python -m benchmarks.bench_postprocess --boxes 10 50 200
+
+Compares the per-box loop (.item() per box) with the vectorised
+count_vehicle_arrays on identical inputs. Uses torch tensors when torch
+is installed, NumPy arrays otherwise.
+"""
+import argparse
+import json
+import timeit
+
+import numpy as np
+
+from traffic_app.processing.backends import box_arrays
+from traffic_app.processing.yolo_detect import VEHICLE_CLASSES, VEHICLE_CONF, count_vehicle_arrays
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+class _Boxes:
+    """Minimal stand-in for ultralytics Boxes: indexable, with cls/conf/xyxy."""
+
+    def __init__(self, cls, conf, xyxy):
+        self.cls, self.conf, self.xyxy = cls, conf, xyxy
+
+    def __len__(self):
+        return len(self.cls)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield _Boxes(self.cls[i:i + 1], self.conf[i:i + 1], self.xyxy[i:i + 1])
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def make_result(n, seed=0):
+    rng = np.random.RandomState(seed)
+    cls = rng.choice([0, 1, 2, 3, 5, 7, 9], size=n).astype(np.float32)
+    conf = rng.uniform(0.25, 1.0, size=n).astype(np.float32)
+    xyxy = rng.uniform(0, 640, size=(n, 4)).astype(np.float32)
+    if torch is not None:
+        cls, conf, xyxy = torch.from_numpy(cls), torch.from_numpy(conf), torch.from_numpy(xyxy)
+    else:
+        # Give NumPy arrays the .cpu().numpy() interface of tensors
+        cls, conf, xyxy = (_NumpyTensor(a) for a in (cls, conf, xyxy))
+    return _Result(_Boxes(cls, conf, xyxy))
+
+
+class _NumpyTensor(np.ndarray):
+    def __new__(cls, array):
+        return np.asarray(array).view(cls)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+def loop_counts(result):
+    """The original per-box loop."""
+    counts = {"car": 0, "bike": 0, "bus": 0, "truck": 0}
+    for box in result.boxes:
+        cls_id = int(box.cls[0].item())
+        confidence = float(box.conf[0].item())
+        if confidence > VEHICLE_CONF and cls_id in VEHICLE_CLASSES:
+            counts[VEHICLE_CLASSES[cls_id]] += 1
+    return counts
+
+
+def vector_counts(result):
+    cls, conf, _ = box_arrays(result)
+    return count_vehicle_arrays(cls, conf)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--boxes", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.boxes:
+        result = make_result(n)
+        assert loop_counts(result) == vector_counts(result)
+        loop_us = min(timeit.repeat(lambda: loop_counts(result), number=args.number, repeat=3)) / args.number * 1e6
+        vector_us = min(timeit.repeat(lambda: vector_counts(result), number=args.number, repeat=3)) / args.number * 1e6
+        rows.append({
+            "boxes": n,
+            "backend": "torch" if torch is not None else "numpy",
+            "loop_us": round(loop_us, 2),
+            "vectorized_us": round(vector_us, 2),
+            "speedup": round(loop_us / vector_us, 1),
+        })
+        print(f"{n:4d} boxes: loop {loop_us:8.1f} us  vectorized {vector_us:6.1f} us  ({loop_us / vector_us:.1f}x)")
+
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/bench_sampling.py
+"""
+Compare frame sampling strategies on synthetic videos.
+
+    python -m benchmarks.bench_sampling --seconds 60 --sample-rates 10 30 120
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import cv2
+
+from benchmarks.synthetic import write_synthetic_video
+from traffic_app.processing.frame_sampler import STRATEGIES, choose_strategy, iter_sampled_frames
+
+# (file extension, fourcc): an inter-coded and an intra-only codec
+CODECS = [(".mp4", "mp4v"), (".avi", "MJPG")]
+
+
+def time_strategy(path, sample_rate, strategy):
+    cap = cv2.VideoCapture(path)
+    started = time.perf_counter()
+    sampled = sum(1 for _ in iter_sampled_frames(cap, sample_rate, strategy))
+    elapsed = time.perf_counter() - started
+    cap.release()
+    return sampled, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--sample-rates", type=int, nargs="+", default=[5, 30, 150])
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext, fourcc in CODECS:
+            path = os.path.join(tmp, f"synthetic_{fourcc}{ext}")
+            n_frames = write_synthetic_video(path, args.width, args.height, args.fps, args.seconds, fourcc=fourcc)
+
+            for sample_rate in args.sample_rates:
+                cap = cv2.VideoCapture(path)
+                auto = choose_strategy(path, cap, sample_rate)
+                cap.release()
+
+                for strategy in STRATEGIES:
+                    sampled, elapsed = time_strategy(path, sample_rate, strategy)
+                    rows.append({
+                        "codec": fourcc,
+                        "frames": n_frames,
+                        "sample_rate": sample_rate,
+                        "strategy": strategy,
+                        "auto_choice": strategy == auto,
+                        "sampled": sampled,
+                        "seconds": round(elapsed, 4),
+                        "video_fps": round(n_frames / elapsed, 1) if elapsed else None,
+                    })
+                    print(f"{fourcc:5} rate={sample_rate:<4} {strategy:5}{'*' if strategy == auto else ' '} "
+                          f"{elapsed:7.3f}s  {n_frames / elapsed:9.1f} video frames/s")
+
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
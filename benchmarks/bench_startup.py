@@ -0,0 +1,70 @@
+# benchmarks/bench_startup.py
+"""
+Measure Django startup cost with lazy model loading.
+
+    python -m benchmarks.bench_startup --repeat 5
+
+Each scenario runs in a fresh interpreter. "web" is what a web worker or
+manage.py command pays now; "eager" additionally imports ultralytics and
+loads the weights, which every process used to pay at import time.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SETUP = (
+    "import os, sys, time; t = time.perf_counter(); "
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intelligent_traffic_monitoring.settings'); "
+    "import django; django.setup(); import traffic_app.urls, traffic_app.jobs; "
+)
+
+SCENARIOS = {
+    "web": SETUP,
+    "eager": SETUP + "from traffic_app.processing.model_registry import get_model; get_model(); ",
+}
+
+REPORT = (
+    "import json; print(json.dumps({'seconds': time.perf_counter() - t, "
+    "'torch_loaded': 'torch' in sys.modules, 'modules': len(sys.modules)}))"
+)
+
+
+def run(code):
+    proc = subprocess.run([sys.executable, "-c", code + REPORT], cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    report = {}
+    for name, code in SCENARIOS.items():
+        runs = [run(code) for _ in range(args.repeat)]
+        if any(r is None for r in runs):
+            report[name] = {"skipped": "scenario failed (is ultralytics installed?)"}
+            continue
+        seconds = [r["seconds"] for r in runs]
+        report[name] = {
+            "median_seconds": round(statistics.median(seconds), 4),
+            "min_seconds": round(min(seconds), 4),
+            "torch_loaded": runs[0]["torch_loaded"],
+            "modules": runs[0]["modules"],
+        }
+
+    if "median_seconds" in report.get("eager", {}):
+        report["saved_seconds"] = round(report["eager"]["median_seconds"] - report["web"]["median_seconds"], 4)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
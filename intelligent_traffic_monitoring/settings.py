@@ -73,6 +73,20 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Web and worker processes share the file; wait for locks instead of failing
+            'timeout': 20,
+        },
+    }
+}
+
+# Shared by the web and worker processes, so results saved by a worker
+# invalidate the dashboard cache of the web process; use Redis or
+# Memcached when they run on different hosts
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
     }
 }
 
@@ -136,10 +150,213 @@ ENABLE_TRAFFIC_ALERTS = os.environ.get('ENABLE_TRAFFIC_ALERTS', 'True') == 'True
 ALERT_ON_MEDIUM_CONGESTION = True
 ALERT_ON_HIGH_CONGESTION = True
 
+# Alerts go through an outbox table and are delivered in the background:
+# by a thread of the process that raised them (ALERT_DISPATCH_THREAD) and/or
+# `python manage.py dispatch_alerts`. Failed deliveries are retried after
+# ALERT_RETRY_BASE_SECONDS, doubling up to ALERT_RETRY_MAX_SECONDS, and
+# dropped after ALERT_MAX_ATTEMPTS.
+ALERT_DISPATCH_THREAD = os.environ.get('ALERT_DISPATCH_THREAD', 'True') == 'True'
+ALERT_TIMEOUT = 5
+ALERT_POOL_SIZE = 4
+ALERT_BATCH_SIZE = 50
+ALERT_POLL_SECONDS = 5
+ALERT_LEASE_SECONDS = 60
+ALERT_RETRY_BASE_SECONDS = 5
+ALERT_RETRY_MAX_SECONDS = 600
+ALERT_MAX_ATTEMPTS = 8
+
+# ============================================
+# BACKGROUND JOBS
+# ============================================
+# Uploads are queued and processed by `python manage.py run_worker`.
+# Workers renew a RUNNING job's heartbeat every JOB_HEARTBEAT_SECONDS; a job
+# without one for JOB_STALE_SECONDS is assumed orphaned and put back in the
+# queue, or failed once it was started JOB_MAX_ATTEMPTS times.
+JOB_HEARTBEAT_SECONDS = int(os.environ.get('JOB_HEARTBEAT_SECONDS', 30))
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 300))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+
+# Models load lazily on first use; set this to load and warm up the model
+# when a worker starts instead (same as `run_worker --warmup`).
+WARMUP_MODEL_ON_START = os.environ.get('WARMUP_MODEL_ON_START', 'False') == 'True'
+
+# ============================================
+# DETECTION
+# ============================================
+# YOLO weights, frame sampling and confidence thresholds. Together these
+# form the parameter part of result cache keys.
+YOLO_MODEL = os.environ.get('YOLO_MODEL', 'yolov8n.pt')
+
+# Inference backend: 'torch' (ultralytics on PyTorch) or 'onnx'
+# (onnxruntime, CPU; pip install onnxruntime). For 'onnx', export the model
+# first, optionally quantized to INT8 on frames from your own cameras:
+#   python manage.py export_onnx --int8 --calibration sample.mp4
+# and point ONNX_MODEL at the written file. ONNX_PROVIDERS selects
+# onnxruntime execution providers, e.g. ['OpenVINOExecutionProvider'] with
+# onnxruntime-openvino installed. ONNX_THREADS = 0 uses all cores.
+DETECTOR_BACKEND = os.environ.get('DETECTOR_BACKEND', 'torch')
+ONNX_MODEL = os.environ.get('ONNX_MODEL', 'yolov8n.onnx')
+ONNX_PROVIDERS = ['CPUExecutionProvider']
+ONNX_THREADS = int(os.environ.get('ONNX_THREADS', 0))
+ANALYSIS_SAMPLE_RATE = int(os.environ.get('ANALYSIS_SAMPLE_RATE', 30))
+YOLO_CONF = 0.25
+VEHICLE_CONF = 0.3
+# Per-type overrides of VEHICLE_CONF, e.g. {'bike': 0.4}
+VEHICLE_CLASS_CONF = {}
+
+# Adaptive sampling: a cheap frame-differencing/contour pass runs on every
+# sampled frame and YOLO only runs when more than MOTION_THRESHOLD of the
+# pixels changed, or after MOTION_MAX_INTERVAL skipped frames in a row.
+ANALYSIS_ADAPTIVE = os.environ.get('ANALYSIS_ADAPTIVE', 'False') == 'True'
+MOTION_THRESHOLD = 0.02
+MOTION_MAX_INTERVAL = 5
+
+# Track vehicles across sampled frames so each one is counted once
+# (total_vehicles and count_* become unique vehicles). Association needs a
+# predicted box IoU of TRACK_IOU_THRESHOLD, or a centre within
+# TRACK_MAX_DISTANCE box diagonals; tracks end after TRACK_MAX_AGE sampled
+# frames without a detection. TRACK_COUNTING_LINE is an optional
+# [[x1, y1], [x2, y2]] line in pixels; tracks crossing it are counted.
+TRACKING_ENABLED = os.environ.get('TRACKING_ENABLED', 'True') == 'True'
+TRACK_IOU_THRESHOLD = 0.3
+TRACK_MAX_DISTANCE = 2.0
+TRACK_MAX_AGE = 3
+TRACK_MIN_HITS = 1
+TRACK_COUNTING_LINE = None
+
+# Sampled frames sent to YOLO per inference call. Larger batches amortise
+# per-call overhead; lower it on memory-constrained nodes.
+YOLO_BATCH_SIZE = int(os.environ.get('YOLO_BATCH_SIZE', 8))
+
+# Decode, inference and aggregation run as a threaded pipeline.
+# Batches buffered between stages, and number of inference threads
+# (keep 1 with the shared ultralytics model, its predictor is not thread-safe).
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', 4))
+PIPELINE_INFERENCE_WORKERS = int(os.environ.get('PIPELINE_INFERENCE_WORKERS', 1))
+
+# Split each video into time segments analysed by this many processes
+# (each loads its own model). 1 = analyse in the worker process itself.
+ANALYSIS_PROCESSES = int(os.environ.get('ANALYSIS_PROCESSES', 1))
+
+# ============================================
+# LIVE STREAMS
+# ============================================
+# Defaults for `python manage.py ingest_stream`
+STREAM_SAMPLE_RATE = 15
+STREAM_WINDOW_SECONDS = 60
+STREAM_SNAPSHOT_SECONDS = 10
+
+# ============================================
+# CHUNKED UPLOADS
+# ============================================
+# Resumable upload API at /uploads/ (see traffic_app/uploads.py). With
+# analyze_prefix, the first UPLOAD_PREFIX_ANALYSIS_BYTES are analysed
+# while the rest is still uploading.
+UPLOAD_MAX_SIZE = 20 * 1024 ** 3
+UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+UPLOAD_PREFIX_ANALYSIS_BYTES = 64 * 1024 * 1024
+
+# ============================================
+# MQTT
+# ============================================
+# Publish congestion and signal timing per camera for signal controllers
+# (see traffic_app/mqtt.py). Messages are buffered, up to MQTT_BUFFER_SIZE,
+# while the broker is unreachable.
+MQTT_ENABLED = os.environ.get('MQTT_ENABLED', 'False') == 'True'
+MQTT_HOST = os.environ.get('MQTT_HOST', 'localhost')
+MQTT_PORT = int(os.environ.get('MQTT_PORT', 1883))
+MQTT_USERNAME = os.environ.get('MQTT_USERNAME') or None
+MQTT_PASSWORD = os.environ.get('MQTT_PASSWORD') or None
+MQTT_TLS = os.environ.get('MQTT_TLS', 'False') == 'True'
+MQTT_TOPIC_PREFIX = 'traffic'
+MQTT_QOS = 1
+MQTT_RETAIN = True
+MQTT_KEEPALIVE = 60
+MQTT_BUFFER_SIZE = 1000
+
+# ============================================
+# RESULT CACHE
+# ============================================
+# Re-uploads of an identical clip reuse the stored result. Least recently
+# used entries are evicted beyond either limit.
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'True') == 'True'
+RESULT_CACHE_MAX_ENTRIES = 10000
+RESULT_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# ============================================
+# DASHBOARD
+# ============================================
+# Aggregates and result pages are cached until a result is saved or
+# this many seconds pass
+DASHBOARD_CACHE_SECONDS = 300
+DASHBOARD_DAYS = 30
+DASHBOARD_PAGE_SIZE = 50
+
+# ============================================
+# JSON API
+# ============================================
+# Server-side directories videos may be submitted from by path; none
+# by default
+API_IMPORT_DIRS = [p for p in os.environ.get('API_IMPORT_DIRS', '').split(os.pathsep) if p]
+# Videos submitted by URL are downloaded by the worker. Off by default;
+# when on, only hosts in API_URL_HOSTS (and their subdomains) are
+# fetched, or with an empty list any host with public addresses only
+API_SUBMIT_URLS = os.environ.get('API_SUBMIT_URLS', 'False') == 'True'
+API_URL_HOSTS = [h for h in os.environ.get('API_URL_HOSTS', '').split(',') if h]
+API_DOWNLOAD_TIMEOUT = 30
+# Videos per submission and job ids per status request
+API_MAX_BATCH = 100
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+# ============================================
+# CONGESTION CLASSIFIER
+# ============================================
+# Model trained by traffic_app/ml/train_model.py on per-frame vehicle
+# counts; the rule-based classification is used while the file is
+# missing or unreadable, or with ''
+CONGESTION_MODEL = os.environ.get('CONGESTION_MODEL', str(BASE_DIR / 'traffic_app' / 'ml' / 'model.joblib'))
+# Versions trained by python manage.py retrain_congestion, kept out of the
+# source tree; --activate points congestion-active.json here at the new
+# version, which is then used instead of CONGESTION_MODEL
+CONGESTION_MODEL_DIR = BASE_DIR / 'models' / 'congestion'
+
+# ============================================
+# ARCHIVE IMPORT
+# ============================================
+# python manage.py import_archive <dir>: files with these extensions are
+# analysed in place by this many worker processes
+ARCHIVE_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.ts', '.m4v')
+ARCHIVE_IMPORT_WORKERS = 2
+
+# ============================================
+# PROFILING
+# ============================================
+# Every analysis stores per-stage timings on ProcessingResult.profile and
+# logs them (as JSON lines in traffic_profile.log). ANALYSIS_PROFILER =
+# 'cprofile' or 'pyinstrument' (pip install pyinstrument) additionally
+# writes a profiler dump per job to ANALYSIS_PROFILE_DIR.
+ANALYSIS_PROFILER = os.environ.get('ANALYSIS_PROFILER', '')
+ANALYSIS_PROFILE_DIR = BASE_DIR / 'profiles'
+
+# ============================================
+# METRICS
+# ============================================
+# Prometheus metrics are served at /metrics. With several processes (web
+# workers, run_worker), set METRICS_DIR to a directory shared by all of
+# them and empty it on deploy; each process writes its values there and
+# /metrics sums them. Empty: export the serving process's values only.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+
 # Logging configuration for debugging
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'traffic_app.log_format.JsonFormatter',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
@@ -148,6 +365,11 @@ LOGGING = {
             'class': 'logging.FileHandler',
             'filename': BASE_DIR / 'traffic_monitoring.log',
         },
+        'profile_file': {
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'traffic_profile.log',
+            'formatter': 'json',
+        },
     },
     'root': {
         'handlers': ['console', 'file'],
@@ -159,5 +381,10 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'traffic_app.profiling': {
+            'handlers': ['console', 'file', 'profile_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
@@ -1,10 +1,13 @@
 # intelligent_traffic_monitoring/urls.py (append)
 from django.conf import settings
 from django.conf.urls.static import static
+from django.contrib import admin
 from django.urls import include, path
 
 urlpatterns = [
     path("", include("traffic_app.urls", namespace="traffic_app")),
+    # Operators label congestion of results here (training data)
+    path("admin/", admin.site.urls),
     # ... other patterns
 ]
 
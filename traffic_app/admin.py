@@ -1,3 +1,20 @@
 from django.contrib import admin
+from django.utils import timezone
 
-# Register your models here.
+from .models import ProcessingResult
+
+
+@admin.register(ProcessingResult)
+class ProcessingResultAdmin(admin.ModelAdmin):
+    """Operators label congestion here; the labels train the congestion model."""
+    list_display = ("video", "processed_at", "avg_vehicles_per_frame", "congestion", "congestion_label")
+    list_editable = ("congestion_label",)
+    list_filter = ("congestion", "congestion_label")
+    list_select_related = ("video",)
+    fields = ("video", "avg_vehicles_per_frame", "density_score", "congestion", "congestion_label", "labelled_at")
+    readonly_fields = ("video", "avg_vehicles_per_frame", "density_score", "congestion", "labelled_at")
+
+    def save_model(self, request, obj, form, change):
+        if "congestion_label" in form.changed_data:
+            obj.labelled_at = timezone.now() if obj.congestion_label else None
+        super().save_model(request, obj, form, change)
@@ -0,0 +1,230 @@
+# traffic_app/alerts.py
+"""
+n8n congestion alerts.
+
+send_n8n_alert() does not call the webhook: it writes the alert to the
+AlertOutbox table and returns. An alert for a location that already has
+one waiting replaces its payload (the newest figures win) instead of
+queueing a second one.
+
+Dispatchers deliver due alerts over one pooled requests.Session (kept-alive
+connections): a daemon thread in the process that queued the alert
+(ALERT_DISPATCH_THREAD) and/or ``python manage.py dispatch_alerts``.
+Several may run at once; a dispatcher claims an alert by moving its
+next_attempt_at ALERT_LEASE_SECONDS ahead, so alerts of one that died
+become due again. Failed deliveries are retried with exponential backoff
+(ALERT_RETRY_BASE_SECONDS doubling up to ALERT_RETRY_MAX_SECONDS) and
+marked FAILED after ALERT_MAX_ATTEMPTS.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import AlertOutbox
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_payload(result_data):
+    """Webhook JSON for an alert's result figures."""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "congestion_level": result_data.get("congestion"),
+        "density_score": result_data.get("density_score"),
+        "total_vehicles": result_data.get("total_vehicles"),
+        "avg_vehicles_per_frame": result_data.get("avg_vehicles_per_frame"),
+        "clearing_time": result_data.get("clearing_time"),
+        "signal_recommendation": result_data.get("signal_recommendation"),
+        "location": result_data.get("location", "Unknown"),
+        "vehicle_breakdown": {
+            "cars": result_data.get("count_cars"),
+            "bikes": result_data.get("count_bikes"),
+            "trucks": result_data.get("count_trucks"),
+            "buses": result_data.get("count_buses")
+        }
+    }
+
+
+def queue_alert(result_data, now=None):
+    """
+    Put an alert in the outbox, coalescing it with a waiting alert for the
+    same location. Returns the AlertOutbox row.
+    """
+    payload = build_payload(result_data)
+    location = payload["location"]
+    with transaction.atomic():
+        waiting = AlertOutbox.objects.filter(location=location, status=AlertOutbox.STATUS_PENDING)
+        if waiting.update(payload=payload, coalesced=F("coalesced") + 1, version=F("version") + 1):
+            return waiting.first()
+        return AlertOutbox.objects.create(location=location, payload=payload, next_attempt_at=now or timezone.now())
+
+
+def send_n8n_alert(result_data):
+    """
+    Queue an alert to the n8n webhook when high congestion is detected;
+    delivery happens in the background once the transaction commits.
+    """
+    alert = queue_alert(result_data)
+    if getattr(settings, "ALERT_DISPATCH_THREAD", True):
+        transaction.on_commit(dispatcher.wake)
+    return alert
+
+
+def get_session():
+    """Process-wide session, so deliveries reuse kept-alive connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            # Retries are ours (backoff between dispatch rounds), not urllib3's
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=getattr(settings, "ALERT_POOL_SIZE", 4),
+                                  max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the given number of failed attempts."""
+    base = getattr(settings, "ALERT_RETRY_BASE_SECONDS", 5)
+    return min(getattr(settings, "ALERT_RETRY_MAX_SECONDS", 600), base * 2 ** max(0, attempts - 1))
+
+
+def claim_due(limit=None, now=None):
+    """
+    Claim up to limit due alerts for this dispatcher. The conditional
+    UPDATE only succeeds for one of several concurrent dispatchers.
+    """
+    now = now or timezone.now()
+    limit = limit or getattr(settings, "ALERT_BATCH_SIZE", 50)
+    lease = now + timedelta(seconds=getattr(settings, "ALERT_LEASE_SECONDS", 60))
+    due = (
+        AlertOutbox.objects
+        .filter(status=AlertOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+        .order_by("next_attempt_at", "id")
+        .values_list("pk", "next_attempt_at")[:limit]
+    )
+    claimed = [
+        pk for pk, due_at in due
+        if AlertOutbox.objects.filter(pk=pk, status=AlertOutbox.STATUS_PENDING, next_attempt_at=due_at)
+        .update(next_attempt_at=lease)
+    ]
+    return list(AlertOutbox.objects.filter(pk__in=claimed).order_by("id"))
+
+
+def deliver(alert, session=None, now=None):
+    """POST one claimed alert and record the outcome. Returns True if delivered."""
+    session = session or get_session()
+    url = getattr(settings, "N8N_WEBHOOK_URL", "http://localhost:5678/webhook/traffic-alert")
+    error = ""
+    try:
+        response = session.post(url, json=alert.payload, timeout=getattr(settings, "ALERT_TIMEOUT", 5))
+        if not 200 <= response.status_code < 300:
+            error = f"n8n webhook returned status: {response.status_code}"
+    except requests.exceptions.RequestException as e:
+        error = f"Failed to send alert to n8n: {e}"
+
+    now = now or timezone.now()
+    rows = AlertOutbox.objects.filter(pk=alert.pk)
+    if not error:
+        # Only done if no newer payload was coalesced in while sending
+        if not rows.filter(version=alert.version).update(
+            status=AlertOutbox.STATUS_SENT, sent_at=now, attempts=F("attempts") + 1, last_error="",
+        ):
+            rows.update(next_attempt_at=now, attempts=F("attempts") + 1)
+        logger.info("Alert %s for %s sent to n8n", alert.pk, alert.location)
+        return True
+
+    metrics.WEBHOOK_FAILURES.inc()
+    attempts = alert.attempts + 1
+    if attempts >= getattr(settings, "ALERT_MAX_ATTEMPTS", 8):
+        rows.update(status=AlertOutbox.STATUS_FAILED, attempts=attempts, last_error=error)
+        logger.error("Alert %s for %s failed %d times, giving up: %s", alert.pk, alert.location, attempts, error)
+    else:
+        delay = retry_delay(attempts)
+        rows.update(attempts=attempts, last_error=error, next_attempt_at=now + timedelta(seconds=delay))
+        logger.warning("Alert %s for %s failed (attempt %d), retrying in %ss: %s",
+                       alert.pk, alert.location, attempts, delay, error)
+    return False
+
+
+def dispatch_due(limit=None, now=None):
+    """Deliver one batch of due alerts. Returns (sent, failed)."""
+    session = get_session()
+    sent = failed = 0
+    try:
+        for alert in claim_due(limit, now):
+            if deliver(alert, session, now):
+                sent += 1
+            else:
+                failed += 1
+    finally:
+        # Dispatcher processes analyse nothing, so nothing else flushes
+        # their webhook failures to METRICS_DIR
+        metrics.flush()
+    return sent, failed
+
+
+def run_dispatcher(poll_interval=None, once=False):
+    """
+    Deliver alerts until none are due (once=True) or forever, checking for
+    due retries every poll_interval seconds. Returns the number sent.
+    """
+    poll_interval = poll_interval or getattr(settings, "ALERT_POLL_SECONDS", 5)
+    total = 0
+    while True:
+        sent, failed = dispatch_due()
+        total += sent
+        if not sent and not failed:
+            if once:
+                return total
+            time.sleep(poll_interval)
+
+
+class AlertDispatcher:
+    """
+    Daemon thread delivering the outbox of this process. Started on the
+    first wake(); then drains due alerts whenever woken and every
+    ALERT_POLL_SECONDS for retries.
+    """
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(getattr(settings, "ALERT_POLL_SECONDS", 5))
+            self._wake.clear()
+            close_old_connections()
+            try:
+                while any(dispatch_due()):
+                    pass
+            except Exception:
+                logger.exception("Alert dispatch failed")
+            finally:
+                close_old_connections()
+
+
+dispatcher = AlertDispatcher()
@@ -0,0 +1,283 @@
+# traffic_app/api.py
+"""
+JSON API for integration scripts.
+
+    POST /api/videos/              submit several videos at once: multipart with
+                                   repeated `video_file` parts (plus `title`,
+                                   `camera`), or JSON {"videos": [{"url" | "path",
+                                   "title"?, "camera"?}, ...]}
+    GET  /api/jobs/?ids=1,2,3      status of many analysis jobs
+    GET  /api/results/             results newest first, `limit` per page; filters
+                                   `congestion`, `camera` (name); `fields` picks the
+                                   returned fields; `after` is the cursor of the
+                                   next page
+    GET  /api/results/<video_id>/  one video's result
+
+Submitted paths must lie under one of API_IMPORT_DIRS. They are registered
+where they are, as import_archive does, and queued right away: the worker
+running the job hashes the file and looks it up in the result cache. URLs
+(see downloads.py) are queued the same way and downloaded by the worker.
+Submissions answer 202 with the job of each video.
+
+GET responses carry an ETag of their body; a poller sending it back in
+If-None-Match gets an empty 304 while nothing changed.
+"""
+import os
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+
+from . import dashboard, downloads
+from .forms import VideoUploadForm
+from .jobs import enqueue_analysis
+from .models import AnalysisJob, Camera, ProcessingResult, VideoUpload
+from .services import RESULT_FIELDS
+from .uploads import start_analysis
+
+
+class ApiError(Exception):
+    """A request (or one item of it) the API rejects, with the HTTP status to answer."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(request, data, status=200):
+    """JsonResponse with an ETag; 304 when it matches the request's If-None-Match."""
+    response = JsonResponse(data, status=status)
+    if request.method not in ("GET", "HEAD") or status != 200:
+        return response
+    set_response_etag(response)
+    # Pollers may keep the body but must revalidate it
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=response["ETag"], response=response)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+# name -> (field loaded with only(), value of a ProcessingResult with
+# select_related video and camera)
+RESULT_API_FIELDS = {
+    "video_id": ("video_id", lambda r: r.video_id),
+    "title": ("video__title", lambda r: r.video.title),
+    "camera": ("video__camera__name", lambda r: r.video.camera.name if r.video.camera else None),
+    "uploaded_at": ("video__uploaded_at", lambda r: _isoformat(r.video.uploaded_at)),
+    "processed_at": ("processed_at", lambda r: _isoformat(r.processed_at)),
+    **{name: (name, lambda r, name=name: getattr(r, name)) for name in RESULT_FIELDS},
+    "profile": ("profile", lambda r: r.profile),
+}
+# Per-stage timings are only sent when asked for
+DEFAULT_RESULT_FIELDS = [name for name in RESULT_API_FIELDS if name != "profile"]
+JOB_RESULT_FIELDS = ["congestion", "density_score", "total_vehicles", "avg_vehicles_per_frame"]
+
+
+def parse_fields(value):
+    """Field names of a `fields` parameter (all default fields if empty)."""
+    if not value:
+        return DEFAULT_RESULT_FIELDS
+    fields = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = sorted(set(fields) - set(RESULT_API_FIELDS))
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def result_queryset(fields):
+    """
+    ProcessingResults loading only what fields need (and processed_at for
+    the page cursor), with the video and camera joined in when a field
+    reads them.
+    """
+    loaded = [RESULT_API_FIELDS[name][0] for name in fields]
+    # A relation left out of only() cannot be select_related
+    related = sorted({path.rsplit("__", 1)[0] for path in loaded if "__" in path})
+    return (
+        ProcessingResult.objects
+        .select_related(*related)
+        .only("id", "video_id", "processed_at", *loaded)
+    )
+
+
+def result_data(result, fields):
+    data = {name: RESULT_API_FIELDS[name][1](result) for name in fields}
+    data["results_url"] = reverse("traffic_app:api_result", args=[result.video_id])
+    return data
+
+
+def results_page(params):
+    """
+    One page of results, newest first, keyset-paginated like the dashboard.
+    params: the request's GET parameters.
+    """
+    fields = parse_fields(params.get("fields"))
+    max_size = getattr(settings, "API_MAX_PAGE_SIZE", 500)
+    try:
+        limit = min(max(int(params.get("limit", getattr(settings, "API_PAGE_SIZE", 50))), 1), max_size)
+    except ValueError:
+        raise ApiError("limit must be an integer")
+
+    qs = result_queryset(fields).order_by("-processed_at", "-id")
+    if params.get("congestion"):
+        qs = qs.filter(congestion=params["congestion"].upper())
+    if params.get("camera"):
+        qs = qs.filter(video__camera__name=params["camera"])
+    if params.get("after"):
+        position = dashboard.decode_cursor(params["after"])
+        if position is None:
+            raise ApiError("Invalid cursor")
+        processed_at, pk = position
+        qs = qs.filter(Q(processed_at__lt=processed_at) | Q(processed_at=processed_at, id__lt=pk))
+
+    results = list(qs[:limit + 1])
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = dashboard.encode_cursor(results[-1].processed_at, results[-1].pk)
+    return {
+        "results": [result_data(result, fields) for result in results],
+        "next_cursor": next_cursor,
+    }
+
+
+def job_data(job):
+    data = {
+        "id": job.id,
+        "video_id": job.video_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat(),
+        "started_at": _isoformat(job.started_at),
+        "finished_at": _isoformat(job.finished_at),
+        "results_url": None,
+        "error": "",
+    }
+    if job.status == AnalysisJob.STATUS_DONE:
+        data["results_url"] = reverse("traffic_app:results", args=[job.video_id])
+    elif job.status == AnalysisJob.STATUS_FAILED:
+        # Only the last line; the full traceback stays in the DB / logs
+        data["error"] = job.error.strip().splitlines()[-1] if job.error.strip() else ""
+    return data
+
+
+def parse_ids(value):
+    try:
+        ids = [int(pk) for pk in (value or "").split(",") if pk.strip()]
+    except ValueError:
+        raise ApiError("ids must be a comma-separated list of integers")
+    if not ids:
+        raise ApiError("ids is required")
+    if len(ids) > getattr(settings, "API_MAX_BATCH", 100):
+        raise ApiError("Too many ids")
+    return ids
+
+
+def jobs_status(ids):
+    """Status of the given jobs, with the result figures of finished ones; one query."""
+    jobs = AnalysisJob.objects.filter(pk__in=ids).select_related("video__result").in_bulk()
+    found = []
+    for pk in ids:
+        job = jobs.get(pk)
+        if job is None:
+            continue
+        data = job_data(job)
+        result = getattr(job.video, "result", None) if job.status == AnalysisJob.STATUS_DONE else None
+        data["result"] = {name: getattr(result, name) for name in JOB_RESULT_FIELDS} if result else None
+        found.append(data)
+    return {"jobs": found, "missing": [pk for pk in ids if pk not in jobs]}
+
+
+def _camera(pk):
+    if pk in (None, ""):
+        return None
+    camera = Camera.objects.filter(pk=pk).first() if str(pk).isdigit() else None
+    if camera is None:
+        raise ApiError(f"Unknown camera {pk}")
+    return camera
+
+
+def import_path(path, title="", camera=None):
+    """
+    Queue a server-side file from one of API_IMPORT_DIRS, read in place;
+    the job's worker hashes it and looks it up in the result cache.
+    """
+    real = os.path.realpath(path or "")
+    roots = [os.path.realpath(root) for root in getattr(settings, "API_IMPORT_DIRS", [])]
+    if not any(os.path.commonpath([real, root]) == root for root in roots):
+        raise ApiError("Path is not under an import directory", status=403)
+    if not os.path.isfile(real):
+        raise ApiError("No such file")
+    st = os.stat(real)
+    video = VideoUpload.objects.create(
+        title=title, camera=camera, source_path=real, source_mtime=st.st_mtime, source_size=st.st_size,
+    )
+    return video, enqueue_analysis(video)
+
+
+def queue_url(url, title="", camera=None):
+    """Queue a video submitted by URL; the job's worker downloads it."""
+    try:
+        downloads.check_url(url)
+    except downloads.DownloadError as e:
+        raise ApiError(str(e), e.status)
+    video = VideoUpload.objects.create(title=title, source_url=url, camera=camera)
+    return video, enqueue_analysis(video)
+
+
+def submitted(video, job):
+    data = {
+        "video_id": video.pk,
+        "job_id": job.pk if job else None,
+        "status": job.status if job else AnalysisJob.STATUS_DONE,
+        "status_url": None,
+        "results_url": reverse("traffic_app:api_result", args=[video.pk]),
+    }
+    if job is not None:
+        data["status_url"] = reverse("traffic_app:api_jobs") + f"?ids={job.pk}"
+    return data
+
+
+def submit_item(item):
+    """Create and start one video of a JSON submission: {"url" | "path", "title"?, "camera"?}."""
+    if not isinstance(item, dict):
+        raise ApiError("Each video must be an object")
+    camera = _camera(item.get("camera"))
+    if item.get("url") and not item.get("path"):
+        return submitted(*queue_url(item["url"], item.get("title") or "", camera))
+    if not item.get("path"):
+        raise ApiError("Each video needs a url or a path")
+    return submitted(*import_path(item["path"], item.get("title") or "", camera))
+
+
+def submit_file(uploaded, title="", camera=None):
+    """Create and start one video of a multipart submission, validated like the upload form."""
+    form = VideoUploadForm({"title": title, "camera": camera or ""}, {"video_file": uploaded})
+    if not form.is_valid():
+        raise ApiError("; ".join(error for errors in form.errors.values() for error in errors))
+    video = form.save()
+    return submitted(video, start_analysis(video))
+
+
+def submit(items):
+    """
+    Run each submission (a zero-argument callable) on its own, so one bad
+    item does not fail the batch. Returns (data, HTTP status): 202 once
+    any video was accepted.
+    """
+    if not items:
+        raise ApiError("No videos submitted")
+    if len(items) > getattr(settings, "API_MAX_BATCH", 100):
+        raise ApiError("Too many videos")
+    videos = []
+    for index, item in enumerate(items):
+        try:
+            videos.append(dict(item(), index=index))
+        except ApiError as e:
+            videos.append({"index": index, "error": str(e)})
+    created = any("error" not in video for video in videos)
+    return {"videos": videos}, 202 if created else 400
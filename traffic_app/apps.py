@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class TrafficAppConfig(AppConfig):
     name = 'traffic_app'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from . import dashboard
+        from .models import ProcessingResult
+
+        # New or changed results invalidate the cached dashboard
+        post_save.connect(dashboard.invalidate, sender=ProcessingResult, dispatch_uid="dashboard_invalidate_save")
+        post_delete.connect(dashboard.invalidate, sender=ProcessingResult, dispatch_uid="dashboard_invalidate_delete")
@@ -0,0 +1,213 @@
+# traffic_app/archive.py
+"""
+Bulk import of archived footage (``python manage.py import_archive``).
+
+A directory tree is scanned and every video file is registered as a
+VideoUpload whose source_path points at the file, which is analysed where
+it is rather than copied into MEDIA_ROOT. Each file gets an AnalysisJob in
+the same transaction as its row; run_worker processes started with
+--source-root <root> then work through them, taking only that tree's jobs.
+
+All progress is in the database, so an import stopped at any point is
+resumed by running it again:
+
+- files already registered with the same mtime and size are skipped;
+  changed files are analysed again;
+- jobs left RUNNING by a worker process of this host that no longer
+  exists are put back in the queue;
+- analyze_archived looks the file's content hash up in the result cache
+  before analysing, so copies of footage analysed before (under another
+  path or as an upload) cost one read of the file.
+"""
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+
+from .models import AnalysisJob, VideoUpload
+from .services import analyze_video, apply_cached_result
+
+logger = logging.getLogger(__name__)
+
+# Files registered per transaction
+REGISTER_BATCH_SIZE = 500
+
+
+def source_prefix(root):
+    """source_path prefix of the files under root."""
+    return os.path.join(os.path.realpath(root), "")
+
+
+def archive_filters(root):
+    """AnalysisJob filters selecting the jobs of the files under root."""
+    return {"video__source_path__startswith": source_prefix(root)}
+
+
+def scan(root, extensions=None):
+    """Yield (path, mtime, size) of the video files under root, in a stable order."""
+    extensions = tuple(ext.lower() for ext in (extensions or getattr(
+        settings, "ARCHIVE_EXTENSIONS", (".mp4", ".avi", ".mov", ".mkv", ".ts", ".m4v"),
+    )))
+    for directory, dirnames, filenames in os.walk(os.path.realpath(root)):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(extensions):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                logger.warning("Skipping %s: %s", path, e)
+                continue
+            yield path, st.st_mtime, st.st_size
+
+
+def _register_batch(root, batch, camera, retry_failed, counts):
+    existing = {
+        video.source_path: video
+        for video in VideoUpload.objects.filter(source_path__in=[path for path, _, _ in batch])
+        .only("id", "source_path", "source_mtime", "source_size", "processed")
+    }
+    queued, attempted = set(), set()
+    for video_id, status in AnalysisJob.objects.filter(video__in=existing.values()).values_list("video_id", "status"):
+        if status in (AnalysisJob.STATUS_PENDING, AnalysisJob.STATUS_RUNNING):
+            queued.add(video_id)
+        if not (retry_failed and status == AnalysisJob.STATUS_FAILED):
+            attempted.add(video_id)
+
+    new, queue = [], []
+    for path, mtime, size in batch:
+        video = existing.get(path)
+        if video is None:
+            new.append(VideoUpload(
+                title=os.path.relpath(path, root)[:200], camera=camera,
+                source_path=path, source_mtime=mtime, source_size=size,
+            ))
+        elif video.source_mtime != mtime or video.source_size != size:
+            VideoUpload.objects.filter(pk=video.pk).update(
+                source_mtime=mtime, source_size=size, content_hash="", processed=False,
+            )
+            if video.pk not in queued:
+                queue.append(video)
+            counts["changed"] += 1
+        elif not video.processed and video.pk not in attempted:
+            # Registered but never analysed (or failed, with retry_failed)
+            queue.append(video)
+            counts["requeued"] += 1
+        else:
+            counts["skipped"] += 1
+
+    created = VideoUpload.objects.bulk_create(new)
+    counts["new"] += len(created)
+    AnalysisJob.objects.bulk_create(AnalysisJob(video=video) for video in created + queue)
+
+
+def register(root, camera=None, retry_failed=False, extensions=None, batch_size=REGISTER_BATCH_SIZE):
+    """
+    Register the video files under root and queue their analysis. Returns
+    counts of files that were new, changed, requeued and skipped.
+    """
+    root = os.path.realpath(root)
+    counts = {"new": 0, "changed": 0, "requeued": 0, "skipped": 0}
+    batch = []
+    for entry in scan(root, extensions):
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            with transaction.atomic():
+                _register_batch(root, batch, camera, retry_failed, counts)
+            batch = []
+    if batch:
+        with transaction.atomic():
+            _register_batch(root, batch, camera, retry_failed, counts)
+    return counts
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def requeue_orphaned_jobs(root):
+    """
+    Put RUNNING jobs under root whose worker process (on this host) has
+    died back in the queue. Returns how many were requeued.
+    """
+    host = socket.gethostname()
+    orphaned = []
+    running = AnalysisJob.objects.filter(status=AnalysisJob.STATUS_RUNNING, **archive_filters(root))
+    for pk, worker in running.values_list("pk", "worker"):
+        worker_host, _, pid = worker.rpartition(":")
+        if worker_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+            orphaned.append(pk)
+    return AnalysisJob.objects.filter(pk__in=orphaned, status=AnalysisJob.STATUS_RUNNING).update(
+        status=AnalysisJob.STATUS_PENDING, worker="",
+    )
+
+
+def progress(root):
+    """
+    Files and bytes under root by state, each {"files", "bytes"}:
+    "remaining" (a job pending or running), "done" (analysed) and "failed".
+    """
+    queued = AnalysisJob.objects.filter(
+        video=OuterRef("pk"), status__in=[AnalysisJob.STATUS_PENDING, AnalysisJob.STATUS_RUNNING],
+    )
+    states = {
+        "remaining": Q(queued=True),
+        "done": Q(queued=False, processed=True),
+        "failed": Q(queued=False, processed=False),
+    }
+    totals = (
+        VideoUpload.objects.filter(source_path__startswith=source_prefix(root))
+        .annotate(queued=Exists(queued))
+        .aggregate(**{
+            f"{state}_{kind}": aggregate
+            for state, condition in states.items()
+            for kind, aggregate in (("files", Count("id", filter=condition)),
+                                    ("bytes", Sum("source_size", filter=condition)))
+        })
+    )
+    return {
+        state: {"files": totals[f"{state}_files"], "bytes": totals[f"{state}_bytes"] or 0}
+        for state in states
+    }
+
+
+def analyze_archived(video):
+    """Job entry point for archived files: the result cache first, then a full analysis."""
+    return apply_cached_result(video) or analyze_video(video)
+
+
+def format_progress(start, current, elapsed):
+    """
+    One progress line from two progress() states taken elapsed seconds
+    apart: files finished, throughput since start and the ETA of the
+    remaining bytes at that throughput.
+    """
+    def finished(state, key):
+        return state["done"][key] + state["failed"][key]
+
+    files = finished(current, "files") - finished(start, "files")
+    size = finished(current, "bytes") - finished(start, "bytes")
+    total = finished(current, "files") + current["remaining"]["files"]
+    line = f"{finished(current, 'files')}/{total} files ({current['failed']['files']} failed)"
+    if elapsed <= 0 or not files:
+        return f"{line} | ETA unknown"
+    bytes_per_second = size / elapsed
+    if bytes_per_second:
+        eta = current["remaining"]["bytes"] / bytes_per_second
+    else:
+        eta = current["remaining"]["files"] * elapsed / files
+    return (
+        f"{line} | {files / elapsed:.2f} files/s, {bytes_per_second / 1024 ** 2:.1f} MB/s"
+        f" | ETA {timedelta(seconds=round(eta))}"
+    )
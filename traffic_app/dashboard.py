@@ -0,0 +1,185 @@
+# traffic_app/dashboard.py
+"""
+History and aggregate figures for the results dashboard.
+
+Everything is computed in SQL over the indexed ProcessingResult.processed_at
+(and VideoUpload.uploaded_at) columns, restricted to the last `days` days:
+congestion levels per hour or day, per camera and the vehicle mix. The
+list of individual results is paged with a keyset cursor on
+(processed_at, id), so any page costs one index range scan however far
+back it is.
+
+Figures and pages are cached (DASHBOARD_CACHE_SECONDS) under keys that
+carry a version number. Saving or deleting a ProcessingResult bumps the
+version, which invalidates every cached page at once. The cache backend
+must be shared by the web and worker processes for this to reach the web
+process (see CACHES in settings).
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Max, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import ProcessingResult, VideoUpload
+
+VERSION_KEY = "dashboard:version"
+CONGESTION_LEVELS = ("LOW", "MEDIUM", "HIGH")
+CURSOR_FORMAT = "%Y%m%dT%H%M%S.%f"
+
+# Columns of the results list; leaves out the JSON fields
+LIST_FIELDS = (
+    "id", "processed_at", "congestion", "density_score", "avg_vehicles_per_frame", "total_vehicles",
+    "video_id", "video__title", "video__camera__name",
+)
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(VERSION_KEY, version, None)
+    return version
+
+
+def invalidate(**kwargs):
+    """Drop all cached dashboard data (signal receiver, see apps.py)."""
+    if kwargs.get("update_fields") and set(kwargs["update_fields"]) <= {"profile"}:
+        # Only the timings changed, nothing the dashboard shows
+        return
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def cached(name, compute):
+    """compute() cached under name until it expires or results change."""
+    key = f"dashboard:{_version()}:{name}"
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, getattr(settings, "DASHBOARD_CACHE_SECONDS", 300))
+    return value
+
+
+def _level_counts(field="congestion"):
+    return {level.lower(): Count("id", filter=Q(**{field: level})) for level in CONGESTION_LEVELS}
+
+
+def _since(days):
+    return timezone.now() - timedelta(days=days)
+
+
+def summary(days):
+    """Totals over the period, including the vehicle mix."""
+    totals = ProcessingResult.objects.filter(processed_at__gte=_since(days)).aggregate(
+        results=Count("id"),
+        avg_density=Avg("density_score"),
+        avg_per_frame=Avg("avg_vehicles_per_frame"),
+        cars=Sum("count_cars"),
+        bikes=Sum("count_bikes"),
+        trucks=Sum("count_trucks"),
+        buses=Sum("count_buses"),
+        **_level_counts(),
+    )
+    mix = {kind: totals[kind] or 0 for kind in ("cars", "bikes", "trucks", "buses")}
+    vehicles = sum(mix.values())
+    totals["vehicles"] = vehicles
+    totals["mix"] = [
+        {"kind": kind, "count": count, "percent": round(count * 100 / vehicles, 1) if vehicles else 0}
+        for kind, count in mix.items()
+    ]
+    return totals
+
+
+def congestion_over_time(days):
+    """
+    Results per congestion level and uploads per bucket, oldest first.
+    Buckets are hours for periods of up to two days, days otherwise.
+    """
+    trunc = TruncHour if days <= 2 else TruncDay
+    since = _since(days)
+    rows = list(
+        ProcessingResult.objects.filter(processed_at__gte=since)
+        .annotate(bucket=trunc("processed_at"))
+        .values("bucket")
+        .annotate(results=Count("id"), avg_density=Avg("density_score"), **_level_counts())
+        .order_by("bucket")
+    )
+    uploads = dict(
+        VideoUpload.objects.filter(uploaded_at__gte=since)
+        .annotate(bucket=trunc("uploaded_at"))
+        .values("bucket")
+        .annotate(n=Count("id"))
+        .values_list("bucket", "n")
+    )
+    for row in rows:
+        row["uploads"] = uploads.pop(row["bucket"], 0)
+        for level in CONGESTION_LEVELS:
+            row[f"{level.lower()}_percent"] = round(row[level.lower()] * 100 / row["results"], 1)
+    # Buckets with uploads but no finished analysis yet
+    rows.extend({"bucket": bucket, "results": 0, "uploads": n} for bucket, n in uploads.items())
+    rows.sort(key=lambda row: row["bucket"])
+    return rows
+
+
+def by_location(days):
+    """Figures per camera, busiest first; uploads without a camera under None."""
+    return list(
+        ProcessingResult.objects.filter(processed_at__gte=_since(days))
+        .values(location=F("video__camera__name"))
+        .annotate(
+            results=Count("id"),
+            avg_density=Avg("density_score"),
+            avg_per_frame=Avg("avg_vehicles_per_frame"),
+            last_processed=Max("processed_at"),
+            **_level_counts(),
+        )
+        .order_by("-results", "location")
+    )
+
+
+def encode_cursor(processed_at, pk):
+    return f"{processed_at.astimezone(dt_timezone.utc).strftime(CURSOR_FORMAT)}-{pk}"
+
+
+def decode_cursor(cursor):
+    """(processed_at, id) of a cursor, or None if it is not one."""
+    try:
+        stamp, pk = cursor.rsplit("-", 1)
+        return datetime.strptime(stamp, CURSOR_FORMAT).replace(tzinfo=dt_timezone.utc), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def results_page(cursor=None, page_size=None):
+    """
+    Results newest first, starting after cursor. Returns (rows, next
+    cursor or None on the last page).
+    """
+    page_size = page_size or getattr(settings, "DASHBOARD_PAGE_SIZE", 50)
+    qs = ProcessingResult.objects.order_by("-processed_at", "-id")
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        processed_at, pk = position
+        qs = qs.filter(Q(processed_at__lt=processed_at) | Q(processed_at=processed_at, id__lt=pk))
+    rows = list(qs.values(*LIST_FIELDS)[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1]["processed_at"], rows[-1]["id"])
+
+
+def dashboard_data(days, cursor=None):
+    """Everything the dashboard page shows, from the cache where possible."""
+    page, next_cursor = cached(f"page:{cursor or ''}", lambda: results_page(cursor))
+    return {
+        "summary": cached(f"summary:{days}", lambda: summary(days)),
+        "over_time": cached(f"over_time:{days}", lambda: congestion_over_time(days)),
+        "locations": cached(f"locations:{days}", lambda: by_location(days)),
+        "results": page,
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,121 @@
+# traffic_app/downloads.py
+"""
+Videos submitted to the API by URL.
+
+The request only checks the URL (check_url) and queues the video with its
+source_url; the worker running the job downloads it (fetch) before the
+analysis. URLs are refused unless API_SUBMIT_URLS is on, and must point
+to a host of API_URL_HOSTS or, with no allow-list, to a public address:
+loopback, private, link-local (cloud metadata) and reserved addresses are
+refused, for every redirect as well.
+"""
+import ipaddress
+import logging
+import os
+import socket
+from urllib.parse import unquote, urljoin, urlparse
+
+import requests
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+# Bytes per write when downloading
+CHUNK_SIZE = 1024 * 1024
+MAX_REDIRECTS = 5
+
+
+class DownloadError(Exception):
+    """A URL that is refused or could not be fetched, with the HTTP status to answer."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _allowed_host(host, allowed):
+    return any(host == entry or host.endswith("." + entry) for entry in allowed)
+
+
+def _public(host):
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror:
+        raise DownloadError(f"Cannot resolve {host}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if not ip.is_global or ip.is_multicast:
+            return False
+    return True
+
+
+def check_url(url):
+    """Raise DownloadError unless url may be downloaded."""
+    if not getattr(settings, "API_SUBMIT_URLS", False):
+        raise DownloadError("URL submission is disabled", status=403)
+    parsed = urlparse(url or "")
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise DownloadError("url must be http or https")
+    host = parsed.hostname.lower().rstrip(".")
+    allowed = [entry.lower() for entry in getattr(settings, "API_URL_HOSTS", [])]
+    if allowed:
+        if not _allowed_host(host, allowed):
+            raise DownloadError(f"Host {host} is not allowed", status=403)
+    elif not _public(host):
+        raise DownloadError(f"Host {host} is not a public address", status=403)
+
+
+def write_chunks(name, chunks):
+    """Write chunks to a new file `name` under MEDIA_ROOT, within UPLOAD_MAX_SIZE."""
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    max_size = getattr(settings, "UPLOAD_MAX_SIZE", 20 * 1024 ** 3)
+    written = 0
+    f = open(path, "wb")
+    try:
+        with f:
+            for chunk in chunks:
+                written += len(chunk)
+                if written > max_size:
+                    raise DownloadError("File too large", status=413)
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+def new_name(filename):
+    return default_storage.get_available_name(f"uploads/{os.path.basename(filename) or 'video.mp4'}")
+
+
+def download(url):
+    """
+    Download url into MEDIA_ROOT, checking it and every redirect with
+    check_url; returns the file's name.
+    """
+    timeout = getattr(settings, "API_DOWNLOAD_TIMEOUT", 30)
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            check_url(url)
+            with requests.get(url, stream=True, timeout=timeout, allow_redirects=False) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers["Location"])
+                    continue
+                if response.status_code != 200:
+                    raise DownloadError(f"Download failed with status {response.status_code}", status=502)
+                name = new_name(unquote(os.path.basename(urlparse(url).path)))
+                write_chunks(name, response.iter_content(CHUNK_SIZE))
+                return name
+    except requests.exceptions.RequestException as e:
+        raise DownloadError(f"Download failed: {e}", status=502)
+    raise DownloadError("Too many redirects", status=502)
+
+
+def fetch(video):
+    """Download a video submitted by URL, once; later calls keep the file."""
+    if video.video_file or not video.source_url:
+        return
+    logger.info("Downloading video %s from %s", video.pk, video.source_url)
+    video.video_file = download(video.source_url)
+    video.save(update_fields=["video_file"])
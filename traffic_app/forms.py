@@ -5,8 +5,14 @@ from .models import VideoUpload
 class VideoUploadForm(forms.ModelForm):
     class Meta:
         model = VideoUpload
-        fields = ["title", "video_file"]
+        fields = ["title", "video_file", "camera"]
         widgets = {
             "title": forms.TextInput(attrs={"class":"form-control", "placeholder":"Optional title"}),
+            "camera": forms.Select(attrs={"class":"form-control"}),
             "video_file": forms.ClearableFileInput(attrs={"class":"form-control-file"})
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Blank on the model only for archived footage (import_archive)
+        self.fields["video_file"].required = True
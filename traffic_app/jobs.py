@@ -0,0 +1,193 @@
+# traffic_app/jobs.py
+"""
+Background analysis jobs.
+
+Uploads are queued as AnalysisJob rows; one or more workers started with
+``python manage.py run_worker`` claim pending jobs and run the analysis
+outside the HTTP request cycle. While a job runs its worker renews the
+job's heartbeat; jobs whose heartbeat stopped are requeued, up to
+JOB_MAX_ATTEMPTS starts.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import downloads
+from .models import AnalysisJob
+from .services import analyze_video, apply_cached_result
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_analysis(video):
+    """
+    Queue a video for analysis. Reuses an existing pending/running job
+    for the same video instead of creating a duplicate.
+    """
+    job = (
+        AnalysisJob.objects
+        .filter(video=video, status__in=[AnalysisJob.STATUS_PENDING, AnalysisJob.STATUS_RUNNING])
+        .first()
+    )
+    if job is None:
+        job = AnalysisJob.objects.create(video=video)
+    return job
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next_job(worker="", filters=None):
+    """
+    Atomically claim the oldest pending job. Safe with several workers:
+    the conditional UPDATE only succeeds for one of them.
+    filters: optional queryset filters limiting the jobs considered.
+    Returns the claimed job or None when the queue is empty.
+    """
+    pending = AnalysisJob.objects.filter(status=AnalysisJob.STATUS_PENDING, **(filters or {}))
+    while True:
+        job = pending.order_by("created_at", "id").first()
+        if job is None:
+            return None
+
+        now = timezone.now()
+        claimed = AnalysisJob.objects.filter(pk=job.pk, status=AnalysisJob.STATUS_PENDING).update(
+            status=AnalysisJob.STATUS_RUNNING,
+            worker=worker,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+        # Another worker took it first, try the next one
+
+
+def heartbeat(job):
+    """Renew the heartbeat of a running job; False if its worker lost it."""
+    return bool(
+        AnalysisJob.objects.filter(pk=job.pk, status=AnalysisJob.STATUS_RUNNING, worker=job.worker)
+        .update(heartbeat_at=timezone.now())
+    )
+
+
+@contextmanager
+def keep_alive(job, interval=None):
+    """Renew the job's heartbeat from a background thread while the block runs."""
+    if interval is None:
+        interval = getattr(settings, "JOB_HEARTBEAT_SECONDS", 30)
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    if not heartbeat(job):
+                        logger.warning("Job %s is no longer held by %s", job.pk, job.worker)
+                except Exception as e:
+                    logger.warning("Heartbeat of job %s failed: %s", job.pk, e)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"job-{job.pk}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def requeue_stale_jobs(max_age_seconds=None, max_attempts=None):
+    """
+    Put RUNNING jobs whose heartbeat stopped (their worker died) back in
+    the queue; fail those already started max_attempts times.
+    Returns how many were requeued.
+    """
+    if max_age_seconds is None:
+        max_age_seconds = getattr(settings, "JOB_STALE_SECONDS", 300)
+    if max_attempts is None:
+        max_attempts = getattr(settings, "JOB_MAX_ATTEMPTS", 3)
+    cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+    stale = AnalysisJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=AnalysisJob.STATUS_RUNNING,
+    )
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=AnalysisJob.STATUS_FAILED,
+        error=f"Worker stopped responding; gave up after {max_attempts} attempts",
+        finished_at=timezone.now(),
+    )
+    if failed:
+        logger.warning("Failed %d stale jobs after %d attempts", failed, max_attempts)
+    return stale.update(status=AnalysisJob.STATUS_PENDING, worker="")
+
+
+def run_job(job, analyze=None):
+    """
+    Run a claimed job and record the outcome on the job row. A video
+    queued without a cache lookup (submitted by URL, downloaded first, or
+    registered by path) may turn out to have a cached result.
+    """
+    if analyze is None:
+        analyze = analyze_video
+
+    try:
+        with keep_alive(job):
+            video = job.video
+            if not video.video_file:
+                downloads.fetch(video)
+                if apply_cached_result(video) is None:
+                    analyze(video)
+            else:
+                analyze(video)
+    except Exception as e:
+        logger.error("Job %s failed: %s", job.pk, e)
+        job.status = AnalysisJob.STATUS_FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = AnalysisJob.STATUS_DONE
+        job.error = ""
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+    return job
+
+
+def run_worker(poll_interval=2.0, once=False, analyze=None, filters=None):
+    """
+    Worker loop: claim and run jobs until the queue is empty (once=True)
+    or forever, sleeping poll_interval seconds when idle. filters limits
+    the jobs taken, as in claim_next_job.
+    Returns the number of jobs processed.
+    """
+    name = worker_name()
+    requeued = requeue_stale_jobs()
+    if requeued:
+        logger.info("Requeued %d stale jobs", requeued)
+
+    processed = 0
+    while True:
+        job = claim_next_job(worker=name, filters=filters)
+        if job is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+
+        logger.info("Worker %s running job %s (video %s)", name, job.pk, job.video_id)
+        started = time.monotonic()
+        run_job(job, analyze=analyze)
+        processed += 1
+        logger.info("Job %s finished with %s in %.1fs", job.pk, job.status, time.monotonic() - started)
@@ -0,0 +1,55 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from traffic_app import dashboard
+from traffic_app.ml.classifier import load_model
+from traffic_app.models import ProcessingResult
+from traffic_app.services import classify_results, congestion_model_path
+
+
+class Command(BaseCommand):
+    help = "Classify the congestion of stored results again with the current model (or rules)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Results classified per model call (default: 1000)",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report how many labels would change",
+        )
+
+    def handle(self, *args, **options):
+        path = congestion_model_path()
+        using = path if load_model(path) is not None else "the rule-based classification"
+        self.stdout.write(f"Classifying with {using}")
+
+        changes = Counter()
+        last_pk = 0
+        while True:
+            batch = ProcessingResult.objects.filter(pk__gt=last_pk).order_by("pk")[:options["batch_size"]]
+            ids = list(batch.values_list("pk", flat=True))
+            if not ids:
+                break
+            last_pk = ids[-1]
+            labels = classify_results(ProcessingResult.objects.filter(pk__in=ids).only(
+                "id", "video_id", "congestion", "avg_vehicles_per_frame", "density_score", "video__uploaded_at",
+            ))
+            current = dict(ProcessingResult.objects.filter(pk__in=ids).values_list("pk", "congestion"))
+            changed = []
+            for pk, label in labels.items():
+                if label != current[pk]:
+                    changes[(current[pk], label)] += 1
+                    changed.append(ProcessingResult(pk=pk, congestion=label))
+            if changed and not options["dry_run"]:
+                ProcessingResult.objects.bulk_update(changed, ["congestion"])
+
+        if changes and not options["dry_run"]:
+            # bulk_update sends no post_save
+            dashboard.invalidate()
+        for (old, new), count in sorted(changes.items()):
+            self.stdout.write(f"{old} -> {new}: {count}")
+        verb = "would change" if options["dry_run"] else "changed"
+        self.stdout.write(self.style.SUCCESS(f"{sum(changes.values())} labels {verb}"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from traffic_app.alerts import run_dispatcher
+
+
+class Command(BaseCommand):
+    help = "Deliver queued n8n congestion alerts from the outbox, retrying failed ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval", type=float, default=None,
+            help="Seconds between checks for due alerts (default: ALERT_POLL_SECONDS)",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Exit once no alert is due instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Starting alert dispatcher...")
+        try:
+            sent = run_dispatcher(poll_interval=options["poll_interval"], once=options["once"])
+        except KeyboardInterrupt:
+            self.stdout.write("Dispatcher stopped.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} alerts"))
@@ -0,0 +1,62 @@
+import cv2
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from traffic_app.processing.backends import export_onnx
+from traffic_app.processing.frame_sampler import STRATEGY_SEEK, iter_sampled_frames, probe_video
+
+
+class Command(BaseCommand):
+    help = "Export the YOLO weights to ONNX for the onnxruntime backend, optionally quantized to INT8."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--weights", default=getattr(settings, "YOLO_MODEL", "yolov8n.pt"),
+            help="ultralytics weights to export (default: YOLO_MODEL)",
+        )
+        parser.add_argument("--output", help="Path of the written model (default: next to the weights)")
+        parser.add_argument("--imgsz", type=int, default=640, help="Input size (default: 640)")
+        parser.add_argument(
+            "--int8", action="store_true",
+            help="Also quantize to INT8 (static, calibrated on --calibration)",
+        )
+        parser.add_argument(
+            "--calibration",
+            help="Video from the target cameras to calibrate INT8 activations on",
+        )
+        parser.add_argument(
+            "--calibration-frames", type=int, default=64,
+            help="Frames spread over the calibration video (default: 64)",
+        )
+
+    def handle(self, *args, **options):
+        frames = None
+        if options["int8"]:
+            if not options["calibration"]:
+                raise CommandError("--int8 needs --calibration VIDEO")
+            frames = self.calibration_frames(options["calibration"], options["calibration_frames"])
+
+        path = export_onnx(
+            options["weights"],
+            output=options["output"],
+            imgsz=options["imgsz"],
+            int8=options["int8"],
+            calibration_frames=frames,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {path}. Use it with DETECTOR_BACKEND = 'onnx' and ONNX_MODEL = '{path}'"
+        ))
+
+    def calibration_frames(self, video_path, count):
+        total_frames, _ = probe_video(video_path)
+        if not total_frames:
+            raise CommandError(f"Could not read frames from {video_path}")
+        step = max(1, total_frames // max(1, count))
+
+        cap = cv2.VideoCapture(video_path)
+        try:
+            frames = [frame for _, frame in iter_sampled_frames(cap, step, STRATEGY_SEEK)][:count]
+        finally:
+            cap.release()
+        self.stdout.write(f"Calibrating on {len(frames)} frames from {video_path}")
+        return frames
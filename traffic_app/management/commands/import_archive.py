@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from traffic_app.archive import (
+    analyze_archived, archive_filters, format_progress, progress, register, requeue_orphaned_jobs,
+)
+from traffic_app.jobs import run_worker
+from traffic_app.models import Camera
+
+
+class Command(BaseCommand):
+    help = (
+        "Register the video files under a directory without copying them and analyse them "
+        "with a pool of workers. Rerun to resume an interrupted import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("root", help="Directory to scan recursively")
+        parser.add_argument("--camera", help="Name of an existing camera the recordings are from")
+        parser.add_argument(
+            "--workers", type=int, default=getattr(settings, "ARCHIVE_IMPORT_WORKERS", 2),
+            help="Worker processes to analyse with; 0 analyses in this process (default: 2)",
+        )
+        parser.add_argument(
+            "--retry-failed", action="store_true",
+            help="Analyse files whose analysis failed in an earlier run again",
+        )
+        parser.add_argument(
+            "--no-analyze", action="store_true",
+            help="Only register and queue the files, for the regular run_worker processes",
+        )
+        parser.add_argument(
+            "--progress-interval", type=float, default=10.0,
+            help="Seconds between progress lines (default: 10)",
+        )
+
+    def handle(self, *args, **options):
+        root = os.path.realpath(options["root"])
+        if not os.path.isdir(root):
+            raise CommandError(f"{root} is not a directory")
+        camera = None
+        if options["camera"]:
+            camera = Camera.objects.filter(name=options["camera"]).first()
+            if camera is None:
+                raise CommandError(f"Unknown camera {options['camera']}")
+
+        orphaned = requeue_orphaned_jobs(root)
+        if orphaned:
+            self.stdout.write(f"Requeued {orphaned} jobs of workers that died")
+
+        started = time.monotonic()
+        counts = register(root, camera, retry_failed=options["retry_failed"])
+        self.stdout.write(
+            f"Scanned {root} in {time.monotonic() - started:.1f}s: {counts['new']} new, "
+            f"{counts['changed']} changed, {counts['requeued']} requeued, {counts['skipped']} skipped"
+        )
+        if options["no_analyze"]:
+            return
+
+        start = progress(root)
+        started = time.monotonic()
+        try:
+            if options["workers"] <= 0:
+                run_worker(once=True, filters=archive_filters(root), analyze=analyze_archived)
+            else:
+                self.run_pool(root, options["workers"], start, started, options["progress_interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Import stopped; run it again to resume.")
+            return
+        current = progress(root)
+        self.stdout.write(self.style.SUCCESS(
+            f"Import finished: {format_progress(start, current, time.monotonic() - started)}"
+        ))
+
+    def run_pool(self, root, workers, start, started, interval):
+        """Run workers as run_worker processes limited to root, reporting progress until they exit."""
+        command = [sys.executable, "-m", "django", "run_worker", "--once", "--source-root", root]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        processes = [
+            subprocess.Popen(command, cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL)
+            for _ in range(workers)
+        ]
+        reported = time.monotonic()
+        try:
+            while any(process.poll() is None for process in processes):
+                time.sleep(min(interval, 1.0))
+                if time.monotonic() - reported >= interval:
+                    reported = time.monotonic()
+                    self.stdout.write(format_progress(start, progress(root), reported - started))
+        finally:
+            for process in processes:
+                if process.poll() is None:
+                    process.terminate()
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from traffic_app.models import Camera
+from traffic_app.streaming import run_camera
+
+
+class Command(BaseCommand):
+    help = "Continuously analyse a camera stream and store rolling-window snapshots."
+
+    def add_arguments(self, parser):
+        parser.add_argument("camera", help="Camera name (created if it doesn't exist)")
+        parser.add_argument(
+            "--source",
+            help="RTSP/HTTP URL or video file; saved as the camera's stream URL",
+        )
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Restart a file source from the beginning when it ends (stand-in stream)",
+        )
+        parser.add_argument(
+            "--window", type=float, default=getattr(settings, "STREAM_WINDOW_SECONDS", 60),
+            help="Rolling window length in seconds (default: 60)",
+        )
+        parser.add_argument(
+            "--snapshot-interval", type=float, default=getattr(settings, "STREAM_SNAPSHOT_SECONDS", 10),
+            help="Seconds between DB snapshots (default: 10)",
+        )
+        parser.add_argument(
+            "--sample-rate", type=int, default=getattr(settings, "STREAM_SAMPLE_RATE", 15),
+            help="Analyse every Nth frame of the stream (default: 15)",
+        )
+        parser.add_argument(
+            "--max-frames", type=int, default=None,
+            help="Stop after this many sampled frames",
+        )
+
+    def handle(self, *args, **options):
+        camera, _ = Camera.objects.get_or_create(name=options["camera"])
+        if options["source"] and options["source"] != camera.stream_url:
+            camera.stream_url = options["source"]
+            camera.save(update_fields=["stream_url"])
+
+        self.stdout.write(f"Ingesting {camera.name} from {camera.stream_url}...")
+        try:
+            window = run_camera(
+                camera,
+                window_seconds=options["window"],
+                snapshot_interval=options["snapshot_interval"],
+                sample_rate=options["sample_rate"],
+                loop=options["loop"],
+                max_frames=options["max_frames"],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Ingest stopped.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Stream ended, last window: {window.summary()['congestion']}"
+        ))
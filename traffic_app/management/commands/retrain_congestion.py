@@ -0,0 +1,112 @@
+import time
+
+import joblib
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from traffic_app import training
+from traffic_app.ml import classifier
+from traffic_app.ml.train_model import (
+    activate_version, fit_chunks, fit_scaler, list_versions, measure_latency, new_model, save_version,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Train a new version of the congestion model on operator-labelled results, "
+        "continuing from the latest version unless --fresh."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fresh", action="store_true",
+            help="Start from an untrained model instead of the latest version",
+        )
+        parser.add_argument(
+            "--full", action="store_true",
+            help="When continuing, train on all labelled results, not only those labelled since",
+        )
+        parser.add_argument(
+            "--epochs", type=int, default=1,
+            help="Passes over the training data (default: 1)",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=1000,
+            help="Results read and learned from at a time (default: 1000)",
+        )
+        parser.add_argument(
+            "--activate", action="store_true",
+            help="Use the new version for the analysis instead of CONGESTION_MODEL",
+        )
+        parser.add_argument(
+            "--report", action="store_true",
+            help="Only list the saved versions with their train time and latency",
+        )
+
+    def handle(self, *args, **options):
+        directory = getattr(settings, "CONGESTION_MODEL_DIR", settings.BASE_DIR / "models" / "congestion")
+        if options["report"]:
+            self.report(list_versions(directory))
+            return
+
+        versions = list_versions(directory)
+        parent = None if options["fresh"] or not versions else versions[-1]
+        until = training.latest_position()
+        if until is None:
+            raise CommandError("No labelled results to train on")
+        since = None
+        if parent is not None and not options["full"]:
+            since = training.decode_position(parent["trained_until"])
+
+        def chunks():
+            return training.iter_chunks(since, until, options["chunk_size"])
+
+        started = time.perf_counter()
+        if parent is None:
+            model = new_model()
+            fit_scaler(model, chunks())
+        else:
+            # Not memory-mapped: training updates the arrays in place
+            model = joblib.load(parent["path"])
+        stats = {"samples": 0}
+        for _ in range(options["epochs"]):
+            stats = fit_chunks(model, chunks())
+        train_seconds = time.perf_counter() - started
+
+        if not stats["samples"]:
+            self.stdout.write("No results labelled since the last version; nothing to train.")
+            return
+        metadata = save_version(model, directory, {
+            "parent": parent["version"] if parent else None,
+            "created_at": timezone.now().isoformat(),
+            "trained_until": training.encode_position(until),
+            "samples": stats["samples"],
+            "chunks": stats["chunks"],
+            "epochs": options["epochs"],
+            "label_counts": dict(zip(classifier.LABELS, stats["label_counts"])),
+            "progressive_accuracy": stats["accuracy"],
+            "train_seconds": train_seconds,
+            "latency": measure_latency(model, stats["last_chunk"]),
+        })
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved version {metadata['version']} ({metadata['samples']} samples) to {metadata['path']}"
+        ))
+
+        if options["activate"]:
+            pointer = activate_version(directory, metadata["version"])
+            self.stdout.write(f"Activated version {metadata['version']} ({pointer})")
+        self.report(versions + [metadata])
+
+    def report(self, versions):
+        if not versions:
+            self.stdout.write("No saved versions.")
+            return
+        self.stdout.write(f"{'version':>7} {'parent':>6} {'samples':>8} {'accuracy':>8} {'train s':>8} "
+                          f"{'1-row ms':>8} {'batch us/row':>12}")
+        for v in versions:
+            accuracy = f"{v['progressive_accuracy']:.3f}" if v["progressive_accuracy"] is not None else "-"
+            self.stdout.write(
+                f"{v['version']:>7} {v['parent'] or '-':>6} {v['samples']:>8} {accuracy:>8} "
+                f"{v['train_seconds']:>8.2f} {v['latency']['single_ms']:>8.3f} {v['latency']['batch_us_per_row']:>12.2f}"
+            )
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from traffic_app.archive import analyze_archived, archive_filters
+from traffic_app.jobs import run_worker
+from traffic_app.result_cache import analysis_params
+from traffic_app.services import backend_options
+
+
+class Command(BaseCommand):
+    help = "Run a background worker that processes queued video analysis jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval", type=float, default=2.0,
+            help="Seconds to sleep when the queue is empty (default: 2)",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Exit once the queue is empty instead of polling forever",
+        )
+        parser.add_argument(
+            "--source-root",
+            help="Only take jobs of archived files under this directory (see import_archive)",
+        )
+        parser.add_argument(
+            "--warmup", action="store_true",
+            default=getattr(settings, "WARMUP_MODEL_ON_START", False),
+            help="Load the model and run a dummy inference before taking jobs",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Starting analysis worker...")
+        if options["warmup"]:
+            from traffic_app.processing.model_registry import warmup
+
+            params = analysis_params()
+            seconds = warmup(params["model"], backend=params["backend"], **backend_options())
+            self.stdout.write(f"Model warmed up in {seconds:.2f}s")
+
+        archive = {}
+        if options["source_root"]:
+            archive = {"filters": archive_filters(options["source_root"]), "analyze": analyze_archived}
+
+        try:
+            processed = run_worker(
+                poll_interval=options["poll_interval"],
+                once=options["once"],
+                **archive,
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Worker stopped.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs"))
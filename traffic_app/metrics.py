@@ -0,0 +1,268 @@
+# traffic_app/metrics.py
+"""
+Prometheus metrics, served in the text exposition format at /metrics.
+
+Counters and histograms live in a plain dict per process; updating one is
+a dict update under a lock. Analyses are recorded once per job from their
+PipelineStats, not per frame.
+
+Web and worker processes each hold their own values. With METRICS_DIR
+set, every process writes its values to METRICS_DIR/metrics-<pid>.json
+after each job (and before serving /metrics), and the endpoint sums the
+files of all processes. Point every process at the same directory and
+empty it when deploying, as with prometheus_client's multiprocess mode.
+Without METRICS_DIR only the serving process's own values are exported.
+"""
+import json
+import math
+import os
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+_lock = threading.Lock()
+# (metric name, label values) -> number (counter) or
+# [per-bucket counts..., +Inf count, sum] (histogram)
+_values = {}
+_dirty = False
+_loaded_previous = False
+
+_metrics = {}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DURATION_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _key(self, labels):
+        return self.name, tuple(str(labels[label]) for label in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        global _dirty
+        key = self._key(labels)
+        with _lock:
+            _values[key] = _values.get(key, 0) + amount
+            _dirty = True
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(b) for b in buckets)
+
+    def observe(self, value, **labels):
+        self.observe_many([value], **labels)
+
+    def observe_many(self, values, **labels):
+        global _dirty
+        key = self._key(labels)
+        with _lock:
+            entry = _values.get(key)
+            if entry is None:
+                entry = _values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for value in values:
+                # Bucket i counts le=buckets[i]; the last one is +Inf
+                entry[bisect_left(self.buckets, value)] += 1
+                entry[-1] += value
+            _dirty = True
+
+
+class Gauge(_Metric):
+    """Value computed at scrape time by collect() -> {label values tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+
+VIDEOS_PROCESSED = Counter(
+    "traffic_videos_processed_total", "Videos with a stored result, by source (analysis or cache)", ["source"],
+)
+FRAMES_DECODED = Counter("traffic_frames_decoded_total", "Sampled frames decoded from videos")
+FRAMES_INFERRED = Counter("traffic_frames_inferred_total", "Sampled frames the detector ran on")
+FRAMES_SKIPPED = Counter("traffic_frames_skipped_total", "Sampled frames skipped by motion gating")
+INFERENCE_LATENCY = Histogram(
+    "traffic_inference_latency_seconds", "Detector time per batch of sampled frames", buckets=LATENCY_BUCKETS,
+)
+ANALYSIS_DURATION = Histogram(
+    "traffic_analysis_duration_seconds", "Wall time of one video analysis", buckets=DURATION_BUCKETS,
+)
+PIPELINE_QUEUE_DEPTH = Histogram(
+    "traffic_pipeline_queue_depth", "Largest number of batches waiting for inference during an analysis",
+    buckets=(0, 1, 2, 4, 8, 16),
+)
+WEBHOOK_FAILURES = Counter("traffic_webhook_failures_total", "n8n alert deliveries that failed")
+CONGESTION = Counter("traffic_congestion_total", "Analysed videos by congestion level", ["level"])
+
+
+def _job_counts():
+    from django.db.models import Count
+
+    from .models import AnalysisJob
+
+    rows = AnalysisJob.objects.values("status").annotate(n=Count("id"))
+    counts = {(status,): 0 for status, _ in AnalysisJob.STATUS_CHOICES}
+    counts.update({(row["status"],): row["n"] for row in rows})
+    return counts
+
+
+JOBS = Gauge("traffic_analysis_jobs", "Analysis jobs by status (pending = queue depth)", ["status"],
+             collect=_job_counts)
+
+
+def record_pipeline(stats):
+    """Count frames and observe inference latencies of one pipeline.PipelineStats."""
+    stages, counters = stats.stages, stats.counters
+    decode, inference = stages.get("decode"), stages.get("inference")
+    if decode is not None:
+        FRAMES_DECODED.inc(decode.items)
+    if inference is not None:
+        skipped = counters.get("skipped_frames", 0)
+        FRAMES_INFERRED.inc(counters.get("inferred_frames", inference.items - skipped))
+        FRAMES_SKIPPED.inc(skipped)
+        INFERENCE_LATENCY.observe_many(inference.durations)
+        PIPELINE_QUEUE_DEPTH.observe(inference.max_queue_depth)
+
+
+def record_result(result, source, profile=None):
+    VIDEOS_PROCESSED.inc(source=source)
+    CONGESTION.inc(level=result.congestion)
+    if profile is not None and source == "analysis":
+        ANALYSIS_DURATION.observe(profile.total_seconds)
+
+
+def _metrics_dir():
+    return getattr(settings, "METRICS_DIR", "") or ""
+
+
+def _path(directory, pid=None):
+    return os.path.join(directory, f"metrics-{pid or os.getpid()}.json")
+
+
+def _encode(values):
+    return [[name, list(labels), value] for (name, labels), value in values.items()]
+
+
+def _merge_into(target, rows):
+    for name, labels, value in rows:
+        key = name, tuple(labels)
+        current = target.get(key)
+        if current is None:
+            target[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(current, list):
+            target[key] = [a + b for a, b in zip(current, value)]
+        else:
+            target[key] = current + value
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def flush(force=False):
+    """Write this process's values to METRICS_DIR, if set and changed."""
+    global _dirty, _loaded_previous
+    directory = _metrics_dir()
+    if not directory or not (_dirty or force):
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = _path(directory)
+    with _lock:
+        if not _loaded_previous:
+            # A file left by an earlier process with the same pid: keep its
+            # totals so the summed counters never go down
+            _merge_into(_values, _read(path))
+            _loaded_previous = True
+        rows = _encode(_values)
+        _dirty = False
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(rows, f)
+    os.replace(tmp, path)
+
+
+def collect():
+    """Summed values of all processes (or just this one without METRICS_DIR)."""
+    directory = _metrics_dir()
+    if not directory:
+        with _lock:
+            return {key: list(value) if isinstance(value, list) else value for key, value in _values.items()}
+    flush(force=True)
+    values = {}
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("metrics-") and name.endswith(".json"):
+            _merge_into(values, _read(os.path.join(directory, name)))
+    return values
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    values = collect()
+    lines = []
+    for metric in _metrics.values():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if metric.kind == "gauge":
+            for labels, value in metric.collect().items():
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}")
+            continue
+
+        series = sorted((labels, value) for (name, labels), value in values.items() if name == metric.name)
+        if not series and not metric.labelnames:
+            series = [((), [0] * (len(metric.buckets) + 2) if metric.kind == "histogram" else 0)]
+        for labels, value in series:
+            if metric.kind == "counter":
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (math.inf,), value[:-1]):
+                cumulative += count
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{metric.name}_bucket{_format_labels(metric.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(metric.labelnames, labels)
+            lines.append(f"{metric.name}_sum{label_text} {_format_value(value[-1])}")
+            lines.append(f"{metric.name}_count{label_text} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Forget this process's values (tests)."""
+    global _dirty, _loaded_previous
+    with _lock:
+        _values.clear()
+        _dirty = False
+        _loaded_previous = False
@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 19:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0007_result_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Camera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('stream_url', models.CharField(blank=True, default='', max_length=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrafficSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('window_seconds', models.FloatField(default=60.0)),
+                ('sampled_frames', models.IntegerField(default=0)),
+                ('avg_vehicles_per_frame', models.FloatField(default=0.0)),
+                ('density_score', models.FloatField(default=0.0)),
+                ('congestion', models.CharField(choices=[('LOW', 'LOW'), ('MEDIUM', 'MEDIUM'), ('HIGH', 'HIGH')], default='LOW', max_length=10)),
+                ('avg_cars', models.FloatField(default=0.0)),
+                ('avg_bikes', models.FloatField(default=0.0)),
+                ('avg_trucks', models.FloatField(default=0.0)),
+                ('avg_buses', models.FloatField(default=0.0)),
+                ('camera', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='traffic_app.camera')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['camera', 'taken_at'], name='traffic_app_camera__aa3e47_idx')],
+            },
+        ),
+    ]
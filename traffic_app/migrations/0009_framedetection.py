@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 20:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0008_camera_trafficsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FrameDetection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frame_index', models.IntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('cars', models.SmallIntegerField(default=0)),
+                ('bikes', models.SmallIntegerField(default=0)),
+                ('trucks', models.SmallIntegerField(default=0)),
+                ('buses', models.SmallIntegerField(default=0)),
+                ('total', models.SmallIntegerField(default=0)),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='frames', to='traffic_app.processingresult')),
+            ],
+            options={
+                'ordering': ['timestamp'],
+                'indexes': [models.Index(fields=['timestamp'], name='traffic_app_timesta_8872ff_idx'), models.Index(fields=['result', 'frame_index'], name='traffic_app_result__257e4e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0009_framedetection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingresult',
+            name='line_crossings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
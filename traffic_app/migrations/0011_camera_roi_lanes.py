@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0010_processingresult_line_crossings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camera',
+            name='roi',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='processingresult',
+            name='lane_stats',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='camera',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='uploads', to='traffic_app.camera'),
+        ),
+        migrations.CreateModel(
+            name='Lane',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('polygon', models.JSONField(default=list)),
+                ('capacity', models.FloatField(default=10.0)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('camera', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lanes', to='traffic_app.camera')),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+                'constraints': [models.UniqueConstraint(fields=('camera', 'name'), name='unique_lane_name_per_camera')],
+            },
+        ),
+    ]
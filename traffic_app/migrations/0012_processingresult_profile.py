@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0011_camera_roi_lanes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingresult',
+            name='profile',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
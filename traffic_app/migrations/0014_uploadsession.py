@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:11
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0013_alertoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('title', models.CharField(blank=True, max_length=200)),
+                ('size', models.BigIntegerField()),
+                ('received', models.BigIntegerField(default=0)),
+                ('block_digests', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('UPLOADING', 'UPLOADING'), ('COMPLETE', 'COMPLETE'), ('ABORTED', 'ABORTED')], default='UPLOADING', max_length=10)),
+                ('analyze_prefix', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('camera', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='traffic_app.camera')),
+                ('preview', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='traffic_app.videoupload')),
+                ('video', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='traffic_app.videoupload')),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0014_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='videoupload',
+            name='uploaded_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='processingresult',
+            index=models.Index(fields=['processed_at', 'id'], name='traffic_app_process_e09876_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='processingresult',
+            index=models.Index(fields=['congestion', 'processed_at'], name='traffic_app_congest_37c871_idx'),
+        ),
+    ]
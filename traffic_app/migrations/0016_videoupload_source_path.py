@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0015_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='source_mtime',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='source_path',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=1024),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='source_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='videoupload',
+            name='video_file',
+            field=models.FileField(blank=True, upload_to='uploads/'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0016_videoupload_source_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingresult',
+            name='congestion_label',
+            field=models.CharField(blank=True, choices=[('LOW', 'LOW'), ('MEDIUM', 'MEDIUM'), ('HIGH', 'HIGH')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='processingresult',
+            name='labelled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='processingresult',
+            index=models.Index(fields=['labelled_at', 'id'], name='traffic_app_labelle_e21841_idx'),
+        ),
+    ]
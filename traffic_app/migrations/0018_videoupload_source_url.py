@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0017_processingresult_congestion_label'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='source_url',
+            field=models.URLField(blank=True, default='', max_length=2000),
+        ),
+    ]
@@ -0,0 +1,121 @@
+# traffic_app/ml/classifier.py
+"""
+Learned congestion classifier.
+
+train_model.py fits a classifier on [mean, std, last, hour] of a series
+of vehicles-per-frame counts, labels 0/1/2 = LOW/MEDIUM/HIGH. This module
+computes those features from detection series and classifies them.
+
+The model is loaded once per process (again only when the file changes)
+with joblib's mmap_mode="r": numpy arrays in the file are mapped rather
+than read into memory, so models keeping plain arrays share them between
+the worker processes of a host through the page cache. (scikit-learn
+trees copy their node arrays into their own structures on load; for a
+forest, mapping only saves the intermediate copy.) classify_batch() runs
+a single predict() for many series. Without a readable model the
+rule-based compute_congestion is used instead.
+
+A version trained by retrain_congestion is put in use by a pointer file,
+<name>-active.json in the versions directory (see active_version), so the
+baseline model.joblib shipped with the code is never overwritten.
+"""
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from ..processing.compute_density import compute_congestion
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.joblib")
+LABELS = ("LOW", "MEDIUM", "HIGH")
+
+# path -> ((mtime_ns, size), model or None if unreadable)
+_models = {}
+_lock = threading.Lock()
+
+
+def _file_version(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def active_version(directory, name="congestion"):
+    """Path of the version activated in directory (train_model.activate_version), or None."""
+    try:
+        with open(os.path.join(directory, f"{name}-active.json")) as f:
+            return os.path.join(directory, json.load(f)["file"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def load_model(path=MODEL_PATH):
+    """The model at path, loaded on first use; None if it is missing or unreadable."""
+    if not path:
+        return None
+    path = os.fspath(path)
+    version = _file_version(path)
+    if version is None:
+        return None
+    cached = _models.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _lock:
+        cached = _models.get(path)
+        if cached is None or cached[0] != version:
+            import joblib
+
+            try:
+                model = joblib.load(path, mmap_mode="r")
+            except Exception as e:
+                # Remembered for this file version, so this is logged once
+                logger.warning("Cannot load congestion model %s (%s), using rules", path, e)
+                model = None
+            cached = _models[path] = (version, model)
+    return cached[1]
+
+
+def model_version(path=MODEL_PATH):
+    """Identifies the classifier in use, for result cache keys: "rules" or the model file's version."""
+    if load_model(path) is None:
+        return "rules"
+    mtime_ns, size = _file_version(path)
+    return f"{os.path.basename(path)}:{mtime_ns}:{size}"
+
+
+def series_features(counts, hour):
+    """[mean, std, last, hour] of vehicles-per-frame counts, as in train_model.py."""
+    counts = np.asarray(counts, dtype=np.float64)
+    return [counts.mean(), counts.std(), counts[-1], float(hour)]
+
+
+def classify_batch(samples, path=MODEL_PATH):
+    """
+    Congestion labels for many series at once.
+    samples: (counts, hour, avg_vehicles_per_frame, density_score) tuples;
+    series without counts are classified by the rules.
+    """
+    samples = list(samples)
+    labels = [None] * len(samples)
+    model = load_model(path)
+    learned = [i for i, (counts, _, _, _) in enumerate(samples) if len(counts)] if model is not None else []
+    if learned:
+        features = np.array([series_features(samples[i][0], samples[i][1]) for i in learned])
+        for i, label in zip(learned, model.predict(features)):
+            labels[i] = LABELS[int(label)]
+    for i, (_, _, avg_per_frame, density) in enumerate(samples):
+        if labels[i] is None:
+            labels[i] = compute_congestion(avg_per_frame, density)
+    return labels
+
+
+def classify(counts, hour, avg_vehicles_per_frame, density_score, path=MODEL_PATH):
+    """Congestion label of one series, see classify_batch."""
+    return classify_batch([(counts, hour, avg_vehicles_per_frame, density_score)], path)[0]
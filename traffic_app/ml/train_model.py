@@ -1,11 +1,35 @@
 # traffic_app/ml/train_model.py
+"""
+Training of the congestion model (see classifier.py for its features).
+
+train_and_save() fits a RandomForest on a synthetic dataset, as a
+starting point. Models trained on stored detections (``python manage.py
+retrain_congestion``) are a StandardScaler + SGDClassifier pipeline
+instead, which learns from one chunk of samples at a time (partial_fit):
+the training set never has to fit in memory, and a later version can
+continue from the previous one with only the newly labelled samples.
+
+Each trained model is saved as a numbered version, <name>-vNNNN.joblib
+next to <name>-vNNNN.json with its training metadata. activate_version
+points <name>-active.json at the version the analysis should use.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
 import joblib
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
-from pathlib import Path
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
 
 MODEL_PATH = Path(__file__).parent / "model.joblib"
 
+# Label indices of classifier.LABELS
+CLASSES = np.array([0, 1, 2])
+
 def generate_synthetic_dataset(n=1000):
     rng = np.random.RandomState(0)
     X = []
@@ -29,5 +53,110 @@ def train_and_save():
     joblib.dump(clf, MODEL_PATH)
     print("Saved model to", MODEL_PATH)
 
+
+def new_model():
+    """An untrained incremental model."""
+    return make_pipeline(StandardScaler(), SGDClassifier(loss="log_loss", random_state=0))
+
+
+def fit_scaler(model, chunks):
+    """Fit the model's feature scaling on (X, y) chunks, one at a time."""
+    for X, _ in chunks:
+        model[0].partial_fit(X)
+
+
+def fit_chunks(model, chunks):
+    """
+    Update the classifier with (X, y) chunks. Each chunk is predicted
+    before it is learned from (progressive validation), so the returned
+    accuracy is measured on samples the model had not seen yet.
+    Returns {"samples", "chunks", "accuracy", "label_counts", "last_chunk"}.
+    """
+    scaler, sgd = model[0], model[-1]
+    samples = chunks_seen = evaluated = correct = 0
+    label_counts = np.zeros(len(CLASSES), dtype=np.int64)
+    last_chunk = None
+    for X, y in chunks:
+        if hasattr(sgd, "coef_"):
+            correct += int((model.predict(X) == y).sum())
+            evaluated += len(y)
+        sgd.partial_fit(scaler.transform(X), y, classes=CLASSES)
+        samples += len(y)
+        chunks_seen += 1
+        label_counts += np.bincount(y, minlength=len(CLASSES))
+        last_chunk = X
+    return {
+        "samples": samples,
+        "chunks": chunks_seen,
+        "accuracy": correct / evaluated if evaluated else None,
+        "label_counts": label_counts.tolist(),
+        "last_chunk": last_chunk,
+    }
+
+
+def measure_latency(model, X, repeats=20):
+    """
+    Inference latency on sample features X: {"single_ms"} per one-row
+    predict() and {"batch_us_per_row"} for predict() on all of X (medians).
+    """
+    def median_seconds(rows):
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            model.predict(rows)
+            timings.append(time.perf_counter() - started)
+        return float(np.median(timings))
+
+    return {
+        "single_ms": median_seconds(X[:1]) * 1e3,
+        "batch_rows": len(X),
+        "batch_us_per_row": median_seconds(X) / len(X) * 1e6,
+    }
+
+
+def _version_path(directory, name, version, ext):
+    return Path(directory) / f"{name}-v{version:04d}.{ext}"
+
+
+def list_versions(directory, name="congestion"):
+    """Metadata of the saved versions, oldest first."""
+    versions = []
+    for path in sorted(Path(directory).glob(f"{name}-v*.json")):
+        with open(path) as f:
+            versions.append(json.load(f))
+    return versions
+
+
+def save_version(model, directory, metadata, name="congestion"):
+    """
+    Save model as the next version in directory, uncompressed so it can be
+    memory-mapped. Returns the metadata written, with "version" and "path".
+    """
+    os.makedirs(directory, exist_ok=True)
+    existing = list_versions(directory, name)
+    version = existing[-1]["version"] + 1 if existing else 1
+    path = _version_path(directory, name, version, "joblib")
+    joblib.dump(model, path)
+    metadata = dict(metadata, version=version, path=str(path))
+    # Metadata last: a version without it was not saved completely
+    with open(_version_path(directory, name, version, "json"), "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def activate_version(directory, version, name="congestion"):
+    """Point the analysis at a saved version (see classifier.active_version)."""
+    path = _version_path(directory, name, version, "joblib")
+    if not path.is_file():
+        raise FileNotFoundError(path)
+    pointer = Path(directory) / f"{name}-active.json"
+    tmp = pointer.with_name(f"{pointer.name}.tmp")
+    with open(tmp, "w") as f:
+        json.dump({"version": version, "file": path.name}, f)
+    # Workers notice the switch on their next classification
+    os.replace(tmp, pointer)
+    return pointer
+
+
 if __name__ == "__main__":
     train_and_save()
@@ -1,13 +1,98 @@
+import uuid
+
 from django.db import models
 
 class VideoUpload(models.Model):
     title = models.CharField(max_length=200, blank=True)
-    video_file = models.FileField(upload_to="uploads/")
-    uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Empty for archived footage analysed in place, see source_path
+    video_file = models.FileField(upload_to="uploads/", blank=True)
+    uploaded_at = models.DateTimeField(auto_now_add=True, db_index=True)
     processed = models.BooleanField(default=False)
+    # Streaming hash of the file contents, see result_cache.hash_file
+    content_hash = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    # Camera the clip was recorded by; its ROI and lanes apply to the analysis
+    camera = models.ForeignKey("Camera", on_delete=models.SET_NULL, null=True, blank=True, related_name="uploads")
+    # Absolute path of a file registered by import_archive or submitted to
+    # the API by path, which is read where it is instead of being copied to
+    # MEDIA_ROOT; with its mtime and size at registration, to notice files
+    # that changed since
+    source_path = models.CharField(max_length=1024, blank=True, default="", db_index=True)
+    source_mtime = models.FloatField(null=True, blank=True)
+    source_size = models.BigIntegerField(null=True, blank=True)
+    # URL of a video submitted through the API, downloaded into video_file
+    # by the worker running its job
+    source_url = models.URLField(max_length=2000, blank=True, default="")
+
+    @property
+    def file_path(self):
+        """Local path of the video to analyse."""
+        return self.source_path or self.video_file.path
+
+    def __str__(self):
+        return f"{self.title or self.video_file.name or self.source_path or self.source_url} ({self.uploaded_at})"
+
+
+class Camera(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    # RTSP/HTTP URL, or a file path standing in for a stream
+    stream_url = models.CharField(max_length=500, blank=True, default="")
+    # Region of interest [[x, y], ...] in normalised (0..1) frame
+    # coordinates; empty means the whole frame
+    roi = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Lane(models.Model):
+    """
+    A lane of a camera view: a polygon in normalised frame coordinates.
+    Vehicles are assigned to the lane containing their bottom centre.
+    """
+    camera = models.ForeignKey(Camera, on_delete=models.CASCADE, related_name="lanes")
+    name = models.CharField(max_length=50)
+    polygon = models.JSONField(default=list)
+    # Vehicles in view that make the lane full (density 1.0)
+    capacity = models.FloatField(default=10.0)
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["position", "id"]
+        constraints = [models.UniqueConstraint(fields=["camera", "name"], name="unique_lane_name_per_camera")]
+
+    def __str__(self):
+        return f"{self.camera} / {self.name}"
+
+
+class TrafficSnapshot(models.Model):
+    """
+    Rolling-window metrics for a live camera at one point in time.
+    Vehicle figures are averages per sampled frame over the window.
+    """
+    camera = models.ForeignKey(Camera, on_delete=models.CASCADE, related_name="snapshots")
+    taken_at = models.DateTimeField()
+    window_seconds = models.FloatField(default=60.0)
+    sampled_frames = models.IntegerField(default=0)
+
+    avg_vehicles_per_frame = models.FloatField(default=0.0)
+    density_score = models.FloatField(default=0.0)
+    congestion = models.CharField(
+        max_length=10,
+        choices=[("LOW","LOW"),("MEDIUM","MEDIUM"),("HIGH","HIGH")],
+        default="LOW"
+    )
+
+    avg_cars = models.FloatField(default=0.0)
+    avg_bikes = models.FloatField(default=0.0)
+    avg_trucks = models.FloatField(default=0.0)
+    avg_buses = models.FloatField(default=0.0)
+
+    class Meta:
+        indexes = [models.Index(fields=["camera", "taken_at"])]
 
     def __str__(self):
-        return f"{self.title or self.video_file.name} ({self.uploaded_at})"
+        return f"{self.camera} @ {self.taken_at} - {self.congestion}"
 
 
 class ProcessingResult(models.Model):
@@ -38,7 +123,202 @@ class ProcessingResult(models.Model):
     count_trucks = models.IntegerField(default=0)
     count_buses = models.IntegerField(default=0)
 
+    # Tracked vehicles crossing the counting line:
+    # {"by_type": {"car": n, ...}, "by_direction": {"positive": n, "negative": n}}
+    line_crossings = models.JSONField(default=dict, blank=True)
+
+    # Per-lane density and signal timing when the camera defines lanes:
+    # {lane: {"avg_vehicles_per_frame", "density_score", "counts",
+    #         "green_extension", "pattern", "green_share"}}
+    lane_stats = models.JSONField(default=dict, blank=True)
+
+    # Wall time and work per analysis stage, see profiling.AnalysisProfile:
+    # {"total_seconds", "stages": {stage: {"seconds", "frames", ...}}, "dump"}
+    profile = models.JSONField(default=dict, blank=True)
+
     processed_at = models.DateTimeField(auto_now_add=True)
 
+    # Congestion as judged by an operator (admin), the training target of
+    # the congestion model; see training.py
+    congestion_label = models.CharField(
+        max_length=10,
+        choices=[("LOW","LOW"),("MEDIUM","MEDIUM"),("HIGH","HIGH")],
+        blank=True,
+        default=""
+    )
+    labelled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Dashboard period filters and keyset pagination, see dashboard.py
+            models.Index(fields=["processed_at", "id"]),
+            models.Index(fields=["congestion", "processed_at"]),
+            # Training data in labelling order
+            models.Index(fields=["labelled_at", "id"]),
+        ]
+
     def __str__(self):
         return f"Result for {self.video_id} - {self.congestion}"
+
+
+class AnalysisJob(models.Model):
+    STATUS_PENDING = "PENDING"
+    STATUS_RUNNING = "RUNNING"
+    STATUS_DONE = "DONE"
+    STATUS_FAILED = "FAILED"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "PENDING"),
+        (STATUS_RUNNING, "RUNNING"),
+        (STATUS_DONE, "DONE"),
+        (STATUS_FAILED, "FAILED"),
+    ]
+
+    video = models.ForeignKey(VideoUpload, on_delete=models.CASCADE, related_name="jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Renewed by the worker while the job runs, see jobs.keep_alive
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"Job {self.pk} for {self.video_id} - {self.status}"
+
+
+class CachedResult(models.Model):
+    """
+    Analysis output for one (video contents, analysis parameters) pair,
+    reused when the same clip is uploaded again.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    params = models.JSONField(default=dict)
+    payload = models.JSONField(default=dict)
+    size_bytes = models.IntegerField(default=0)
+    hits = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Cached result {self.key[:12]} ({self.hits} hits)"
+
+
+class FrameDetection(models.Model):
+    """
+    Vehicle counts for one sampled frame of a result. `timestamp` is the
+    clip start plus frame_index / fps, so series from different clips
+    share one time axis.
+    """
+    result = models.ForeignKey(ProcessingResult, on_delete=models.CASCADE, related_name="frames")
+    frame_index = models.IntegerField()
+    timestamp = models.DateTimeField()
+
+    cars = models.SmallIntegerField(default=0)
+    bikes = models.SmallIntegerField(default=0)
+    trucks = models.SmallIntegerField(default=0)
+    buses = models.SmallIntegerField(default=0)
+    total = models.SmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["timestamp"]
+        indexes = [
+            models.Index(fields=["timestamp"]),
+            models.Index(fields=["result", "frame_index"]),
+        ]
+
+    def __str__(self):
+        return f"Result {self.result_id} frame {self.frame_index}: {self.total}"
+
+
+class AlertOutbox(models.Model):
+    """
+    A congestion alert waiting for (or done with) delivery to the n8n
+    webhook. Alerts for a location that is still waiting are coalesced into
+    one row carrying the latest payload. See alerts.py.
+    """
+    STATUS_PENDING = "PENDING"
+    STATUS_SENT = "SENT"
+    STATUS_FAILED = "FAILED"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "PENDING"),
+        (STATUS_SENT, "SENT"),
+        (STATUS_FAILED, "FAILED"),
+    ]
+
+    location = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    # Alerts merged into this row while it was waiting
+    coalesced = models.IntegerField(default=0)
+    # Bumped on every payload change, so a delivery in flight can tell
+    # whether it sent the latest one
+    version = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Earliest time of the next delivery attempt (retry backoff, or the
+    # lease of a dispatcher working on it)
+    next_attempt_at = models.DateTimeField()
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["next_attempt_at", "id"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["location", "status"]),
+        ]
+
+    def __str__(self):
+        return f"Alert {self.pk} for {self.location} - {self.status}"
+
+
+class UploadSession(models.Model):
+    """
+    A chunked, resumable upload in progress. Chunks are written to
+    `part_path` under MEDIA_ROOT as they arrive; `received` is how many
+    bytes from the start are on disk. See uploads.py.
+    """
+    STATUS_UPLOADING = "UPLOADING"
+    STATUS_COMPLETE = "COMPLETE"
+    STATUS_ABORTED = "ABORTED"
+    STATUS_CHOICES = [
+        (STATUS_UPLOADING, "UPLOADING"),
+        (STATUS_COMPLETE, "COMPLETE"),
+        (STATUS_ABORTED, "ABORTED"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    title = models.CharField(max_length=200, blank=True)
+    camera = models.ForeignKey(Camera, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    # SHA-256 hex digests of the complete HASH_BLOCK_SIZE blocks received
+    # so far, see result_cache.hash_blocks
+    block_digests = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_UPLOADING)
+    # Analyse the first part of the file while the rest is uploading
+    analyze_prefix = models.BooleanField(default=False)
+
+    video = models.OneToOneField(VideoUpload, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name="upload_session")
+    preview = models.ForeignKey(VideoUpload, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def part_path(self):
+        return f"uploads/partial/{self.pk}.part"
+
+    def __str__(self):
+        return f"Upload {self.pk} ({self.received}/{self.size} bytes) - {self.status}"
@@ -0,0 +1,210 @@
+# traffic_app/mqtt.py
+"""
+Congestion and signal-timing events for signal controllers, over MQTT.
+
+Every analysed upload of a camera and every live snapshot publishes two
+messages, retained by default so a controller that (re)subscribes gets
+the current state at once:
+
+    <MQTT_TOPIC_PREFIX>/<camera>/congestion   level, density, vehicles per frame
+    <MQTT_TOPIC_PREFIX>/<camera>/signal       green extension, pattern, per-lane timing
+
+Each process keeps one connection (paho-mqtt's network thread reconnects
+on its own). While the broker is unreachable messages are kept in a
+bounded in-memory buffer, oldest dropped first, and published on
+reconnect; QoS 1/2 messages already handed to paho are re-sent by it.
+"""
+import json
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .processing.signal_optimizer import optimize_signal_timing
+
+logger = logging.getLogger(__name__)
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+class MqttPublisher:
+    """
+    Persistent MQTT connection with a local buffer for when it is down.
+
+    Args:
+        host, port: Broker address
+        qos: QoS level of published messages (0, 1 or 2)
+        retain: Ask the broker to retain the last message per topic
+        buffer_size: Messages kept while disconnected
+        keepalive: Seconds between pings
+        reconnect_delay: (min, max) seconds between reconnect attempts
+        username, password, tls, client_id: Broker credentials and transport
+    """
+
+    def __init__(self, host, port=1883, qos=1, retain=True, buffer_size=1000, keepalive=60,
+                 reconnect_delay=(1, 30), username=None, password=None, tls=False, client_id=""):
+        import paho.mqtt.client as mqtt
+
+        self.qos = qos
+        self.retain = retain
+        self.buffer = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self.connected = False
+        self._lock = threading.Lock()
+        self._success = mqtt.MQTT_ERR_SUCCESS
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+        if username:
+            self.client.username_pw_set(username, password)
+        if tls:
+            self.client.tls_set()
+        self.client.reconnect_delay_set(*reconnect_delay)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        # Does not block on an unreachable broker; the loop keeps retrying
+        self.client.connect_async(host, port, keepalive)
+        self.client.loop_start()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            logger.warning("MQTT broker refused connection: %s", reason_code)
+            return
+        # Connected only once the buffer is empty: until then, messages
+        # published meanwhile are buffered behind the ones being sent
+        while True:
+            with self._lock:
+                pending = list(self.buffer)
+                self.buffer.clear()
+                if not pending:
+                    self.connected = True
+                    return
+            logger.info("MQTT connected, publishing %d buffered messages", len(pending))
+            for i, (topic, data) in enumerate(pending):
+                if not self._publish(topic, data):
+                    # Lost the connection again: keep the rest, in order
+                    with self._lock:
+                        rest = pending[i:] + list(self.buffer)
+                        self.dropped += max(0, len(rest) - self.buffer.maxlen)
+                        self.buffer.clear()
+                        self.buffer.extend(rest)
+                    return
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        with self._lock:
+            self.connected = False
+        logger.warning("MQTT connection lost (%s), buffering messages", reason_code)
+
+    def _buffer(self, topic, data):
+        # Called with self._lock held
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append((topic, data))
+
+    def publish(self, topic, payload):
+        """Publish a JSON-serialisable payload, or buffer it while disconnected."""
+        return self._send(topic, json.dumps(payload, default=str))
+
+    def _send(self, topic, data):
+        with self._lock:
+            if not self.connected:
+                self._buffer(topic, data)
+                return False
+        if not self._publish(topic, data):
+            with self._lock:
+                self._buffer(topic, data)
+            return False
+        return True
+
+    def _publish(self, topic, data):
+        info = self.client.publish(topic, data, qos=self.qos, retain=self.retain)
+        # Lost the connection in between; paho only keeps QoS 1/2 messages
+        return info.rc == self._success or self.qos != 0
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+def get_publisher():
+    """This process's publisher from settings, or None with MQTT disabled."""
+    global _publisher
+    if not getattr(settings, "MQTT_ENABLED", False):
+        return None
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = MqttPublisher(
+                getattr(settings, "MQTT_HOST", "localhost"),
+                getattr(settings, "MQTT_PORT", 1883),
+                qos=getattr(settings, "MQTT_QOS", 1),
+                retain=getattr(settings, "MQTT_RETAIN", True),
+                buffer_size=getattr(settings, "MQTT_BUFFER_SIZE", 1000),
+                keepalive=getattr(settings, "MQTT_KEEPALIVE", 60),
+                username=getattr(settings, "MQTT_USERNAME", None),
+                password=getattr(settings, "MQTT_PASSWORD", None),
+                tls=getattr(settings, "MQTT_TLS", False),
+                client_id=getattr(settings, "MQTT_CLIENT_ID", ""),
+            )
+    return _publisher
+
+
+def camera_topic(camera, event):
+    return f"{getattr(settings, 'MQTT_TOPIC_PREFIX', 'traffic')}/{slugify(camera.name) or camera.pk}/{event}"
+
+
+def publish_state(camera, source, congestion, density, avg_per_frame, signal, lanes=None, publisher=None):
+    """
+    Publish a camera's congestion and signal timing. signal is
+    {"green_extension", "pattern", ...}; lanes the per-lane timing.
+    Returns False when the messages were buffered (or MQTT is off).
+    """
+    publisher = publisher or get_publisher()
+    if publisher is None:
+        return False
+    timestamp = timezone.now().isoformat()
+    sent = publisher.publish(camera_topic(camera, "congestion"), {
+        "camera": camera.name,
+        "source": source,
+        "timestamp": timestamp,
+        "congestion": congestion,
+        "density_score": density,
+        "avg_vehicles_per_frame": avg_per_frame,
+    })
+    sent &= publisher.publish(camera_topic(camera, "signal"), dict(
+        signal,
+        camera=camera.name,
+        source=source,
+        timestamp=timestamp,
+        lanes={
+            name: {key: lane.get(key) for key in ("green_extension", "pattern", "green_share")}
+            for name, lane in (lanes or {}).items()
+        },
+    ))
+    return sent
+
+
+def publish_result(video, result, publisher=None):
+    """Publish an analysed upload's result, if the video has a camera."""
+    if video.camera is None:
+        return False
+    return publish_state(
+        video.camera, "upload", result.congestion, result.density_score, result.avg_vehicles_per_frame,
+        {
+            "green_extension": result.signal_green_extension,
+            "pattern": result.signal_pattern,
+            "recommendation": result.signal_recommendation,
+        },
+        result.lane_stats, publisher,
+    )
+
+
+def publish_snapshot(snapshot, lanes=None, publisher=None):
+    """Publish a live TrafficSnapshot, with signal timing for its window (and lanes, per-lane timing)."""
+    green_ext, pattern = optimize_signal_timing(snapshot.density_score, snapshot.avg_vehicles_per_frame)
+    return publish_state(
+        snapshot.camera, "stream", snapshot.congestion, snapshot.density_score, snapshot.avg_vehicles_per_frame,
+        {"green_extension": float(green_ext), "pattern": pattern}, lanes, publisher,
+    )
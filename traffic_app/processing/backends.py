@@ -0,0 +1,210 @@
+# traffic_app/processing/backends.py
+"""
+Detector backends. A backend runs a YOLO model on a batch of frames and
+returns, per frame, the raw (cls, conf, xyxy) box arrays that yolo_detect
+filters and counts, so every backend sits behind the same
+detect_vehicles_* contract.
+
+- "torch": ultralytics on PyTorch (default)
+- "onnx": a model exported with export_onnx, on onnxruntime. Runs on the
+  CPU by default; FP32 or INT8 (static QDQ quantization) models. Other
+  onnxruntime execution providers, e.g. OpenVINO, can be selected by name.
+
+Backends are created through model_registry.get_backend, which imports
+their runtime on first use.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+BACKENDS = (BACKEND_TORCH, BACKEND_ONNX)
+
+# ultralytics predict() defaults, kept for parity between backends
+NMS_IOU = 0.7
+MAX_DETECTIONS = 300
+DEFAULT_IMGSZ = 640
+LETTERBOX_FILL = 114
+
+
+def backend_for(model_name, backend=None):
+    """Explicit backend, or guessed from the weights file extension."""
+    if backend:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown detector backend {backend!r}, expected one of {BACKENDS}")
+        return backend
+    return BACKEND_ONNX if str(model_name).endswith(".onnx") else BACKEND_TORCH
+
+
+def box_arrays(result):
+    """
+    Return (cls, conf, xyxy) of a YOLO result as NumPy arrays, copied off
+    the device in one go instead of per box.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty((0, 4), dtype=np.float32)
+    return (
+        np.asarray(boxes.cls.cpu().numpy(), dtype=np.int64),
+        np.asarray(boxes.conf.cpu().numpy(), dtype=np.float32),
+        np.asarray(boxes.xyxy.cpu().numpy(), dtype=np.float32),
+    )
+
+
+class TorchBackend:
+    name = BACKEND_TORCH
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, frames, conf):
+        results = self.model(list(frames), conf=conf, verbose=False)
+        return [box_arrays(r) for r in results]
+
+
+def letterbox(frame, size):
+    """
+    Resize a BGR frame to fit (height, width) keeping its aspect ratio and
+    pad the rest, as ultralytics does. Returns the CHW float32 RGB blob in
+    0..1 and (scale, pad_x, pad_y) to map boxes back.
+    """
+    height, width = size
+    h, w = frame.shape[:2]
+    scale = min(height / h, width / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    pad_x, pad_y = (width - new_w) / 2, (height - new_h) / 2
+
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if (new_w, new_h) != (w, h) else frame
+    top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+    bottom, right = height - new_h - top, width - new_w - left
+    padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                                value=(LETTERBOX_FILL,) * 3)
+    blob = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).transpose(2, 0, 1).astype(np.float32) / 255.0
+    return blob, (scale, left, top)
+
+
+def decode_output(output, conf, meta, frame_shape, iou=NMS_IOU, max_det=MAX_DETECTIONS):
+    """
+    Turn one frame's raw YOLOv8 output (4 + classes, anchors) into
+    (cls, conf, xyxy) arrays in frame pixels: confidence filter,
+    class-aware NMS, then undo the letterbox.
+    """
+    preds = np.asarray(output, dtype=np.float32).T
+    scores = preds[:, 4:]
+    cls = scores.argmax(axis=1)
+    confidence = scores[np.arange(len(scores)), cls]
+
+    keep = confidence > conf
+    if not keep.any():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty((0, 4), dtype=np.float32)
+    xywh, cls, confidence = preds[keep, :4], cls[keep], confidence[keep]
+
+    # NMS takes top-left x, y, w, h
+    tlwh = np.column_stack([xywh[:, 0] - xywh[:, 2] / 2, xywh[:, 1] - xywh[:, 3] / 2, xywh[:, 2], xywh[:, 3]])
+    picked = cv2.dnn.NMSBoxesBatched(tlwh.tolist(), confidence.tolist(), cls.tolist(), conf, iou)
+    picked = np.asarray(picked, dtype=np.int64).reshape(-1)
+    picked = picked[np.argsort(-confidence[picked], kind="stable")][:max_det]
+
+    scale, pad_x, pad_y = meta
+    xyxy = np.column_stack([tlwh[picked, 0], tlwh[picked, 1],
+                            tlwh[picked, 0] + tlwh[picked, 2], tlwh[picked, 1] + tlwh[picked, 3]])
+    xyxy = (xyxy - [pad_x, pad_y, pad_x, pad_y]) / scale
+    h, w = frame_shape[:2]
+    xyxy = np.clip(xyxy, 0, [w, h, w, h]).astype(np.float32)
+    return cls[picked].astype(np.int64), confidence[picked].astype(np.float32), xyxy
+
+
+class OnnxBackend:
+    """
+    YOLOv8 ONNX model on onnxruntime. Models exported with a dynamic batch
+    axis run a whole batch per call, static ones one frame per call.
+    """
+    name = BACKEND_ONNX
+
+    def __init__(self, model_path, providers=None, threads=None, imgsz=DEFAULT_IMGSZ, iou=NMS_IOU):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = int(threads)
+        self.session = ort.InferenceSession(str(model_path), options,
+                                            providers=list(providers or ["CPUExecutionProvider"]))
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, width = model_input.shape
+        # Dynamic axes are reported as names instead of sizes
+        self.dynamic_batch = not isinstance(batch, int)
+        self.size = (
+            height if isinstance(height, int) else imgsz,
+            width if isinstance(width, int) else imgsz,
+        )
+        self.iou = iou
+
+    def predict(self, frames, conf):
+        frames = list(frames)
+        if not frames:
+            return []
+        blobs, metas = zip(*(letterbox(frame, self.size) for frame in frames))
+        if self.dynamic_batch:
+            outputs = self.session.run(None, {self.input_name: np.stack(blobs)})[0]
+        else:
+            outputs = np.concatenate([self.session.run(None, {self.input_name: blob[None]})[0] for blob in blobs])
+        return [
+            decode_output(output, conf, meta, frame.shape, self.iou)
+            for output, meta, frame in zip(outputs, metas, frames)
+        ]
+
+
+class _CalibrationReader:
+    """Feeds letterboxed frames to onnxruntime's static quantizer."""
+
+    def __init__(self, input_name, frames, size):
+        self._items = iter([{input_name: letterbox(frame, size)[0][None]} for frame in frames])
+
+    def get_next(self):
+        return next(self._items, None)
+
+
+def export_onnx(weights, output=None, imgsz=DEFAULT_IMGSZ, int8=False, calibration_frames=None):
+    """
+    Export ultralytics weights to ONNX (dynamic batch axis), and with
+    int8=True also write a statically quantized INT8 copy calibrated on
+    calibration_frames (a list of BGR frames from the target cameras).
+    Returns the path of the model to use.
+    """
+    from ultralytics import YOLO
+
+    started = time.perf_counter()
+    path = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    if output and not int8:
+        os.replace(path, output)
+        path = output
+    print(f"Exported {weights} to {path} in {time.perf_counter() - started:.1f}s")
+    if not int8:
+        return str(path)
+
+    if not calibration_frames:
+        raise ValueError("INT8 quantization needs calibration frames")
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    import onnxruntime as ort
+    input_name = ort.InferenceSession(str(path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    started = time.perf_counter()
+    base, _ = os.path.splitext(str(path))
+    prepared = base + "-prep.onnx"
+    int8_path = output or base + "-int8.onnx"
+    quant_pre_process(str(path), prepared, skip_symbolic_shape=True)
+    quantize_static(
+        prepared, int8_path, _CalibrationReader(input_name, calibration_frames, (imgsz, imgsz)),
+        quant_format=QuantFormat.QDQ, per_channel=True,
+        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+    )
+    os.remove(prepared)
+    print(f"Quantized to {int8_path} on {len(calibration_frames)} frames in {time.perf_counter() - started:.1f}s")
+    return int8_path
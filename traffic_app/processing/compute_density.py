@@ -1,16 +1,17 @@
 # traffic_app/processing/compute_density.py
 
-def analyze_sampled_frames(vehicle_counts):
+def analyze_sampled_frames(vehicle_counts, expected_max=30.0):
     """
     Compute a density score between 0 and 1.
     We use normalized average vehicles per frame:
-      density = min(1.0, avg / EXPECTED_MAX)
+      density = min(1.0, avg / expected_max)
+    expected_max is the count that means "full" (default 30 for a whole
+    frame, tune for your dataset; lanes use their own capacity).
     """
-    EXPECTED_MAX = 30.0  # tune for your dataset
     if not vehicle_counts:
         return 0.0
     avg = sum(vehicle_counts) / len(vehicle_counts)
-    score = min(1.0, avg / EXPECTED_MAX)
+    score = min(1.0, avg / expected_max)
     return round(score, 3)
 
 def compute_congestion(avg_vehicles_per_frame, density_score):
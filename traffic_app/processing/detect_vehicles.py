@@ -1,10 +1,8 @@
 # traffic_app/processing/detect_vehicles.py
 
-from ultralytics import YOLO
 import cv2
 
-# Load YOLO model once
-model = YOLO("yolov8n.pt")  # small + fast
+from .model_registry import DEFAULT_MODEL, get_model
 
 VEHICLE_MAP = {
     "car": "car",
@@ -18,6 +16,8 @@ def detect_vehicles(frame):
     Runs YOLO detection on a single frame and returns categorized counts.
     """
 
+    # Shared with yolo_detect, loaded on first use
+    model = get_model(DEFAULT_MODEL)  # yolov8n, small + fast
     results = model(frame, verbose=False)
     counts = {"car": 0, "bike": 0, "truck": 0, "bus": 0}
 
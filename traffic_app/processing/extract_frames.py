@@ -1,14 +1,42 @@
 # traffic_app/processing/extract_frames.py
 import cv2
-from .yolo_detect import detect_vehicles_in_frame
+from .yolo_detect import detect_vehicles_in_frames, detect_vehicles_with_boxes_in_frames, DEFAULT_BATCH_SIZE
+from .frame_sampler import choose_strategy, iter_sampled_frames
+from .pipeline import PipelineStats, run_pipeline
+from .motion_gate import GatedDetector, MotionGate
+from .tracker import TrackingDetector
 
-def extract_and_sample_frames(video_path, sample_rate=30):
+def extract_and_sample_frames(video_path, sample_rate=30, batch_size=DEFAULT_BATCH_SIZE, detector=None,
+                              strategy="auto", inference_workers=1, queue_size=4, stats=None,
+                              adaptive=False, gate_options=None, tracker=None, layout=None, lanes=None):
     """
     Extract frames from video and detect vehicles using YOLO.
     
     Args:
         video_path: Path to video file
         sample_rate: Process every Nth frame (default: 30)
+        batch_size: Number of sampled frames per inference call (default: 8)
+        detector: Optional callable taking a list of frames and returning
+                  a list of count dicts (default: batched YOLO)
+        strategy: Frame sampling strategy, "read", "grab", "seek" or "auto"
+                  to pick one from the sample rate and container (default: "auto")
+        inference_workers: Number of inference threads (default: 1). Only raise
+                  this with a detector that is safe to call from several threads.
+        queue_size: Maximum batches buffered between pipeline stages (default: 4)
+        stats: Optional PipelineStats, filled with per-stage counters
+        adaptive: Only run the detector on sampled frames where the scene
+                  changed (see motion_gate.MotionGate); other frames reuse
+                  the last counts. Forces a single inference worker.
+        gate_options: Optional MotionGate keyword arguments
+        tracker: Optional tracker.VehicleTracker. The detector then returns
+                  box lists instead of counts (default: batched YOLO boxes),
+                  vehicles are tracked across sampled frames and the
+                  breakdown holds unique vehicles instead of per-frame sums.
+                  Forces a single inference worker.
+        layout: Optional roi.RoadLayout. Frames are cropped to its ROI
+                  before inference and vehicles outside the ROI are ignored.
+                  Like tracker, needs a box detector.
+        lanes: Optional roi.LaneCounter, filled with per-lane counts
     
     Returns:
         total_frames (int): Total number of frames in video
@@ -26,10 +54,14 @@ def extract_and_sample_frames(video_path, sample_rate=30):
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
     fps = cap.get(cv2.CAP_PROP_FPS)
     
-    print(f"Video info: {total_frames} frames, {fps:.2f} FPS")
-    
-    frame_index = 0
-    sampled = 0
+    if strategy == "auto":
+        strategy = choose_strategy(video_path, cap, sample_rate)
+
+    frame_layout = None
+    if layout:
+        frame_layout = layout.resolve(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    print(f"Video info: {total_frames} frames, {fps:.2f} FPS, sampling: {strategy}")
     
     # Storage for detections
     detections_list = []
@@ -40,34 +72,64 @@ def extract_and_sample_frames(video_path, sample_rate=30):
     total_trucks = 0
     total_buses = 0
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    batch_size = max(1, int(batch_size or 1))
+    use_boxes = tracker is not None or frame_layout is not None or lanes is not None
+    if detector is None and use_boxes:
+        detector = lambda frames: detect_vehicles_with_boxes_in_frames(frames, batch_size=batch_size)
+    elif detector is None:
+        detector = lambda frames: detect_vehicles_in_frames(frames, batch_size=batch_size)
+
+    gated = None
+    if adaptive:
+        gated = detector = GatedDetector(detector, MotionGate(**(gate_options or {})))
+        # The gate compares each frame with the previous one, order matters
+        inference_workers = 1
+
+    if use_boxes:
+        # After the gate, so skipped frames feed the tracker the last boxes
+        detector = TrackingDetector(detector, tracker, frame_layout, lanes)
+        inference_workers = 1
+
+    def aggregate(counts):
+        nonlocal total_cars, total_bikes, total_trucks, total_buses
+
+        # Store per-frame detection
+        detections_list.append(counts)
+
+        # Accumulate totals
+        total_cars += counts.get("car", 0)
+        total_bikes += counts.get("bike", 0)
+        total_trucks += counts.get("truck", 0)
+        total_buses += counts.get("bus", 0)
 
-        # Sample every Nth frame
-        if frame_index % sample_rate == 0:
-            sampled += 1
-            
-            # Run YOLO detection
-            counts = detect_vehicles_in_frame(frame)
-            
-            # Store per-frame detection
-            detections_list.append(counts)
-            
-            # Accumulate totals
-            total_cars += counts.get("car", 0)
-            total_bikes += counts.get("bike", 0)
-            total_trucks += counts.get("truck", 0)
-            total_buses += counts.get("bus", 0)
-            
-            # Progress indicator
-            if sampled % 10 == 0:
-                print(f"Processed {sampled} frames...")
+        # Progress indicator
+        if len(detections_list) % 10 == 0:
+            print(f"Processed {len(detections_list)} frames...")
 
-        frame_index += 1
+    # Only every Nth frame is decoded into an image; decoding runs in its own
+    # thread so it overlaps with inference
+    frames = (frame for _, frame in iter_sampled_frames(cap, sample_rate, strategy))
+    if frame_layout is not None:
+        frames = (frame_layout.crop(frame) for frame in frames)
+    stats = stats if stats is not None else PipelineStats()
+    try:
+        run_pipeline(frames, detector, aggregate, batch_size=batch_size,
+                     workers=inference_workers, queue_size=queue_size, stats=stats)
+    finally:
+        cap.release()
 
-    cap.release()
+    sampled = len(detections_list)
+    if gated is not None:
+        stats.counters.update(gated.counters())
+        stats.counters["detector_calls"] = gated.calls
+        print(f"Motion gating: YOLO ran on {gated.inferred} frames, skipped {gated.skipped}")
+    if tracker is not None:
+        unique = tracker.unique_counts()
+        total_cars, total_bikes = unique["car"], unique["bike"]
+        total_trucks, total_buses = unique["truck"], unique["bus"]
+        print(f"Tracking: {sum(unique.values())} unique vehicles, "
+              f"{sum(tracker.crossings.values())} line crossings")
+    print(stats.summary())
     
     # Prepare breakdown dictionary
     breakdown = {
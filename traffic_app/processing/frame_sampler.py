@@ -0,0 +1,105 @@
+# traffic_app/processing/frame_sampler.py
+import os
+import cv2
+
+# Sampling strategies
+STRATEGY_READ = "read"   # decode every frame, keep every Nth (original behaviour)
+STRATEGY_GRAB = "grab"   # grab() skipped frames without decoding them to images
+STRATEGY_SEEK = "seek"   # jump straight to each sampled frame
+STRATEGIES = (STRATEGY_READ, STRATEGY_GRAB, STRATEGY_SEEK)
+
+# Containers with an index that makes random access cheap
+SEEKABLE_CONTAINERS = {".mp4", ".m4v", ".mov", ".mkv", ".webm", ".avi"}
+
+# Codecs where every frame is a keyframe, so a seek never decodes extra frames
+INTRA_ONLY_CODECS = {"MJPG", "mjpg", "MJPEG", "jpeg", "png ", "PNG ", "FFV1"}
+
+# Above this gap between samples a seek (decode from the previous keyframe)
+# is cheaper than grabbing every frame in between, for typical GOP sizes
+SEEK_MIN_SAMPLE_RATE = 120
+
+# Intra-only codecs still pay a fixed cost per seek, so dense sampling grabs
+INTRA_SEEK_MIN_SAMPLE_RATE = 10
+
+
+def probe_video(video_path):
+    """
+    Return (total_frames, fps) without decoding any frames.
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        if not cap.isOpened():
+            return 0, 0.0
+        return int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0), float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+    finally:
+        cap.release()
+
+
+def _fourcc(cap):
+    code = int(cap.get(cv2.CAP_PROP_FOURCC) or 0)
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+
+
+def choose_strategy(video_path, cap, sample_rate):
+    """
+    Pick the cheapest sampling strategy for this video.
+    - every frame wanted: plain read
+    - indexed container and sparse enough sampling for the codec: seek
+    - otherwise: grab
+    Streams (unknown frame count) never seek.
+    """
+    if sample_rate <= 1:
+        return STRATEGY_READ
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    ext = os.path.splitext(str(video_path))[1].lower()
+    if total_frames > 0 and ext in SEEKABLE_CONTAINERS:
+        min_rate = INTRA_SEEK_MIN_SAMPLE_RATE if _fourcc(cap) in INTRA_ONLY_CODECS else SEEK_MIN_SAMPLE_RATE
+        if sample_rate >= min_rate:
+            return STRATEGY_SEEK
+
+    return STRATEGY_GRAB
+
+
+def iter_sampled_frames(cap, sample_rate, strategy=STRATEGY_GRAB, start_frame=0, end_frame=None):
+    """
+    Yield (frame_index, frame) for every sample_rate-th frame of an open capture,
+    i.e. the frames where frame_index % sample_rate == 0.
+    All strategies yield the same frames; they only differ in decode cost.
+    start_frame/end_frame limit sampling to the range [start_frame, end_frame).
+    """
+    sample_rate = max(1, int(sample_rate))
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown sampling strategy: {strategy}")
+
+    # First sampled index at or after start_frame
+    first = -(-int(start_frame) // sample_rate) * sample_rate
+
+    if strategy == STRATEGY_SEEK:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        stop = total_frames if end_frame is None else min(end_frame, total_frames)
+        for frame_index in range(first, stop, sample_rate):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame_index, frame
+        return
+
+    frame_index = 0
+    if first:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        frame_index = first
+
+    while end_frame is None or frame_index < end_frame:
+        if frame_index % sample_rate == 0 or strategy == STRATEGY_READ:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame_index % sample_rate == 0:
+                yield frame_index, frame
+        else:
+            # Advance the demuxer/decoder without converting to an image
+            if not cap.grab():
+                break
+        frame_index += 1
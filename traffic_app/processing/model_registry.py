@@ -0,0 +1,91 @@
+# traffic_app/processing/model_registry.py
+"""
+Process-wide registry of YOLO models and detector backends.
+
+Models (and ultralytics/torch or onnxruntime themselves) are only
+imported on first use, so importing the processing modules is cheap and
+management commands, migrations and web workers never pay for them.
+Every module asking for the same weights gets the same instance.
+"""
+import threading
+import time
+
+DEFAULT_MODEL = "yolov8n.pt"
+
+_models = {}
+_backends = {}
+_lock = threading.Lock()
+
+
+def get_model(name=DEFAULT_MODEL):
+    """
+    Return the loaded model for a weights file, loading it on first use.
+    """
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _lock:
+        # Another thread may have loaded it while we waited
+        model = _models.get(name)
+        if model is None:
+            from ultralytics import YOLO
+
+            started = time.perf_counter()
+            model = YOLO(name)
+            _models[name] = model
+            print(f"Loaded model {name} in {time.perf_counter() - started:.2f}s")
+    return model
+
+
+def get_backend(name=DEFAULT_MODEL, backend=None, **options):
+    """
+    Return the detector backend (see backends.py) for a weights file,
+    creating it on first use. backend defaults to "onnx" for .onnx files
+    and "torch" otherwise; options (e.g. providers, threads for onnx) only
+    apply when the backend is created.
+    """
+    from .backends import OnnxBackend, TorchBackend, backend_for
+
+    key = (backend_for(name, backend), name)
+    instance = _backends.get(key)
+    if instance is not None:
+        return instance
+
+    if key[0] == "torch":
+        # get_model takes the lock itself
+        instance = TorchBackend(get_model(name))
+    else:
+        with _lock:
+            instance = _backends.get(key)
+            if instance is None:
+                started = time.perf_counter()
+                instance = OnnxBackend(name, **options)
+                print(f"Loaded ONNX model {name} in {time.perf_counter() - started:.2f}s")
+    _backends.setdefault(key, instance)
+    return _backends[key]
+
+
+def warmup(name=DEFAULT_MODEL, imgsz=640, backend=None, **options):
+    """
+    Load a model and run one dummy inference so the first real request
+    doesn't pay for lazy initialisation (weights, kernels, allocator).
+    Returns the seconds it took.
+    """
+    import numpy as np
+
+    started = time.perf_counter()
+    get_backend(name, backend, **options).predict([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)], conf=0.25)
+    return time.perf_counter() - started
+
+
+def loaded_models():
+    """Names of the models loaded in this process."""
+    return list(dict.fromkeys(list(_models) + [name for _, name in _backends]))
+
+
+def clear():
+    """Forget all loaded models (tests, or to free memory)."""
+    with _lock:
+        _models.clear()
+        _backends.clear()
@@ -0,0 +1,109 @@
+# traffic_app/processing/motion_gate.py
+"""
+Motion gating: decide per sampled frame whether the scene changed enough
+since the last YOLO run to be worth running YOLO again. Frames that are
+skipped reuse the counts of the last inferred frame.
+"""
+import copy
+
+import cv2
+import numpy as np
+
+from .detect import simple_vehicle_count
+
+# Defaults: fraction of changed pixels that triggers inference, and the
+# most sampled frames in a row that may skip inference
+DEFAULT_MOTION_THRESHOLD = 0.02
+DEFAULT_MAX_INTERVAL = 5
+
+
+class MotionGate:
+    """
+    Cheap change detector. A frame triggers inference when
+    - it is the first frame, or
+    - more than `threshold` of its pixels differ from the last inferred
+      frame (frame differencing on a small blurred grayscale copy), or
+    - the heuristic contour count (detect.simple_vehicle_count) moved by
+      at least `count_delta`, or
+    - `max_interval` frames in a row have been skipped.
+    """
+
+    def __init__(self, threshold=DEFAULT_MOTION_THRESHOLD, max_interval=DEFAULT_MAX_INTERVAL,
+                 count_delta=2, size=(160, 90), pixel_delta=25):
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.count_delta = count_delta
+        self.size = size
+        self.pixel_delta = pixel_delta
+        self._reference = None
+        self._reference_count = None
+        self._skipped_in_row = 0
+
+    def _small(self, frame):
+        gray = cv2.cvtColor(cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def motion_score(self, small):
+        """Fraction of pixels that changed versus the reference frame."""
+        diff = cv2.absdiff(small, self._reference)
+        return float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+
+    def check(self, frame):
+        """
+        Return True if the frame should go to YOLO. Updates the reference
+        frame when it does.
+        """
+        small = self._small(frame)
+        count = simple_vehicle_count(frame) if self.count_delta else None
+
+        infer = (
+            self._reference is None
+            or self._skipped_in_row >= self.max_interval
+            or self.motion_score(small) >= self.threshold
+            or (count is not None and abs(count - self._reference_count) >= self.count_delta)
+        )
+        if infer:
+            self._reference = small
+            self._reference_count = count
+            self._skipped_in_row = 0
+        else:
+            self._skipped_in_row += 1
+        return infer
+
+
+class GatedDetector:
+    """
+    Wraps a batch detector (list of frames -> list of count dicts, or of
+    box lists) so only frames passing the MotionGate are sent to it. Must
+    see frames in order, so use it with a single inference worker.
+    """
+
+    def __init__(self, detector, gate=None):
+        self.detector = detector
+        self.gate = gate or MotionGate()
+        self.inferred = 0
+        self.skipped = 0
+        # Calls that reached the wrapped detector
+        self.calls = 0
+        self._last_counts = {"car": 0, "bike": 0, "bus": 0, "truck": 0}
+
+    def __call__(self, frames):
+        decisions = [self.gate.check(frame) for frame in frames]
+        selected = [frame for frame, infer in zip(frames, decisions) if infer]
+        detected = iter([])
+        if selected:
+            detected = iter(self.detector(selected))
+            self.calls += 1
+
+        results = []
+        for infer in decisions:
+            if infer:
+                self._last_counts = next(detected)
+                self.inferred += 1
+            else:
+                self.skipped += 1
+            results.append(copy.copy(self._last_counts))
+        return results
+
+    def counters(self):
+        return {"inferred_frames": self.inferred, "skipped_frames": self.skipped}
@@ -0,0 +1,197 @@
+# traffic_app/processing/parallel.py
+"""
+Segment-parallel analysis of a single long video.
+
+The video is split into contiguous frame ranges whose boundaries fall on
+multiples of sample_rate, so each range samples exactly the frames the
+serial path would. Ranges are analysed in a process pool (the detector is
+loaded once per worker process) and the per-frame detections are merged
+back in order, giving the same output as extract_and_sample_frames.
+With tracking, each segment has its own tracker, so a vehicle in view at
+a segment boundary is counted once per segment.
+
+Segments are planned from the container's frame count. The last one is
+left open-ended, so frames past an understated count are still read;
+without a frame count the video is analysed serially.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from .extract_frames import extract_and_sample_frames
+from .frame_sampler import choose_strategy, iter_sampled_frames
+from .motion_gate import GatedDetector, MotionGate
+from .pipeline import PipelineStats, run_pipeline
+from .tracker import TrackingDetector
+
+# Per-process detector, set by _init_worker
+_detector = None
+
+
+def plan_segments(total_frames, sample_rate, segments):
+    """
+    Split [0, total_frames) into at most `segments` contiguous ranges that
+    start on a multiple of sample_rate. Returns a list of (start, end); the
+    last end is None (to the end of the video).
+    """
+    sample_rate = max(1, int(sample_rate))
+    n_samples = -(-total_frames // sample_rate)
+    segments = max(1, min(int(segments), n_samples))
+    if total_frames <= 0:
+        return []
+
+    per_segment = -(-n_samples // segments)
+    ranges = []
+    for first_sample in range(0, n_samples, per_segment):
+        start = first_sample * sample_rate
+        end = (first_sample + per_segment) * sample_rate
+        ranges.append((start, end if end < total_frames else None))
+    return ranges
+
+
+def _init_worker(detector, batch_size, boxes=False):
+    global _detector
+    if detector is None and boxes:
+        from .yolo_detect import detect_vehicles_with_boxes_in_frames
+        detector = lambda frames: detect_vehicles_with_boxes_in_frames(frames, batch_size=batch_size)
+    elif detector is None:
+        # Loads the YOLO weights once in this worker process
+        from .yolo_detect import detect_vehicles_in_frames
+        detector = lambda frames: detect_vehicles_in_frames(frames, batch_size=batch_size)
+    _detector = detector
+
+
+def _analyze_segment(video_path, start, end, sample_rate, strategy, batch_size, gate_options,
+                     tracker=None, frame_layout=None, lanes=None):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {video_path}")
+
+    # Each segment gets its own gate, so its first frame always runs YOLO
+    detector = gated = _detector
+    if gate_options is not None:
+        detector = gated = GatedDetector(_detector, MotionGate(**gate_options))
+    if tracker is not None or frame_layout is not None or lanes is not None:
+        detector = TrackingDetector(detector, tracker, frame_layout, lanes)
+
+    detections = []
+    stats = PipelineStats()
+    frames = (frame for _, frame in iter_sampled_frames(cap, sample_rate, strategy, start, end))
+    if frame_layout is not None:
+        frames = (frame_layout.crop(frame) for frame in frames)
+    try:
+        run_pipeline(frames, detector, detections.append, batch_size=batch_size, stats=stats)
+    finally:
+        cap.release()
+    if gate_options is not None:
+        stats.counters.update(gated.counters())
+        stats.counters["detector_calls"] = gated.calls
+    return detections, stats.as_dict(durations=True), tracker.summary() if tracker is not None else None, lanes
+
+
+def extract_and_sample_frames_parallel(video_path, sample_rate=30, batch_size=8, detector=None,
+                                       strategy="auto", processes=None, segments=None,
+                                       adaptive=False, gate_options=None, tracker=None, layout=None,
+                                       lanes=None, stats=None):
+    """
+    Same contract and output as extract_and_sample_frames, with the video
+    split into time segments analysed by a pool of processes.
+
+    Args:
+        processes: Worker processes (default: CPU count)
+        segments: Number of time ranges (default: one per process)
+        detector: Optional picklable callable (e.g. a module-level function);
+                  default loads YOLO in each worker
+        adaptive/gate_options: Motion gating as in extract_and_sample_frames,
+                  applied per segment
+        tracker: Optional VehicleTracker as in extract_and_sample_frames; each
+                  segment runs an empty copy and their counts are merged into it
+        layout/lanes: ROI and lane counting as in extract_and_sample_frames;
+                  per-segment lane counts are merged into lanes
+        stats: Optional PipelineStats; the segments' stage counters are
+                  summed into it, wall_seconds is the whole parallel run
+
+    Returns:
+        total_frames, sampled_count, detections_list, breakdown
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video file: {video_path}")
+        return 0, 0, [], {"cars": 0, "bikes": 0, "trucks": 0, "buses": 0}
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_layout = None
+    if layout:
+        frame_layout = layout.resolve(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    if strategy == "auto":
+        strategy = choose_strategy(video_path, cap, sample_rate)
+    cap.release()
+
+    if total_frames <= 0:
+        print("Frame count unknown, analysing serially")
+        return extract_and_sample_frames(
+            video_path, sample_rate=sample_rate, batch_size=batch_size, detector=detector, strategy=strategy,
+            stats=stats, adaptive=adaptive, gate_options=gate_options, tracker=tracker, layout=layout, lanes=lanes,
+        )
+
+    processes = max(1, int(processes or os.cpu_count() or 1))
+    ranges = plan_segments(total_frames, sample_rate, segments or processes)
+    processes = min(processes, max(1, len(ranges)))
+
+    print(f"Video info: {total_frames} frames, {fps:.2f} FPS, sampling: {strategy}, "
+          f"{len(ranges)} segments on {processes} processes")
+
+    use_boxes = tracker is not None or frame_layout is not None or lanes is not None
+
+    started = time.perf_counter()
+    # spawn: never fork a process that may already hold torch/OpenCV threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                             initializer=_init_worker, initargs=(detector, batch_size, use_boxes)) as pool:
+        futures = [
+            pool.submit(_analyze_segment, video_path, start, end, sample_rate, strategy, batch_size,
+                        (gate_options or {}) if adaptive else None,
+                        tracker.spawn() if tracker is not None else None,
+                        frame_layout,
+                        lanes.spawn() if lanes is not None else None)
+            for start, end in ranges
+        ]
+        # Merge in segment order, not completion order
+        detections_list = []
+        segment_stats = PipelineStats()
+        for future in futures:
+            detections, segment_summary, tracked, segment_lanes = future.result()
+            detections_list.extend(detections)
+            if tracked is not None:
+                tracker.merge(tracked)
+            if segment_lanes is not None:
+                lanes.merge(segment_lanes)
+            segment_stats.merge(segment_summary)
+
+    counters = segment_stats.counters
+    if stats is not None:
+        stats.merge(segment_stats.as_dict(durations=True))
+        stats.wall_seconds = time.perf_counter() - started
+    if adaptive:
+        print(f"Motion gating: YOLO ran on {counters.get('inferred_frames', 0)} frames, "
+              f"skipped {counters.get('skipped_frames', 0)}")
+
+    if tracker is not None:
+        totals = tracker.unique_counts()
+    else:
+        totals = {vt: sum(d.get(vt, 0) for d in detections_list) for vt in ("car", "bike", "truck", "bus")}
+    breakdown = {
+        "cars": totals["car"],
+        "bikes": totals["bike"],
+        "trucks": totals["truck"],
+        "buses": totals["bus"],
+    }
+
+    print(f"Detection complete: {len(detections_list)} frames analyzed")
+    print(f"Total vehicles detected: {sum(breakdown.values())}")
+
+    return total_frames, len(detections_list), detections_list, breakdown
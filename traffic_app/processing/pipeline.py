@@ -0,0 +1,297 @@
+# traffic_app/processing/pipeline.py
+"""
+Producer/consumer pipeline for video analysis:
+
+    decoder thread -> frame queue -> inference worker(s) -> result queue -> aggregator
+
+Queues are bounded so a slow stage applies back-pressure instead of
+buffering the whole video in memory. Every stage keeps counters
+(items, busy/wait time, queue depth) in a PipelineStats object.
+"""
+import queue
+import threading
+import time
+
+# Marks the end of a queue's input
+_DONE = object()
+
+# How long blocked put/get calls wait before re-checking for errors
+_POLL_SECONDS = 0.1
+
+
+class StageStats:
+    """
+    Counters for one pipeline stage. `queue` is the stage's input queue,
+    if any, and is sampled for depth every time the stage takes an item.
+    """
+
+    def __init__(self, name, input_queue=None):
+        self.name = name
+        self.queue = input_queue
+        self.items = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_queue_depth = 0
+        self._depth_total = 0
+        # Depth counters are reported for stages with a queue, here or
+        # in a merged run
+        self._has_queue = input_queue is not None
+        # Busy time of every batch, for latency histograms
+        self.durations = []
+        self._lock = threading.Lock()
+
+    def record(self, items, busy, wait=0.0):
+        with self._lock:
+            self.items += items
+            self.batches += 1
+            self.busy_seconds += busy
+            self.durations.append(busy)
+            self.wait_seconds += wait
+            if self.queue is not None:
+                depth = self.queue.qsize()
+                self._depth_total += depth
+                self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def add_wait(self, seconds):
+        with self._lock:
+            self.wait_seconds += seconds
+
+    def merge(self, summary):
+        """Add the counters of another stage's as_dict(), e.g. from another process."""
+        with self._lock:
+            self.items += summary["items"]
+            self.batches += summary["batches"]
+            self.busy_seconds += summary["busy_seconds"]
+            self.wait_seconds += summary["wait_seconds"]
+            self.durations.extend(summary.get("durations", ()))
+            if summary["max_queue_depth"] is not None:
+                self._has_queue = True
+                self.max_queue_depth = max(self.max_queue_depth, summary["max_queue_depth"])
+                self._depth_total += summary.get("queue_depth_total",
+                                                 (summary["avg_queue_depth"] or 0) * summary["batches"])
+
+    def as_dict(self, durations=False):
+        with self._lock:
+            summary = {
+                "items": self.items,
+                "batches": self.batches,
+                "busy_seconds": round(self.busy_seconds, 4),
+                "wait_seconds": round(self.wait_seconds, 4),
+                "items_per_second": round(self.items / self.busy_seconds, 2) if self.busy_seconds else None,
+                "queue_depth": self.queue.qsize() if self.queue is not None else None,
+                "max_queue_depth": self.max_queue_depth if self._has_queue else None,
+                "avg_queue_depth": round(self._depth_total / self.batches, 2)
+                if self._has_queue and self.batches else None,
+            }
+            if durations:
+                summary["durations"] = list(self.durations)
+                if self._has_queue:
+                    summary["queue_depth_total"] = self._depth_total
+            return summary
+
+
+class PipelineStats:
+    """
+    Stage counters for one pipeline run. The stage with the highest busy
+    time (per worker) is the bottleneck.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.wall_seconds = 0.0
+        # Free-form totals reported by callers (e.g. frames skipped by motion gating)
+        self.counters = {}
+
+    def stage(self, name, input_queue=None):
+        stats = StageStats(name, input_queue)
+        self.stages[name] = stats
+        return stats
+
+    def merge(self, summary):
+        """
+        Add the stage counters and counters of another run's as_dict(),
+        e.g. one per video segment analysed in parallel. Wall time is left
+        to the caller.
+        """
+        for name, stage in summary["stages"].items():
+            if name not in self.stages:
+                self.stage(name)
+            self.stages[name].merge(stage)
+        for name, value in summary["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self, durations=False):
+        """
+        With durations=True, each stage also lists its per-batch busy times
+        (and its queue depth total), for merging.
+        """
+        return {
+            "wall_seconds": round(self.wall_seconds, 4),
+            "stages": {name: s.as_dict(durations) for name, s in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    def summary(self):
+        parts = []
+        for name, s in self.stages.items():
+            d = s.as_dict()
+            rate = f"{d['items_per_second']:.1f}/s" if d["items_per_second"] else "-"
+            depth = f", max queue {d['max_queue_depth']}" if d["max_queue_depth"] is not None else ""
+            parts.append(f"{name}: {d['items']} items, busy {d['busy_seconds']:.2f}s ({rate}){depth}")
+        parts += [f"{name}: {value}" for name, value in self.counters.items()]
+        return f"Pipeline {self.wall_seconds:.2f}s | " + " | ".join(parts)
+
+
+class _Pipeline:
+    def __init__(self, frames, detector, batch_size, workers, queue_size, stats):
+        self.frames = frames
+        self.detector = detector
+        self.batch_size = batch_size
+        self.workers = workers
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.result_queue = queue.Queue(maxsize=queue_size)
+        self.stop = threading.Event()
+        self.errors = []
+
+        self.decode_stats = stats.stage("decode")
+        self.inference_stats = stats.stage("inference", self.frame_queue)
+        self.aggregate_stats = stats.stage("aggregate", self.result_queue)
+
+    def _put(self, q, item, stage):
+        started = time.perf_counter()
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        stage.add_wait(time.perf_counter() - started)
+
+    def _get(self, q):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, exc):
+        self.errors.append(exc)
+        self.stop.set()
+
+    def decode(self):
+        """Producer: group sampled frames into batches of batch_size."""
+        try:
+            seq = 0
+            batch = []
+            started = time.perf_counter()
+            for frame in self.frames:
+                batch.append(frame)
+                if len(batch) >= self.batch_size:
+                    self.decode_stats.record(len(batch), time.perf_counter() - started)
+                    self._put(self.frame_queue, (seq, batch), self.decode_stats)
+                    seq += 1
+                    batch = []
+                    started = time.perf_counter()
+                if self.stop.is_set():
+                    return
+            if batch:
+                self.decode_stats.record(len(batch), time.perf_counter() - started)
+                self._put(self.frame_queue, (seq, batch), self.decode_stats)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(self.workers):
+                self._put(self.frame_queue, _DONE, self.decode_stats)
+
+    def infer(self):
+        """Consumer/producer: run the detector on each batch."""
+        try:
+            while True:
+                waited = time.perf_counter()
+                item = self._get(self.frame_queue)
+                if item is _DONE:
+                    break
+                seq, batch = item
+                started = time.perf_counter()
+                counts = self.detector(batch)
+                self.inference_stats.record(len(batch), time.perf_counter() - started, started - waited)
+                self._put(self.result_queue, (seq, counts), self.inference_stats)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.result_queue, _DONE, self.inference_stats)
+
+    def aggregate(self, on_counts):
+        """Consumer: hand per-frame counts to on_counts in frame order."""
+        finished = 0
+        next_seq = 0
+        # Batches that finished before an earlier one (multiple workers)
+        waiting = {}
+        while finished < self.workers:
+            waited = time.perf_counter()
+            item = self._get(self.result_queue)
+            if item is _DONE:
+                if self.stop.is_set():
+                    break
+                finished += 1
+                continue
+            seq, counts = item
+            started = time.perf_counter()
+            waiting[seq] = counts
+            n = 0
+            while next_seq in waiting:
+                for c in waiting.pop(next_seq):
+                    on_counts(c)
+                    n += 1
+                next_seq += 1
+            self.aggregate_stats.record(n, time.perf_counter() - started, started - waited)
+
+
+def run_pipeline(frames, detector, on_counts, batch_size=8, workers=1, queue_size=4, stats=None):
+    """
+    Run detection over an iterable of frames with decode, inference and
+    aggregation overlapping in separate threads.
+
+    Args:
+        frames: Iterable of frames (decoding happens while iterating)
+        detector: Callable taking a list of frames, returning a list of count dicts.
+                  With workers > 1 it is called from several threads at once.
+        on_counts: Called with each frame's count dict, in frame order
+        batch_size: Frames per detector call
+        workers: Number of inference threads
+        queue_size: Maximum batches buffered between stages
+        stats: Optional PipelineStats to fill in
+
+    Re-raises the first exception from any stage.
+    """
+    stats = stats if stats is not None else PipelineStats()
+    workers = max(1, int(workers))
+    pipe = _Pipeline(frames, detector, max(1, int(batch_size)), workers, max(1, int(queue_size)), stats)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=pipe.decode, name="pipeline-decode", daemon=True)]
+    threads += [
+        threading.Thread(target=pipe.infer, name=f"pipeline-infer-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        pipe.aggregate(on_counts)
+    except BaseException:
+        # Includes KeyboardInterrupt: stop the other stages before re-raising
+        pipe.stop.set()
+        raise
+    finally:
+        if pipe.errors:
+            pipe.stop.set()
+        for t in threads:
+            t.join()
+        stats.wall_seconds = time.perf_counter() - started
+
+    if pipe.errors:
+        raise pipe.errors[0]
+    return stats
@@ -0,0 +1,168 @@
+# traffic_app/processing/roi.py
+"""
+Region of interest and lanes for a camera view.
+
+Polygons are stored in normalised coordinates (0..1 of frame width and
+height) so one layout fits every resolution of the same camera. Frames
+are cropped to the ROI's bounding box before inference; detections are
+then mapped back to full-frame pixels, dropped when they fall outside the
+ROI polygon and assigned to the lane containing them. A box's position is
+its bottom centre, where the vehicle touches the road.
+"""
+import numpy as np
+
+from .compute_density import analyze_sampled_frames
+
+# Vehicles that fill a lane in view, when the lane does not say
+DEFAULT_LANE_CAPACITY = 10.0
+
+
+def points_in_polygon(points, polygon):
+    """
+    Vectorised even-odd test. points: (N, 2), polygon: (M, 2) array.
+    Returns a boolean array of length N.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    polygon = np.asarray(polygon, dtype=np.float64)
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    straddles = (y1 <= y) != (y2 <= y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return np.count_nonzero(straddles & (x < x_cross), axis=1) % 2 == 1
+
+
+def box_anchors(boxes):
+    """Bottom-centre point of each box, as an (N, 2) array."""
+    return np.array([[(b["bbox"][0] + b["bbox"][2]) / 2, b["bbox"][3]] for b in boxes], dtype=np.float64).reshape(-1, 2)
+
+
+class RoadLayout:
+    """
+    A camera's ROI polygon and lanes, in normalised coordinates.
+
+    Args:
+        roi: Polygon [[x, y], ...] or None for the whole frame
+        lanes: List of {"name": str, "polygon": [[x, y], ...], "capacity": float};
+            capacity is the number of vehicles that fill the lane in view
+    """
+
+    def __init__(self, roi=None, lanes=None):
+        self.roi = [list(map(float, p)) for p in roi] if roi else None
+        self.lanes = [
+            {
+                "name": lane["name"],
+                "polygon": [list(map(float, p)) for p in lane["polygon"]],
+                "capacity": float(lane.get("capacity") or DEFAULT_LANE_CAPACITY),
+            }
+            for lane in (lanes or [])
+        ]
+
+    def __bool__(self):
+        return bool(self.roi or self.lanes)
+
+    def as_dict(self):
+        return {"roi": self.roi, "lanes": self.lanes}
+
+    def resolve(self, width, height):
+        """Pixel version of the layout for frames of this size."""
+        return FrameLayout(self, width, height)
+
+
+class FrameLayout:
+    """
+    RoadLayout resolved to pixel coordinates for one frame size.
+    """
+
+    def __init__(self, layout, width, height):
+        scale = np.array([width, height], dtype=np.float64)
+        self.roi = np.array(layout.roi) * scale if layout.roi else None
+        self.lanes = [(lane["name"], np.array(lane["polygon"]) * scale) for lane in layout.lanes]
+
+        if self.roi is not None:
+            x1, y1 = np.floor(self.roi.min(axis=0)).astype(int)
+            x2, y2 = np.ceil(self.roi.max(axis=0)).astype(int)
+            self.rect = (max(0, x1), max(0, y1), min(width, x2), min(height, y2))
+        else:
+            self.rect = (0, 0, width, height)
+
+    def crop(self, frame):
+        x1, y1, x2, y2 = self.rect
+        return frame[y1:y2, x1:x2]
+
+    def place(self, boxes):
+        """
+        Map boxes from the cropped frame back to the full frame, drop those
+        outside the ROI and set each box's "lane" (None outside all lanes).
+        """
+        dx, dy = self.rect[:2]
+        placed = []
+        for box in boxes:
+            x1, y1, x2, y2 = box["bbox"]
+            placed.append(dict(box, bbox=[x1 + dx, y1 + dy, x2 + dx, y2 + dy]))
+
+        anchors = box_anchors(placed)
+        if self.roi is not None and placed:
+            inside = points_in_polygon(anchors, self.roi)
+            placed = [box for box, keep in zip(placed, inside) if keep]
+            anchors = anchors[inside]
+
+        lane_of = [None] * len(placed)
+        for name, polygon in reversed(self.lanes):
+            # Earlier lanes win where polygons overlap
+            for i, hit in enumerate(points_in_polygon(anchors, polygon)):
+                if hit:
+                    lane_of[i] = name
+        for box, lane in zip(placed, lane_of):
+            box["lane"] = lane
+        return placed
+
+
+class LaneCounter:
+    """
+    Per-lane vehicle counts over the sampled frames of one analysis.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.frames = 0
+        self.totals = {lane["name"]: {"car": 0, "bike": 0, "bus": 0, "truck": 0} for lane in layout.lanes}
+
+    def spawn(self):
+        return LaneCounter(self.layout)
+
+    def reset(self):
+        self.frames = 0
+        for counts in self.totals.values():
+            counts.update(dict.fromkeys(counts, 0))
+
+    def add(self, boxes):
+        """Count one frame's placed boxes (see FrameLayout.place)."""
+        self.frames += 1
+        for box in boxes:
+            lane = box.get("lane")
+            if lane in self.totals:
+                self.totals[lane][box["type"]] += 1
+
+    def merge(self, other):
+        self.frames += other.frames
+        for name, counts in other.totals.items():
+            for vehicle_type, n in counts.items():
+                self.totals[name][vehicle_type] += n
+
+    def summary(self):
+        """
+        {lane: {"avg_vehicles_per_frame", "density_score", "counts"}}, with
+        density relative to the lane's capacity.
+        """
+        result = {}
+        for lane in self.layout.lanes:
+            counts = self.totals[lane["name"]]
+            avg = sum(counts.values()) / self.frames if self.frames else 0.0
+            result[lane["name"]] = {
+                "avg_vehicles_per_frame": round(avg, 3),
+                "density_score": analyze_sampled_frames([avg], expected_max=lane["capacity"]) if self.frames else 0.0,
+                "counts": dict(counts),
+            }
+        return result
@@ -21,3 +21,25 @@ def optimize_signal_timing(density_score, avg_vehicles_per_frame):
         return 20.0, "High congestion - extend green +20s"
     else:
         return 30.0, "Severe congestion - emergency +30s"
+
+
+def optimize_lane_timing(lanes):
+    """
+    Per-lane signal timing.
+    lanes: {name: {"density_score": float, "avg_vehicles_per_frame": float}}
+    Returns {name: {"green_extension": float, "pattern": str, "green_share": float}}
+    Each lane gets the extension optimize_signal_timing gives its own
+    density; green_share splits the cycle's green time in proportion to
+    lane density (equal shares when every lane is empty).
+    """
+    total = sum(float(lane.get("density_score") or 0) for lane in lanes.values())
+    timing = {}
+    for name, lane in lanes.items():
+        density = float(lane.get("density_score") or 0)
+        green_ext, pattern = optimize_signal_timing(density, lane.get("avg_vehicles_per_frame", 0))
+        timing[name] = {
+            "green_extension": green_ext,
+            "pattern": pattern,
+            "green_share": round(density / total if total else 1.0 / len(lanes), 3),
+        }
+    return timing
@@ -0,0 +1,175 @@
+# traffic_app/processing/stream.py
+"""
+Continuous analysis of camera streams (RTSP/HTTP URLs or a video file
+standing in for one) with rolling-window metrics.
+"""
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from .compute_density import analyze_sampled_frames, compute_congestion
+from .frame_sampler import STRATEGY_GRAB, iter_sampled_frames
+from .pipeline import PipelineStats, run_pipeline
+from .roi import LaneCounter
+from .tracker import TrackingDetector
+
+VEHICLE_TYPES = ("car", "bike", "truck", "bus")
+
+
+def stream_frames(source, sample_rate=15, loop=False, realtime=None, reconnect_delay=2.0, stop=None):
+    """
+    Yield every sample_rate-th frame of a stream forever (until stop is set).
+
+    - Network streams are reopened after reconnect_delay when they drop.
+    - Files end normally, or restart from the beginning with loop=True.
+    - realtime throttles reading to the source FPS so a file behaves like
+      a live camera (default: on for files, off for network streams).
+    """
+    is_file = os.path.exists(str(source))
+    if realtime is None:
+        realtime = is_file
+    stop = stop or threading.Event()
+
+    while not stop.is_set():
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            if is_file:
+                print(f"Error: Could not open video file: {source}")
+                return
+            print(f"Stream {source} unavailable, retrying in {reconnect_delay}s")
+            stop.wait(reconnect_delay)
+            continue
+
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        started = time.monotonic()
+        try:
+            # Live streams are never seekable, grab() skips undecoded frames
+            for frame_index, frame in iter_sampled_frames(cap, sample_rate, STRATEGY_GRAB):
+                if realtime:
+                    delay = started + frame_index / fps - time.monotonic()
+                    if delay > 0:
+                        stop.wait(delay)
+                if stop.is_set():
+                    return
+                yield frame
+        finally:
+            cap.release()
+
+        if is_file and not loop:
+            return
+        if not is_file:
+            print(f"Stream {source} ended, reconnecting in {reconnect_delay}s")
+            stop.wait(reconnect_delay)
+
+
+class RollingWindow:
+    """
+    Per-frame vehicle counts over the last `seconds` seconds.
+    classify(counts, hour, avg_per_frame, density) -> congestion label
+    replaces the rule-based compute_congestion (see ml/classifier.py).
+    """
+
+    def __init__(self, seconds=60.0, classify=None):
+        self.seconds = float(seconds)
+        self.samples = deque()
+        self.classify = classify
+
+    def add(self, counts, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        self.samples.append((timestamp, counts))
+        self.expire(timestamp)
+
+    def expire(self, now=None):
+        now = time.time() if now is None else now
+        while self.samples and self.samples[0][0] < now - self.seconds:
+            self.samples.popleft()
+
+    def summary(self):
+        """
+        Averages over the window, using the same density and congestion
+        rules as uploaded videos.
+        """
+        self.expire()
+        n = len(self.samples)
+        per_type = {
+            vt: (sum(c.get(vt, 0) for _, c in self.samples) / n if n else 0.0)
+            for vt in VEHICLE_TYPES
+        }
+        totals = [sum(c.values()) for _, c in self.samples]
+        avg_per_frame = sum(totals) / n if n else 0.0
+        density = analyze_sampled_frames(totals) if totals else 0.0
+        if self.classify is not None:
+            congestion = self.classify(totals, time.localtime().tm_hour, avg_per_frame, density)
+        else:
+            congestion = compute_congestion(avg_per_frame, density)
+        return {
+            "window_seconds": self.seconds,
+            "frames": n,
+            "avg_vehicles_per_frame": avg_per_frame,
+            "avg_per_type": per_type,
+            "density_score": density,
+            "congestion": congestion,
+        }
+
+
+def ingest_stream(source, detector, on_snapshot, window_seconds=60.0, snapshot_interval=10.0,
+                  sample_rate=15, batch_size=1, loop=False, realtime=None, max_frames=None,
+                  stop=None, stats=None, classify=None, layout=None):
+    """
+    Run detection on a stream and call on_snapshot(summary) every
+    snapshot_interval seconds with the rolling-window summary.
+    Stops when the stream ends, after max_frames sampled frames, or when
+    stop is set. classify is passed to RollingWindow. Returns the final
+    window.
+
+    layout (roi.RoadLayout) restricts counting to its ROI, as for uploads;
+    detector must then return boxes. With lanes, each summary also has
+    "lane_stats" (LaneCounter.summary()) of the frames since the previous
+    snapshot.
+    """
+    stop = stop or threading.Event()
+    window = RollingWindow(window_seconds, classify)
+    frames = stream_frames(source, sample_rate=sample_rate, loop=loop, realtime=realtime, stop=stop)
+    lanes = None
+    if layout is not None:
+        # The frame size, needed to place the layout, comes with the first frame
+        first = next(frames, None)
+        if first is None:
+            return window
+        frame_layout = layout.resolve(first.shape[1], first.shape[0])
+        frames = (frame_layout.crop(frame) for frame in itertools.chain([first], frames))
+        lanes = LaneCounter(layout) if layout.lanes else None
+        detector = TrackingDetector(detector, layout=frame_layout, lanes=lanes)
+    last_snapshot = time.monotonic()
+    seen = 0
+
+    def summary():
+        result = window.summary()
+        if lanes is not None:
+            result["lane_stats"] = lanes.summary()
+        return result
+
+    def on_counts(counts):
+        nonlocal last_snapshot, seen
+        window.add(counts)
+        seen += 1
+        now = time.monotonic()
+        if now - last_snapshot >= snapshot_interval:
+            on_snapshot(summary())
+            if lanes is not None:
+                lanes.reset()
+            last_snapshot = now
+        if max_frames is not None and seen >= max_frames:
+            stop.set()
+
+    run_pipeline(frames, detector, on_counts, batch_size=batch_size,
+                 stats=stats if stats is not None else PipelineStats())
+
+    # Final snapshot for whatever is left in the window
+    if window.samples:
+        on_snapshot(summary())
+    return window
@@ -0,0 +1,308 @@
+# traffic_app/processing/tracker.py
+"""
+Lightweight multi-object tracking over per-frame vehicle boxes, so a car
+seen in ten sampled frames counts as one vehicle instead of ten.
+
+Each track keeps a constant-velocity Kalman filter over its box centre and
+size. Detections are associated with the tracks' predicted boxes greedily
+by IoU, then by centre distance for boxes that moved too far between
+samples to overlap. Optionally counts tracks crossing a counting line.
+
+Everything is NumPy on the CPU; one update with a few dozen boxes takes
+around a millisecond (see benchmarks/bench_tracker.py).
+"""
+import numpy as np
+
+VEHICLE_TYPES = ("car", "bike", "bus", "truck")
+
+
+def box_iou(a, b):
+    """IoU matrix between (N, 4) and (M, 4) arrays of x1, y1, x2, y2 boxes."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def count_boxes(boxes):
+    """Per-type counts of one frame's boxes, in the detector count format."""
+    counts = {vehicle_type: 0 for vehicle_type in VEHICLE_TYPES}
+    for box in boxes:
+        counts[box["type"]] += 1
+    return counts
+
+
+def _side(line, point):
+    """Sign of point relative to the directed line (a, b): +1, -1 or 0."""
+    (ax, ay), (bx, by) = line
+    return np.sign((bx - ax) * (point[1] - ay) - (by - ay) * (point[0] - ax))
+
+
+def _segments_intersect(line, p, q):
+    """True if segment p-q crosses the line segment (not just its extension)."""
+    a, b = line
+    return _side(line, p) * _side(line, q) < 0 and _side((p, q), a) * _side((p, q), b) <= 0
+
+
+class KalmanBoxTrack:
+    """
+    Constant-velocity Kalman filter over [cx, cy, w, h] with velocities.
+    Time steps are sampled frames.
+    """
+
+    # State transition and measurement model, shared by all tracks
+    F = np.eye(8)
+    F[:4, 4:] = np.eye(4)
+    H = np.eye(4, 8)
+
+    def __init__(self, track_id, box, process_noise=1.0, measurement_noise=1.0):
+        self.id = track_id
+        cx, cy, w, h = self._to_state(box["bbox"])
+        self.x = np.array([cx, cy, w, h, 0.0, 0.0, 0.0, 0.0])
+        scale = max(w, h, 1.0)
+        # Position/size known to about a tenth of the box, velocity not at all
+        self.P = np.diag([scale / 10] * 4 + [scale] * 4) ** 2
+        self.Q = np.diag([scale / 20] * 4 + [scale / 10] * 4) ** 2 * process_noise
+        self.R = np.diag([scale / 10] * 4) ** 2 * measurement_noise
+
+        self.hits = 1
+        self.misses = 0
+        self.crossed = 0
+        self.type_votes = {box["type"]: 1}
+        # Centre after the previous and the latest detection
+        self.last_center = self.observed_center = (cx, cy)
+
+    @staticmethod
+    def _to_state(bbox):
+        x1, y1, x2, y2 = bbox
+        return (x1 + x2) / 2.0, (y1 + y2) / 2.0, float(x2 - x1), float(y2 - y1)
+
+    @property
+    def vehicle_type(self):
+        """Most frequently observed type (YOLO flips car/truck on some frames)."""
+        return max(self.type_votes, key=self.type_votes.get)
+
+    @property
+    def center(self):
+        return float(self.x[0]), float(self.x[1])
+
+    def box(self):
+        cx, cy, w, h = self.x[:4]
+        return [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+
+    def predict(self):
+        self.x = self.F @ self.x
+        # Boxes cannot shrink below a pixel
+        self.x[2:4] = np.maximum(self.x[2:4], 1.0)
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+    def update(self, box):
+        z = np.array(self._to_state(box["bbox"]))
+        y = z - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+        self.last_center, self.observed_center = self.observed_center, self.center
+
+        self.hits += 1
+        self.misses = 0
+        self.type_votes[box["type"]] = self.type_votes.get(box["type"], 0) + 1
+
+
+class VehicleTracker:
+    """
+    Tracks vehicle boxes across sampled frames.
+
+    Args:
+        iou_threshold: Minimum IoU between a predicted track box and a
+            detection to associate them
+        max_distance: For detections left over after IoU matching, the
+            largest centre distance, in predicted box diagonals, to still
+            associate them
+        max_age: Sampled frames a track survives without a detection
+        min_hits: Detections before a track counts as a vehicle
+        line: Optional counting line ((x1, y1), (x2, y2)) in pixels; tracks
+            whose centre crosses it are counted once per track
+    """
+
+    def __init__(self, iou_threshold=0.3, max_distance=2.0, max_age=3, min_hits=1, line=None):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.line = tuple(tuple(map(float, point)) for point in line) if line else None
+
+        self.tracks = []
+        self.frames = 0
+        self._next_id = 1
+        # Counts of tracks that have ended (and of merged segments)
+        self._finished = {vehicle_type: 0 for vehicle_type in VEHICLE_TYPES}
+        self.crossings = {vehicle_type: 0 for vehicle_type in VEHICLE_TYPES}
+        # "positive": the track ended up on the side of the directed line
+        # where the cross product (b - a) x (p - a) is positive
+        self.crossings_by_direction = {"positive": 0, "negative": 0}
+
+    def options(self):
+        return {
+            "iou_threshold": self.iou_threshold,
+            "max_distance": self.max_distance,
+            "max_age": self.max_age,
+            "min_hits": self.min_hits,
+            "line": self.line,
+        }
+
+    def spawn(self):
+        """A new, empty tracker with the same settings."""
+        return VehicleTracker(**self.options())
+
+    def _associate(self, predicted, detected):
+        """Greedy matching: IoU first, then centre distance. Returns (track, det) pairs."""
+        matches = []
+        if not len(predicted) or not len(detected):
+            return matches
+        free_tracks = set(range(len(predicted)))
+        free_dets = set(range(len(detected)))
+
+        iou = box_iou(predicted, detected)
+        for t, d in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+            if iou[t, d] < self.iou_threshold:
+                break
+            if t in free_tracks and d in free_dets:
+                matches.append((t, d))
+                free_tracks.discard(t)
+                free_dets.discard(d)
+
+        if self.max_distance and free_tracks and free_dets:
+            tracks = sorted(free_tracks)
+            dets = sorted(free_dets)
+            p = predicted[tracks]
+            q = detected[dets]
+            p_center = (p[:, :2] + p[:, 2:]) / 2
+            q_center = (q[:, :2] + q[:, 2:]) / 2
+            diagonal = np.hypot(p[:, 2] - p[:, 0], p[:, 3] - p[:, 1])
+            distance = np.linalg.norm(p_center[:, None] - q_center[None], axis=2) / np.maximum(diagonal, 1.0)[:, None]
+            for i, j in zip(*np.unravel_index(np.argsort(distance, axis=None), distance.shape)):
+                if distance[i, j] > self.max_distance:
+                    break
+                t, d = tracks[i], dets[j]
+                if t in free_tracks and d in free_dets:
+                    matches.append((t, d))
+                    free_tracks.discard(t)
+                    free_dets.discard(d)
+        return matches
+
+    def _check_crossing(self, track):
+        if self.line is None or track.crossed:
+            return
+        if _segments_intersect(self.line, track.last_center, track.observed_center):
+            track.crossed = 1 if _side(self.line, track.observed_center) > 0 else -1
+            self.crossings[track.vehicle_type] += 1
+            self.crossings_by_direction["positive" if track.crossed > 0 else "negative"] += 1
+
+    def _finish(self, track):
+        if track.hits >= self.min_hits:
+            self._finished[track.vehicle_type] += 1
+
+    def update(self, boxes):
+        """
+        Advance all tracks by one sampled frame and associate this frame's
+        boxes ([{"type", "bbox", "conf"}, ...]). Returns the confirmed tracks.
+        """
+        self.frames += 1
+        for track in self.tracks:
+            track.predict()
+
+        predicted = np.array([track.box() for track in self.tracks], dtype=np.float32).reshape(-1, 4)
+        detected = np.array([box["bbox"] for box in boxes], dtype=np.float32).reshape(-1, 4)
+
+        matched_tracks = set()
+        matched_dets = set()
+        for t, d in self._associate(predicted, detected):
+            track = self.tracks[t]
+            track.update(boxes[d])
+            self._check_crossing(track)
+            matched_tracks.add(t)
+            matched_dets.add(d)
+
+        # Tracks without a detection this frame age; old ones are closed
+        alive = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+            if track.misses > self.max_age:
+                self._finish(track)
+            else:
+                alive.append(track)
+
+        for d, box in enumerate(boxes):
+            if d not in matched_dets:
+                alive.append(KalmanBoxTrack(self._next_id, box))
+                self._next_id += 1
+        self.tracks = alive
+
+        return [track for track in self.tracks if track.hits >= self.min_hits]
+
+    def unique_counts(self):
+        """Vehicles per type: closed tracks plus confirmed live ones."""
+        counts = dict(self._finished)
+        for track in self.tracks:
+            if track.hits >= self.min_hits:
+                counts[track.vehicle_type] += 1
+        return counts
+
+    def summary(self):
+        return {
+            "frames": self.frames,
+            "unique": self.unique_counts(),
+            "crossings": dict(self.crossings),
+            "crossings_by_direction": dict(self.crossings_by_direction),
+        }
+
+    def merge(self, summary):
+        """
+        Add the counts of another tracker's summary, e.g. one per video
+        segment analysed in parallel.
+        """
+        self.frames += summary["frames"]
+        for vehicle_type, n in summary["unique"].items():
+            self._finished[vehicle_type] += n
+        for vehicle_type, n in summary["crossings"].items():
+            self.crossings[vehicle_type] += n
+        for direction, n in summary["crossings_by_direction"].items():
+            self.crossings_by_direction[direction] += n
+
+
+class TrackingDetector:
+    """
+    Turns a box detector (list of frames -> list of box lists) into a count
+    detector. Each frame's boxes are mapped through an optional
+    roi.FrameLayout (back to full-frame pixels, ROI filter, lane), then fed
+    to the VehicleTracker and roi.LaneCounter, if given. Must see frames in
+    order, so use it with a single inference worker.
+    """
+
+    def __init__(self, detector, tracker=None, layout=None, lanes=None):
+        self.detector = detector
+        self.tracker = tracker
+        self.layout = layout
+        self.lanes = lanes
+
+    def __call__(self, frames):
+        results = []
+        for boxes in self.detector(frames):
+            if self.layout is not None:
+                boxes = self.layout.place(boxes)
+            if self.tracker is not None:
+                self.tracker.update(boxes)
+            if self.lanes is not None:
+                self.lanes.add(boxes)
+            results.append(count_boxes(boxes))
+        return results
@@ -1,10 +1,16 @@
 # traffic_app/processing/yolo_detect.py
-from ultralytics import YOLO
 import cv2
 import numpy as np
 
-# Load model once (yolov8n small & fast)
-model = YOLO("yolov8n.pt")
+from .model_registry import DEFAULT_MODEL, get_backend
+
+# Weights file (yolov8n small & fast); loaded lazily on first detection.
+# A .onnx file runs on the onnxruntime backend (see backends.py).
+MODEL_NAME = DEFAULT_MODEL
+
+# Minimum confidence for YOLO to return a box, and for a box to be counted
+DETECTION_CONF = 0.25
+VEHICLE_CONF = 0.3
 
 # COCO dataset class mappings for vehicles
 VEHICLE_CLASSES = {
@@ -15,30 +21,83 @@ VEHICLE_CLASSES = {
     1: "bike",         # bicycle (also bike)
 }
 
-def detect_vehicles_in_frame(frame):
+# Number of frames sent to the model in one inference call
+DEFAULT_BATCH_SIZE = 8
+
+# Order of the per-type count vector produced by bincount
+VEHICLE_TYPES = ("car", "bike", "bus", "truck")
+
+# COCO class id -> index into VEHICLE_TYPES, -1 for non-vehicles
+_CLASS_TO_TYPE = np.full(max(VEHICLE_CLASSES) + 1, -1, dtype=np.int64)
+for _cls_id, _vehicle_type in VEHICLE_CLASSES.items():
+    _CLASS_TO_TYPE[_cls_id] = VEHICLE_TYPES.index(_vehicle_type)
+
+
+def vehicle_mask(cls, conf, vehicle_conf=VEHICLE_CONF, class_conf=None):
+    """
+    Vectorised filter over all boxes of a frame.
+    class_conf optionally overrides vehicle_conf per vehicle type,
+    e.g. {"bike": 0.4}. A box counts when its confidence is above the
+    threshold of its type.
+    Returns (mask, type_index) where type_index indexes VEHICLE_TYPES.
+    """
+    known = (cls >= 0) & (cls < len(_CLASS_TO_TYPE))
+    type_index = np.where(known, _CLASS_TO_TYPE[np.clip(cls, 0, len(_CLASS_TO_TYPE) - 1)], -1)
+
+    thresholds = np.full(len(VEHICLE_TYPES), vehicle_conf, dtype=np.float32)
+    for vehicle_type, threshold in (class_conf or {}).items():
+        thresholds[VEHICLE_TYPES.index(vehicle_type)] = threshold
+
+    is_vehicle = type_index >= 0
+    mask = is_vehicle & (conf > thresholds[np.where(is_vehicle, type_index, 0)])
+    return mask, type_index
+
+
+def count_vehicle_arrays(cls, conf, vehicle_conf=VEHICLE_CONF, class_conf=None):
+    """
+    Per-type vehicle counts for one frame's box arrays, using bincount.
+    """
+    mask, type_index = vehicle_mask(cls, conf, vehicle_conf, class_conf)
+    totals = np.bincount(type_index[mask], minlength=len(VEHICLE_TYPES))
+    return {vehicle_type: int(n) for vehicle_type, n in zip(VEHICLE_TYPES, totals)}
+
+
+def _count_vehicles(arrays, vehicle_conf=VEHICLE_CONF, class_conf=None):
+    """
+    Count the vehicles in one frame's (cls, conf, xyxy) box arrays
+    """
+    cls, conf, _ = arrays
+    return count_vehicle_arrays(cls, conf, vehicle_conf, class_conf)
+
+
+def _vehicle_boxes(cls, conf, xyxy, vehicle_conf=VEHICLE_CONF, class_conf=None):
+    """
+    Boxes of the counted vehicles in one frame's box arrays:
+    [{"type": str, "bbox": [x1,y1,x2,y2], "conf": float}, ...]
+    """
+    mask, type_index = vehicle_mask(cls, conf, vehicle_conf, class_conf)
+    return [
+        {"type": VEHICLE_TYPES[t], "bbox": bbox, "conf": c}
+        for t, bbox, c in zip(type_index[mask].tolist(), xyxy[mask].astype(int).tolist(), conf[mask].tolist())
+    ]
+
+
+def detect_vehicles_in_frame(frame, model_name=MODEL_NAME, class_conf=None, backend=None, backend_options=None):
     """
     Returns dict: {"car": int, "bike": int, "bus": int, "truck": int}
-    Uses YOLO detection with proper class mapping
+    Uses YOLO detection with proper class mapping.
+    backend: "torch" or "onnx" (default: from the model file extension);
+    backend_options are passed to the backend when it is first created.
     """
     counts = {"car": 0, "bike": 0, "bus": 0, "truck": 0}
     
     try:
         # Run inference with confidence threshold
-        results = model(frame, conf=0.25, verbose=False)
+        results = get_backend(model_name, backend, **(backend_options or {})).predict([frame], DETECTION_CONF)
         
         for r in results:
-            if r.boxes is None or len(r.boxes) == 0:
-                continue
-                
-            for box in r.boxes:
-                # Get class ID
-                cls_id = int(box.cls[0].item())
-                confidence = float(box.conf[0].item())
-                
-                # Only count if confidence is high enough and it's a vehicle
-                if confidence > 0.3 and cls_id in VEHICLE_CLASSES:
-                    vehicle_type = VEHICLE_CLASSES[cls_id]
-                    counts[vehicle_type] += 1
+            for vehicle_type, n in _count_vehicles(r, VEHICLE_CONF, class_conf).items():
+                counts[vehicle_type] += n
                     
     except Exception as e:
         print(f"Error in vehicle detection: {e}")
@@ -48,7 +107,38 @@ def detect_vehicles_in_frame(frame):
     return counts
 
 
-def detect_vehicles_with_boxes(frame):
+def detect_vehicles_in_frames(frames, batch_size=DEFAULT_BATCH_SIZE, conf=DETECTION_CONF, vehicle_conf=VEHICLE_CONF,
+                              model_name=MODEL_NAME, class_conf=None, backend=None, backend_options=None):
+    """
+    Batched version of detect_vehicles_in_frame.
+    Runs YOLO on up to batch_size frames per inference call.
+    Returns a list of count dicts, one per input frame, in order.
+    """
+    frames = list(frames)
+    batch_size = max(1, int(batch_size or 1))
+    all_counts = []
+    model = get_backend(model_name, backend, **(backend_options or {}))
+
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+
+        try:
+            # One result per frame, same order as the input list
+            results = model.predict(batch, conf)
+
+            batch_counts = [_count_vehicles(r, vehicle_conf, class_conf) for r in results]
+
+        except Exception as e:
+            print(f"Error in batched vehicle detection: {e}")
+            # Zero counts for the failed batch
+            batch_counts = [{"car": 0, "bike": 0, "bus": 0, "truck": 0} for _ in batch]
+
+        all_counts.extend(batch_counts)
+
+    return all_counts
+
+
+def detect_vehicles_with_boxes(frame, model_name=MODEL_NAME, class_conf=None, backend=None, backend_options=None):
     """
     Returns both counts and bounding boxes for visualization
     Returns: (counts_dict, boxes_list)
@@ -58,27 +148,15 @@ def detect_vehicles_with_boxes(frame):
     boxes = []
     
     try:
-        results = model(frame, conf=0.25, verbose=False)
+        results = get_backend(model_name, backend, **(backend_options or {})).predict([frame], DETECTION_CONF)
         
-        for r in results:
-            if r.boxes is None or len(r.boxes) == 0:
-                continue
-                
-            for box in r.boxes:
-                cls_id = int(box.cls[0].item())
-                confidence = float(box.conf[0].item())
-                
-                if confidence > 0.3 and cls_id in VEHICLE_CLASSES:
-                    vehicle_type = VEHICLE_CLASSES[cls_id]
-                    counts[vehicle_type] += 1
-                    
-                    # Get bounding box coordinates
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    boxes.append({
-                        "type": vehicle_type,
-                        "bbox": [int(x1), int(y1), int(x2), int(y2)],
-                        "conf": confidence
-                    })
+        for cls, conf, xyxy in results:
+
+            for vehicle_type, n in count_vehicle_arrays(cls, conf, VEHICLE_CONF, class_conf).items():
+                counts[vehicle_type] += n
+
+            # Bounding boxes of the counted vehicles only
+            boxes.extend(_vehicle_boxes(cls, conf, xyxy, VEHICLE_CONF, class_conf))
                     
     except Exception as e:
         print(f"Error in vehicle detection with boxes: {e}")
@@ -86,6 +164,35 @@ def detect_vehicles_with_boxes(frame):
     return counts, boxes
 
 
+def detect_vehicles_with_boxes_in_frames(frames, batch_size=DEFAULT_BATCH_SIZE, conf=DETECTION_CONF,
+                                         vehicle_conf=VEHICLE_CONF, model_name=MODEL_NAME, class_conf=None,
+                                         backend=None, backend_options=None):
+    """
+    Batched box detector for tracking.
+    Returns a list of box lists (format as in detect_vehicles_with_boxes),
+    one per input frame, in order.
+    """
+    frames = list(frames)
+    batch_size = max(1, int(batch_size or 1))
+    all_boxes = []
+    model = get_backend(model_name, backend, **(backend_options or {}))
+
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+
+        try:
+            results = model.predict(batch, conf)
+            batch_boxes = [_vehicle_boxes(*r, vehicle_conf, class_conf) for r in results]
+
+        except Exception as e:
+            print(f"Error in batched vehicle detection with boxes: {e}")
+            batch_boxes = [[] for _ in batch]
+
+        all_boxes.extend(batch_boxes)
+
+    return all_boxes
+
+
 def draw_detections(frame, boxes):
     """
     Draw bounding boxes on frame for visualization
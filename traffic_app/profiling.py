@@ -0,0 +1,194 @@
+# traffic_app/profiling.py
+"""
+Per-analysis timing.
+
+An AnalysisProfile collects, for each stage of one analysis, its wall
+time and what it processed (frames, skipped frames, detector calls). The
+result is stored on ProcessingResult.profile and logged as a structured
+record on the "traffic_app.profiling" logger:
+
+    decode      sampled frames read from the video (pipeline thread busy time)
+    inference   detector on the decoded frames (pipeline thread busy time)
+    aggregate   per-frame counts, tracking and lanes (pipeline thread busy time)
+    detection   wall time of the whole threaded/parallel detection run
+    summarize   density, congestion and signal timing
+    db_write    saving the ProcessingResult and its series
+    alert       n8n webhook
+    cache_store / cache_lookup   result cache
+
+With ANALYSIS_PROFILER set, the whole analysis also runs under cProfile
+or pyinstrument and the dump is written to ANALYSIS_PROFILE_DIR.
+"""
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PROFILER_CPROFILE = "cprofile"
+PROFILER_PYINSTRUMENT = "pyinstrument"
+
+
+class AnalysisProfile:
+    """
+    Stage timings of one analysis. Stages keep the order they were first
+    entered in.
+    """
+
+    def __init__(self, video_id=None):
+        self.video_id = video_id
+        self.stages = {}
+        self.dump = None
+        self._started = time.perf_counter()
+        self.total_seconds = 0.0
+
+    def _entry(self, name):
+        return self.stages.setdefault(name, {"seconds": 0.0})
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block as (part of) stage `name`; yields its counter dict."""
+        entry = self._entry(name)
+        started = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry["seconds"] += time.perf_counter() - started
+
+    def add(self, name, seconds=0.0, **counters):
+        entry = self._entry(name)
+        entry["seconds"] += seconds
+        for key, value in counters.items():
+            entry[key] = entry.get(key, 0) + value
+        return entry
+
+    def add_pipeline(self, stats):
+        """Decode, inference and aggregate stages from a pipeline.PipelineStats."""
+        summary = stats.as_dict()
+        stages, counters = summary["stages"], summary["counters"]
+        for name in ("decode", "inference", "aggregate"):
+            if name not in stages:
+                continue
+            stage = stages[name]
+            extra = {}
+            if name == "inference":
+                extra["skipped"] = counters.get("skipped_frames", 0)
+                # Behind the motion gate only some batches reach the detector
+                extra["inference_calls"] = counters.get("detector_calls", stage["batches"])
+            self.add(name, stage["busy_seconds"], frames=stage["items"], **extra)
+
+    def finish(self):
+        self.total_seconds = time.perf_counter() - self._started
+        return self
+
+    def as_dict(self):
+        return {
+            "total_seconds": round(self.total_seconds, 4),
+            "stages": {
+                name: {key: round(value, 4) if key == "seconds" else value for key, value in entry.items()}
+                for name, entry in self.stages.items()
+            },
+            "dump": self.dump,
+        }
+
+    def log(self):
+        """Send the profile through LOGGING as one structured record."""
+        data = self.as_dict()
+        logger.info(
+            "Analysis of video %s took %.2fs (%s)",
+            self.video_id, self.total_seconds,
+            ", ".join(f"{name} {entry['seconds']:.2f}s" for name, entry in data["stages"].items()),
+            extra={"video_id": self.video_id, "profile": data},
+        )
+        return data
+
+
+class _ThreadedCProfile:
+    """
+    cProfile over the calling thread and every thread started while it
+    runs (the decode and inference threads of the pipeline). Python 3.12+
+    profiles all threads from a single profiler already.
+    """
+
+    def __init__(self):
+        self.main = cProfile.Profile()
+        self.threads = []
+        self._lock = threading.Lock()
+        self._per_thread = sys.version_info < (3, 12)
+
+    def _start_thread(self, *args):
+        # First profile event of a new thread: replace this hook by a profiler
+        profile = cProfile.Profile()
+        with self._lock:
+            self.threads.append(profile)
+        profile.enable()
+
+    def __enter__(self):
+        if self._per_thread:
+            threading.setprofile(self._start_thread)
+        self.main.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.main.disable()
+        if self._per_thread:
+            threading.setprofile(None)
+
+    def dump(self, path):
+        import pstats
+
+        stats = pstats.Stats(self.main)
+        for profile in self.threads:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+
+@contextmanager
+def profiler(profile):
+    """
+    Run the block under the profiler named by ANALYSIS_PROFILER ("cprofile",
+    "pyinstrument" or empty for none) and record the dump path on profile.
+    cProfile dumps (.prof) open with pstats or snakeviz; pyinstrument
+    writes an HTML report of the calling thread.
+    """
+    kind = (getattr(settings, "ANALYSIS_PROFILER", "") or "").lower()
+    if not kind:
+        yield
+        return
+
+    directory = getattr(settings, "ANALYSIS_PROFILE_DIR", os.path.join(settings.BASE_DIR, "profiles"))
+    os.makedirs(directory, exist_ok=True)
+    name = f"video-{profile.video_id}-{timezone.now():%Y%m%d-%H%M%S}"
+
+    if kind == PROFILER_PYINSTRUMENT:
+        from pyinstrument import Profiler
+
+        session = Profiler()
+        session.start()
+        try:
+            yield
+        finally:
+            session.stop()
+            path = os.path.join(directory, name + ".html")
+            with open(path, "w") as f:
+                f.write(session.output_html())
+            profile.dump = str(path)
+    elif kind == PROFILER_CPROFILE:
+        session = _ThreadedCProfile()
+        try:
+            with session:
+                yield
+        finally:
+            path = os.path.join(directory, name + ".prof")
+            session.dump(path)
+            profile.dump = str(path)
+    else:
+        raise ValueError(f"Unknown ANALYSIS_PROFILER {kind!r}, expected "
+                         f"{PROFILER_CPROFILE!r} or {PROFILER_PYINSTRUMENT!r}")
@@ -0,0 +1,158 @@
+# traffic_app/result_cache.py
+"""
+Result cache keyed by video contents + analysis parameters.
+
+Re-uploading a clip that was already analysed with the same model and
+thresholds reuses the stored result instead of running detection again.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .ml import classifier
+from .models import CachedResult
+
+# Files are hashed in fixed blocks; the content hash is the SHA-256 of the
+# concatenated block digests. Unlike a single running SHA-256 this can be
+# computed incrementally from independently received chunks.
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def hash_blocks(block_digests):
+    """Combine per-block SHA-256 digests (bytes) into the content hash."""
+    h = hashlib.sha256()
+    for digest in block_digests:
+        h.update(digest)
+    return h.hexdigest()
+
+
+def hash_file(path, block_size=HASH_BLOCK_SIZE):
+    """
+    Streaming content hash of a file, reading one block at a time.
+    """
+    digests = []
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digests.append(hashlib.sha256(block).digest())
+    return hash_blocks(digests)
+
+
+def analysis_params(layout=None):
+    """
+    Parameters that change the analysis output. Part of every cache key,
+    so changing any of them invalidates earlier entries.
+    layout is the camera's roi.RoadLayout, if any.
+    """
+    # services imports this module
+    from .services import congestion_model_path
+
+    backend = getattr(settings, "DETECTOR_BACKEND", "torch")
+    return {
+        "backend": backend,
+        "model": getattr(settings, "ONNX_MODEL", "yolov8n.onnx") if backend == "onnx"
+        else getattr(settings, "YOLO_MODEL", "yolov8n.pt"),
+        "sample_rate": getattr(settings, "ANALYSIS_SAMPLE_RATE", 30),
+        "conf": getattr(settings, "YOLO_CONF", 0.25),
+        "vehicle_conf": getattr(settings, "VEHICLE_CONF", 0.3),
+        "class_conf": getattr(settings, "VEHICLE_CLASS_CONF", {}),
+        "adaptive": getattr(settings, "ANALYSIS_ADAPTIVE", False),
+        "gate_options": {
+            "threshold": getattr(settings, "MOTION_THRESHOLD", 0.02),
+            "max_interval": getattr(settings, "MOTION_MAX_INTERVAL", 5),
+        },
+        "tracking": {
+            "iou_threshold": getattr(settings, "TRACK_IOU_THRESHOLD", 0.3),
+            "max_distance": getattr(settings, "TRACK_MAX_DISTANCE", 2.0),
+            "max_age": getattr(settings, "TRACK_MAX_AGE", 3),
+            "min_hits": getattr(settings, "TRACK_MIN_HITS", 1),
+            "line": getattr(settings, "TRACK_COUNTING_LINE", None),
+        } if getattr(settings, "TRACKING_ENABLED", True) else None,
+        "layout": layout.as_dict() if layout else None,
+        "congestion_model": classifier.model_version(congestion_model_path()),
+    }
+
+
+def cache_key(content_hash, params):
+    blob = json.dumps({"content": content_hash, "params": params}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def get_video_hash(video):
+    """Return the video's content hash, computing and saving it if needed."""
+    if not video.content_hash:
+        video.content_hash = hash_file(video.file_path)
+        video.save(update_fields=["content_hash"])
+    return video.content_hash
+
+
+def lookup(content_hash, params=None):
+    """
+    Return the cached payload for this content hash and parameters, or None.
+    """
+    if not getattr(settings, "RESULT_CACHE_ENABLED", True):
+        return None
+
+    params = params if params is not None else analysis_params()
+    entry = CachedResult.objects.filter(key=cache_key(content_hash, params)).first()
+    if entry is None:
+        return None
+
+    entry.hits += 1
+    entry.last_used_at = timezone.now()
+    entry.save(update_fields=["hits", "last_used_at"])
+    return entry.payload
+
+
+def store(content_hash, payload, params=None):
+    """
+    Save a result payload (JSON-serialisable dict) and evict old entries.
+    """
+    if not getattr(settings, "RESULT_CACHE_ENABLED", True):
+        return None
+
+    params = params if params is not None else analysis_params()
+    entry, _ = CachedResult.objects.update_or_create(
+        key=cache_key(content_hash, params),
+        defaults={
+            "content_hash": content_hash,
+            "params": params,
+            "payload": payload,
+            "size_bytes": len(json.dumps(payload)),
+            "last_used_at": timezone.now(),
+        },
+    )
+    evict()
+    return entry
+
+
+def evict(max_entries=None, max_bytes=None):
+    """
+    Drop least recently used entries until the cache is within both the
+    entry and the byte limits. Returns the number of entries removed.
+    """
+    if max_entries is None:
+        max_entries = getattr(settings, "RESULT_CACHE_MAX_ENTRIES", 10000)
+    if max_bytes is None:
+        max_bytes = getattr(settings, "RESULT_CACHE_MAX_BYTES", 50 * 1024 * 1024)
+
+    count = CachedResult.objects.count()
+    total = CachedResult.objects.aggregate(total=Sum("size_bytes"))["total"] or 0
+    if count <= max_entries and total <= max_bytes:
+        return 0
+
+    doomed = []
+    for pk, size in CachedResult.objects.order_by("last_used_at", "id").values_list("pk", "size_bytes").iterator():
+        if count <= max_entries and total <= max_bytes:
+            break
+        doomed.append(pk)
+        count -= 1
+        total -= size
+
+    CachedResult.objects.filter(pk__in=doomed).delete()
+    return len(doomed)
@@ -0,0 +1,329 @@
+# traffic_app/services.py
+from functools import partial
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .ml import classifier
+from .models import FrameDetection, ProcessingResult
+
+from .processing.yolo_detect import detect_vehicles_in_frames, detect_vehicles_with_boxes_in_frames
+from .processing.extract_frames import extract_and_sample_frames
+from .processing.parallel import extract_and_sample_frames_parallel
+from .processing.compute_density import analyze_sampled_frames
+
+from .analysis import predict_clearing_time, traffic_signal_recommendation
+from .processing.signal_optimizer import optimize_lane_timing, optimize_signal_timing
+from .alerts import send_n8n_alert
+from .processing.frame_sampler import probe_video
+from .processing.tracker import VehicleTracker
+from .processing.roi import LaneCounter, RoadLayout
+from .processing.pipeline import PipelineStats
+from .profiling import AnalysisProfile, profiler
+from . import metrics, mqtt, result_cache, timeseries
+
+# ProcessingResult fields filled in by the analysis (and stored in the result cache)
+RESULT_FIELDS = [
+    "total_frames", "sampled_frames", "total_vehicles", "avg_vehicles_per_frame",
+    "density_score", "congestion", "count_cars", "count_bikes", "count_trucks",
+    "count_buses", "clearing_time", "signal_recommendation",
+    "signal_green_extension", "signal_pattern", "line_crossings", "lane_stats",
+]
+
+
+def backend_options():
+    """Settings for creating the configured detector backend."""
+    if getattr(settings, "DETECTOR_BACKEND", "torch") != "onnx":
+        return {}
+    return {
+        "providers": getattr(settings, "ONNX_PROVIDERS", ["CPUExecutionProvider"]),
+        "threads": getattr(settings, "ONNX_THREADS", 0),
+    }
+
+
+def build_detector(batch_size=None, boxes=False):
+    """
+    Batched YOLO detector configured from settings. A functools.partial,
+    so it can be sent to worker processes. With boxes=True it returns
+    per-frame box lists (for tracking) instead of counts.
+    """
+    params = result_cache.analysis_params()
+    return partial(
+        detect_vehicles_with_boxes_in_frames if boxes else detect_vehicles_in_frames,
+        batch_size=batch_size or getattr(settings, "YOLO_BATCH_SIZE", 8),
+        conf=params["conf"],
+        vehicle_conf=params["vehicle_conf"],
+        model_name=params["model"],
+        class_conf=params["class_conf"],
+        backend=params["backend"],
+        backend_options=backend_options(),
+    )
+
+
+def camera_layout(camera):
+    """The camera's ROI and lanes as a RoadLayout, or None if it has neither."""
+    if camera is None:
+        return None
+    layout = RoadLayout(
+        camera.roi,
+        [{"name": lane.name, "polygon": lane.polygon, "capacity": lane.capacity} for lane in camera.lanes.all()],
+    )
+    return layout or None
+
+
+def congestion_model_path():
+    """
+    The congestion model file: the version activated by retrain_congestion
+    --activate, else CONGESTION_MODEL ("" for the rule-based classification).
+    """
+    directory = getattr(settings, "CONGESTION_MODEL_DIR", settings.BASE_DIR / "models" / "congestion")
+    return classifier.active_version(directory) or getattr(settings, "CONGESTION_MODEL", classifier.MODEL_PATH)
+
+
+def classify_congestion(counts, hour, avg_per_frame, density):
+    """Congestion label of a vehicles-per-frame series, with the configured model."""
+    return classifier.classify(counts, hour, avg_per_frame, density, path=congestion_model_path())
+
+
+def classify_results(results):
+    """
+    Congestion labels {result id: label} for a queryset of
+    ProcessingResults, from their stored per-frame series, in one
+    predict() call. Results and series are fetched in two queries.
+    """
+    results = list(
+        results.select_related("video")
+        .prefetch_related(Prefetch("frames", FrameDetection.objects.only("result_id", "total")))
+    )
+    samples = [
+        ([frame.total for frame in r.frames.all()], timezone.localtime(r.video.uploaded_at).hour,
+         r.avg_vehicles_per_frame, r.density_score)
+        for r in results
+    ]
+    return dict(zip((r.pk for r in results),
+                    classifier.classify_batch(samples, path=congestion_model_path())))
+
+
+def video_params(video):
+    """Analysis parameters (result cache key part) for this upload."""
+    return result_cache.analysis_params(camera_layout(video.camera))
+
+
+def build_tracker():
+    """VehicleTracker configured from settings, or None with tracking off."""
+    options = result_cache.analysis_params()["tracking"]
+    return VehicleTracker(**options) if options is not None else None
+
+
+def run_detection(video_path, tracker=None, layout=None, lanes=None, stats=None):
+    """
+    Run vehicle detection over a video with the configured settings.
+    With a tracker, the breakdown holds unique vehicles. layout (RoadLayout)
+    restricts detection to the camera's ROI; lanes (LaneCounter) collects
+    per-lane counts; stats (PipelineStats) is filled with stage counters.
+    Returns (total_frames, sampled_count, detections_list, breakdown).
+    """
+    params = result_cache.analysis_params()
+    batch_size = getattr(settings, "YOLO_BATCH_SIZE", 8)
+    # ROI and lanes place boxes as well, even with tracking off
+    detector = build_detector(batch_size, boxes=tracker is not None or layout is not None or lanes is not None)
+
+    processes = getattr(settings, "ANALYSIS_PROCESSES", 1)
+    if processes > 1:
+        return extract_and_sample_frames_parallel(
+            video_path,
+            sample_rate=params["sample_rate"],
+            batch_size=batch_size,
+            detector=detector,
+            processes=processes,
+            adaptive=params["adaptive"],
+            gate_options=params["gate_options"],
+            tracker=tracker,
+            layout=layout,
+            lanes=lanes,
+            stats=stats,
+        )
+    return extract_and_sample_frames(
+        video_path,
+        sample_rate=params["sample_rate"],
+        batch_size=batch_size,
+        detector=detector,
+        inference_workers=getattr(settings, "PIPELINE_INFERENCE_WORKERS", 1),
+        queue_size=getattr(settings, "PIPELINE_QUEUE_SIZE", 4),
+        adaptive=params["adaptive"],
+        gate_options=params["gate_options"],
+        tracker=tracker,
+        layout=layout,
+        lanes=lanes,
+        stats=stats,
+    )
+
+
+def analyze_video(video):
+    """
+    Run the full analysis for an uploaded video and store its ProcessingResult.
+    Sends an n8n alert when congestion is MEDIUM or HIGH.
+    Returns the saved ProcessingResult, with per-stage timings in its profile.
+    """
+    profile = AnalysisProfile(video.pk)
+    with profiler(profile):
+        layout = camera_layout(video.camera)
+        params = result_cache.analysis_params(layout)
+        tracker = build_tracker()
+        lanes = LaneCounter(layout) if layout is not None and layout.lanes else None
+
+        stats = PipelineStats()
+        with profile.stage("detection") as detection:
+            total_frames, sampled_count, detections, breakdown = run_detection(
+                video.file_path, tracker, layout, lanes, stats
+            )
+            detection["frames"] = sampled_count
+        profile.add_pipeline(stats)
+        metrics.record_pipeline(stats)
+
+        with profile.stage("summarize"):
+            values = summarize_detections(total_frames, sampled_count, detections, breakdown, tracker, lanes,
+                                          video.uploaded_at)
+            values["sample_rate"] = params["sample_rate"]
+            values["fps"] = probe_video(video.file_path)[1]
+
+        res = store_result(video, values, profile)
+
+        # Remember the result for identical re-uploads
+        with profile.stage("cache_store"):
+            result_cache.store(result_cache.get_video_hash(video), values, params)
+
+    save_profile(res, profile)
+    metrics.record_result(res, "analysis", profile)
+    metrics.flush()
+    return res
+
+
+def summarize_detections(total_frames, sampled_count, detections, breakdown, tracker=None, lanes=None,
+                         start=None):
+    """
+    Turn detection output into result values: every RESULT_FIELDS entry
+    plus the packed per-frame "series". start is when the clip was
+    recorded (default now); its hour is a feature of the congestion model.
+    """
+    # Calculate totals (unique vehicles when tracking)
+    car_count = int(breakdown.get("cars", 0))
+    bike_count = int(breakdown.get("bikes", 0))
+    truck_count = int(breakdown.get("trucks", 0))
+    bus_count = int(breakdown.get("buses", 0))
+
+    total_vehicles = car_count + bike_count + truck_count + bus_count
+
+    # Density and congestion
+    per_frame_totals = [sum(d.values()) for d in (detections or [])] if detections else []
+    avg_per_frame = sum(per_frame_totals) / sampled_count if sampled_count else 0.0
+    density = analyze_sampled_frames(per_frame_totals) if per_frame_totals else 0.0
+    congestion = classify_congestion(per_frame_totals, timezone.localtime(start).hour, avg_per_frame, density)
+
+    # Predictions and recommendations
+    clearing_time = predict_clearing_time(avg_per_frame, density)
+    signal_suggestion = traffic_signal_recommendation(density)
+    green_ext, pattern = optimize_signal_timing(density, avg_per_frame)
+
+    # Per-lane density and timing
+    lane_stats = {}
+    if lanes is not None:
+        lane_stats = lanes.summary()
+        for name, timing in optimize_lane_timing(lane_stats).items():
+            lane_stats[name].update(timing)
+
+    return {
+        "total_frames": total_frames,
+        "sampled_frames": sampled_count,
+        "total_vehicles": total_vehicles,
+        "avg_vehicles_per_frame": avg_per_frame,
+        "density_score": density,
+        "congestion": congestion,
+        "count_cars": car_count,
+        "count_bikes": bike_count,
+        "count_trucks": truck_count,
+        "count_buses": bus_count,
+        "clearing_time": clearing_time,
+        "signal_recommendation": signal_suggestion,
+        "signal_green_extension": float(green_ext),
+        "signal_pattern": pattern,
+        "line_crossings": {
+            "by_type": dict(tracker.crossings),
+            "by_direction": dict(tracker.crossings_by_direction),
+        } if tracker is not None and tracker.line is not None else {},
+        "lane_stats": lane_stats,
+        # Per-frame series, kept in the cache payload so hits get it too
+        "series": timeseries.pack_detections(detections or []),
+    }
+
+
+def store_result(video, values, profile=None):
+    """
+    Save analysis values as the video's ProcessingResult (and its per-frame
+    series, if present) and mark the video processed, send an n8n alert
+    when congestion is MEDIUM or HIGH, and publish the result over MQTT
+    for a camera's video. Each step is timed on profile (AnalysisProfile),
+    if given.
+    """
+    profile = profile if profile is not None else AnalysisProfile(video.pk)
+    with profile.stage("db_write"):
+        res, _ = ProcessingResult.objects.get_or_create(video=video)
+        for field in RESULT_FIELDS:
+            setattr(res, field, values[field])
+        res.save()
+
+        if "series" in values:
+            # No recording time is known: the series starts at the upload time
+            timeseries.store_series(res, values["series"], values["sample_rate"], values["fps"], video.uploaded_at)
+
+        video.processed = True
+        video.save()
+
+    # Send alert if congestion is MEDIUM or HIGH
+    if res.congestion in ["MEDIUM", "HIGH"]:
+        alert_data = {
+            "congestion": res.congestion,
+            "density_score": res.density_score,
+            "total_vehicles": res.total_vehicles,
+            "avg_vehicles_per_frame": res.avg_vehicles_per_frame,
+            "clearing_time": res.clearing_time,
+            "signal_recommendation": res.signal_recommendation,
+            "count_cars": res.count_cars,
+            "count_bikes": res.count_bikes,
+            "count_trucks": res.count_trucks,
+            "count_buses": res.count_buses,
+            "location": video.title or "Traffic Camera"
+        }
+        with profile.stage("alert"):
+            send_n8n_alert(alert_data)
+
+    # Congestion and signal timing for the camera's signal controller
+    if video.camera is not None:
+        with profile.stage("mqtt"):
+            mqtt.publish_result(video, res)
+
+    return res
+
+
+def save_profile(res, profile):
+    """Store the finished profile on the result and log it."""
+    res.profile = profile.finish().log()
+    res.save(update_fields=["profile"])
+
+
+def apply_cached_result(video):
+    """
+    If an identical video was analysed with the current parameters, store
+    its result for this video and return it. Returns None on a cache miss.
+    """
+    profile = AnalysisProfile(video.pk)
+    with profile.stage("cache_lookup"):
+        payload = result_cache.lookup(result_cache.get_video_hash(video), video_params(video))
+    if payload is None:
+        return None
+    res = store_result(video, payload, profile)
+    save_profile(res, profile)
+    metrics.record_result(res, "cache")
+    metrics.flush()
+    return res
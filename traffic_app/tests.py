@@ -1,3 +1,1756 @@
-from django.test import TestCase
+import fcntl
+import functools
+import io
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import struct
+import threading
+import pstats
+import queue
+import shutil
+import tempfile
+import sys
+import time
+import types
+import unittest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from benchmarks.synthetic import stub_box_detector, stub_detector, write_synthetic_video
+
+from . import alerts, api, archive, dashboard, downloads, metrics, mqtt, result_cache, timeseries, uploads
+from .jobs import (
+    claim_next_job, enqueue_analysis, heartbeat, keep_alive, requeue_stale_jobs, run_job, run_worker,
+)
+from .models import (
+    AlertOutbox, AnalysisJob, CachedResult, Camera, FrameDetection, Lane, ProcessingResult, UploadSession,
+    VideoUpload,
+)
+from .processing import backends, frame_sampler, model_registry
+from .processing.motion_gate import GatedDetector, MotionGate
+from .processing.parallel import extract_and_sample_frames_parallel, plan_segments
+from .processing.pipeline import PipelineStats, run_pipeline
+from .processing.extract_frames import extract_and_sample_frames
+from .processing.stream import RollingWindow
+from .processing.roi import LaneCounter, RoadLayout, points_in_polygon
+from .processing.signal_optimizer import optimize_lane_timing
+from .processing.tracker import VehicleTracker
+from .processing.yolo_detect import count_vehicle_arrays, detect_vehicles_in_frames, vehicle_mask
+from .log_format import JsonFormatter
+from .ml import classifier, train_model
+from .profiling import AnalysisProfile
+from .services import (
+    RESULT_FIELDS, analyze_video, apply_cached_result, camera_layout, classify_congestion, classify_results,
+    congestion_model_path, store_result, summarize_detections, video_params,
+)
+from .streaming import run_camera
+
+
+# Every saved result invalidates the dashboard cache: keep tests that save
+# results off the shared file cache
+LOCAL_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"}}
+
+
+class MediaRootMixin:
+    """Store uploaded files in a throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_override.enable()
+
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+    def make_video(self, title="Test", content=b"fake video"):
+        return VideoUpload.objects.create(
+            title=title,
+            video_file=SimpleUploadedFile("clip.mp4", content),
+        )
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class JobQueueTests(MediaRootMixin, TestCase):
+    def test_enqueue_reuses_open_job(self):
+        video = self.make_video()
+        first = enqueue_analysis(video)
+        second = enqueue_analysis(video)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+
+    def test_claim_marks_job_running(self):
+        video = self.make_video()
+        job = enqueue_analysis(video)
+        claimed = claim_next_job(worker="w1")
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, AnalysisJob.STATUS_RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNone(claim_next_job(worker="w2"))
+
+    def test_run_job_records_failure(self):
+        video = self.make_video()
+        enqueue_analysis(video)
+        job = claim_next_job()
+
+        def broken(video):
+            raise RuntimeError("decode failed")
+
+        run_job(job, analyze=broken)
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.STATUS_FAILED)
+        self.assertIn("decode failed", job.error)
+
+    def test_worker_drains_queue(self):
+        seen = []
+        for i in range(3):
+            enqueue_analysis(self.make_video(title=f"v{i}"))
+
+        processed = run_worker(once=True, analyze=lambda video: seen.append(video.title))
+        self.assertEqual(processed, 3)
+        self.assertEqual(seen, ["v0", "v1", "v2"])
+        self.assertFalse(AnalysisJob.objects.exclude(status=AnalysisJob.STATUS_DONE).exists())
+
+    def test_stale_jobs_are_requeued_until_max_attempts(self):
+        long_ago = timezone.now() - timedelta(hours=2)
+        jobs = {}
+        for name, attempts, heartbeat_at in (("alive", 1, timezone.now()), ("dead", 1, long_ago),
+                                             ("exhausted", 3, long_ago)):
+            jobs[name] = enqueue_analysis(self.make_video(name))
+            AnalysisJob.objects.filter(pk=jobs[name].pk).update(
+                status=AnalysisJob.STATUS_RUNNING, worker="w1", attempts=attempts,
+                started_at=long_ago, heartbeat_at=heartbeat_at,
+            )
+
+        self.assertEqual(requeue_stale_jobs(max_age_seconds=300, max_attempts=3), 1)
+        statuses = dict(AnalysisJob.objects.values_list("video__title", "status"))
+        self.assertEqual(statuses, {"alive": AnalysisJob.STATUS_RUNNING, "dead": AnalysisJob.STATUS_PENDING,
+                                    "exhausted": AnalysisJob.STATUS_FAILED})
+        self.assertEqual(claim_next_job(worker="w2").attempts, 2)
+
+    def test_heartbeat_renews_lease_of_own_job(self):
+        job = enqueue_analysis(self.make_video())
+        job = claim_next_job(worker="w1")
+        AnalysisJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertTrue(heartbeat(job))
+        self.assertEqual(requeue_stale_jobs(max_age_seconds=300), 0)
+
+        AnalysisJob.objects.filter(pk=job.pk).update(worker="w2")
+        self.assertFalse(heartbeat(job))
+
+        with mock.patch("traffic_app.jobs.heartbeat") as beat, keep_alive(job, interval=0.01):
+            time.sleep(0.1)
+        self.assertGreater(beat.call_count, 1)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class UploadFlowTests(MediaRootMixin, TestCase):
+    def test_upload_queues_job_and_redirects(self):
+        response = self.client.post(reverse("traffic_app:upload"), {
+            "title": "Junction 4",
+            "video_file": SimpleUploadedFile("clip.mp4", b"fake video"),
+        })
+        video = VideoUpload.objects.get()
+        self.assertRedirects(response, reverse("traffic_app:processing", args=[video.id]))
+        self.assertEqual(video.jobs.get().status, AnalysisJob.STATUS_PENDING)
+        self.assertFalse(ProcessingResult.objects.exists())
+
+    def test_job_status_reports_results_url(self):
+        video = self.make_video()
+        job = enqueue_analysis(video)
+        url = reverse("traffic_app:job_status", args=[job.id])
+
+        self.assertEqual(self.client.get(url).json()["status"], AnalysisJob.STATUS_PENDING)
+
+        job.status = AnalysisJob.STATUS_DONE
+        job.save()
+        data = self.client.get(url).json()
+        self.assertEqual(data["results_url"], reverse("traffic_app:results", args=[video.id]))
+
+
+def make_result_values(**overrides):
+    values = {field: 0 for field in RESULT_FIELDS}
+    values.update(congestion="LOW", signal_recommendation="", signal_pattern="Normal flow")
+    values.update(overrides)
+    return values
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ResultCacheTests(MediaRootMixin, TestCase):
+    def test_hash_file_streams_blocks(self):
+        video = self.make_video(content=b"x" * 1000)
+        path = video.video_file.path
+        self.assertEqual(result_cache.hash_file(path), result_cache.get_video_hash(video))
+        self.assertNotEqual(result_cache.hash_file(path), result_cache.hash_file(path, block_size=100))
+
+    def test_lookup_depends_on_params(self):
+        params = result_cache.analysis_params()
+        result_cache.store("abc", make_result_values(total_vehicles=7), params)
+
+        self.assertEqual(result_cache.lookup("abc", params)["total_vehicles"], 7)
+        self.assertIsNone(result_cache.lookup("abc", dict(params, sample_rate=5)))
+        self.assertIsNone(result_cache.lookup("other", params))
+        self.assertEqual(CachedResult.objects.get().hits, 1)
+
+    def test_evicts_least_recently_used(self):
+        for name in ["a", "b", "c"]:
+            result_cache.store(name, make_result_values())
+        result_cache.lookup("a")
+
+        removed = result_cache.evict(max_entries=2)
+        self.assertEqual(removed, 1)
+        self.assertEqual(set(CachedResult.objects.values_list("content_hash", flat=True)), {"a", "c"})
+
+    def test_reupload_reuses_cached_result(self):
+        content = b"same clip"
+        first = self.make_video(content=content)
+        result_cache.store(result_cache.get_video_hash(first), make_result_values(total_vehicles=42))
+
+        response = self.client.post(reverse("traffic_app:upload"), {
+            "title": "Again",
+            "video_file": SimpleUploadedFile("again.mp4", content),
+        })
+        video = VideoUpload.objects.get(title="Again")
+        self.assertRedirects(response, reverse("traffic_app:results", args=[video.id]))
+        self.assertTrue(video.processed)
+        self.assertEqual(video.result.total_vehicles, 42)
+        self.assertFalse(video.jobs.exists())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TimeSeriesTests(MediaRootMixin, TestCase):
+    start = datetime(2026, 1, 1, 8, 0, tzinfo=dt_timezone.utc)
+
+    def make_result(self):
+        return ProcessingResult.objects.create(video=self.make_video())
+
+    def test_store_and_query_range(self):
+        result = self.make_result()
+        series = timeseries.pack_detections([{"car": i, "bus": 1} for i in range(10)])
+        # sample_rate 30 at 30 FPS: one row per second
+        self.assertEqual(timeseries.store_series(result, series, 30, 30.0, self.start), 10)
+
+        rows = timeseries.query_range(self.start + timedelta(seconds=3), self.start + timedelta(seconds=6))
+        self.assertEqual([r[0] for r in rows], [self.start + timedelta(seconds=s) for s in (3, 4, 5)])
+        self.assertEqual([r[1] for r in rows], [3, 4, 5])
+        self.assertEqual([r[5] for r in rows], [4, 5, 6])
+
+        buckets = timeseries.bucket_series(timeseries.query_range(self.start, self.start + timedelta(minutes=1)), 5)
+        self.assertEqual(len(buckets), 2)
+        self.assertEqual(buckets[0][0], self.start)
+        self.assertEqual(buckets[0][1], 2.0)
+
+    def test_failed_replace_keeps_old_series(self):
+        result = self.make_result()
+        timeseries.store_series(result, [[1, 0, 0, 0]] * 3, 30, 30.0, self.start)
+        with mock.patch.object(FrameDetection.objects, "bulk_create", side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError):
+                timeseries.store_series(result, [[2, 0, 0, 0]] * 5, 30, 30.0, self.start)
+        self.assertEqual(result.frames.count(), 3)
+
+    def test_cached_result_includes_series(self):
+        content = b"clip with series"
+        first = self.make_video(content=content)
+        values = make_result_values(series=[[1, 0, 0, 0], [2, 0, 1, 0]], sample_rate=30, fps=30.0)
+        result_cache.store(result_cache.get_video_hash(first), values)
+
+        second = self.make_video(content=content)
+        result = apply_cached_result(second)
+        self.assertEqual(list(result.frames.values_list("total", flat=True)), [1, 3])
+
+
+class SyntheticVideoMixin:
+    """Write small synthetic videos into a temporary directory."""
+
+    def setUp(self):
+        super().setUp()
+        self.video_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.video_dir, ignore_errors=True)
+        super().tearDown()
+
+    def make_video_file(self, name="clip.mp4", fourcc="mp4v", seconds=3, **kwargs):
+        path = os.path.join(self.video_dir, name)
+        write_synthetic_video(path, width=160, height=120, seconds=seconds, fourcc=fourcc, **kwargs)
+        return path
+
+
+class FrameSamplerTests(SyntheticVideoMixin, SimpleTestCase):
+    def sample(self, path, sample_rate, strategy):
+        cap = cv2.VideoCapture(path)
+        try:
+            return list(frame_sampler.iter_sampled_frames(cap, sample_rate, strategy))
+        finally:
+            cap.release()
+
+    def test_strategies_return_identical_frames(self):
+        for name, fourcc in [("clip.mp4", "mp4v"), ("clip.avi", "MJPG")]:
+            path = self.make_video_file(name, fourcc)
+            expected = self.sample(path, 7, frame_sampler.STRATEGY_READ)
+            self.assertEqual([i for i, _ in expected], list(range(0, 90, 7)))
+
+            for strategy in (frame_sampler.STRATEGY_GRAB, frame_sampler.STRATEGY_SEEK):
+                got = self.sample(path, 7, strategy)
+                self.assertEqual([i for i, _ in got], [i for i, _ in expected], strategy)
+                for (_, a), (_, b) in zip(expected, got):
+                    self.assertTrue(np.array_equal(a, b), f"{fourcc} {strategy}")
+
+    def test_choose_strategy(self):
+        mp4 = self.make_video_file("clip.mp4", "mp4v")
+        mjpg = self.make_video_file("clip.avi", "MJPG")
+
+        def choose(path, rate):
+            cap = cv2.VideoCapture(path)
+            try:
+                return frame_sampler.choose_strategy(path, cap, rate)
+            finally:
+                cap.release()
+
+        self.assertEqual(choose(mp4, 1), frame_sampler.STRATEGY_READ)
+        self.assertEqual(choose(mp4, 30), frame_sampler.STRATEGY_GRAB)
+        self.assertEqual(choose(mp4, 300), frame_sampler.STRATEGY_SEEK)
+        self.assertEqual(choose(mjpg, 30), frame_sampler.STRATEGY_SEEK)
+
+
+class PipelineTests(SimpleTestCase):
+    def test_results_arrive_in_frame_order(self):
+        def detector(frames):
+            # Later batches finish first when several workers run
+            time.sleep(0.01 * (3 - frames[0] % 3))
+            return [{"car": f} for f in frames]
+
+        seen = []
+        stats = PipelineStats()
+        run_pipeline(range(50), detector, seen.append, batch_size=4, workers=3, queue_size=2, stats=stats)
+
+        self.assertEqual([c["car"] for c in seen], list(range(50)))
+        report = stats.as_dict()["stages"]
+        self.assertEqual(report["decode"]["items"], 50)
+        self.assertEqual(report["inference"]["items"], 50)
+        self.assertEqual(report["inference"]["batches"], 13)
+        self.assertLessEqual(report["inference"]["max_queue_depth"], 2)
+
+    def test_merge_keeps_queue_depths(self):
+        segments = []
+        for depths in ([1, 3], [2, 2, 2]):
+            stats = PipelineStats()
+            inference = stats.stage("inference", queue.Queue())
+            for depth in depths:
+                inference.queue.queue.extend([None] * (depth - inference.queue.qsize()))
+                inference.record(1, 0.01)
+            segments.append(stats.as_dict(durations=True))
+
+        merged = PipelineStats()
+        for summary in segments:
+            merged.merge(summary)
+        inference = merged.as_dict()["stages"]["inference"]
+        self.assertEqual(inference["max_queue_depth"], 3)
+        self.assertEqual(inference["avg_queue_depth"], 2.0)
+        self.assertEqual(merged.stages["inference"].max_queue_depth, 3)
+
+    def test_stage_errors_propagate(self):
+        def detector(frames):
+            raise RuntimeError("inference failed")
+
+        with self.assertRaisesMessage(RuntimeError, "inference failed"):
+            run_pipeline(range(100), detector, lambda c: None, batch_size=2, queue_size=1)
+
+
+class ParallelAnalysisTests(SyntheticVideoMixin, SimpleTestCase):
+    def test_plan_segments_align_to_sample_rate(self):
+        ranges = plan_segments(1000, 30, 4)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertIsNone(ranges[-1][1])
+        for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(next_start % 30, 0)
+        self.assertEqual(plan_segments(50, 30, 8), [(0, 30), (30, None)])
+        self.assertEqual(plan_segments(0, 30, 4), [])
+
+    def test_parallel_matches_serial(self):
+        path = self.make_video_file(seconds=6, vehicles=5)
+
+        cap = cv2.VideoCapture(path)
+        frames = [f for _, f in frame_sampler.iter_sampled_frames(cap, 7, frame_sampler.STRATEGY_READ)]
+        cap.release()
+        expected = stub_detector(frames)
+
+        for strategy in (frame_sampler.STRATEGY_GRAB, frame_sampler.STRATEGY_SEEK):
+            total, sampled, detections, breakdown = extract_and_sample_frames_parallel(
+                path, sample_rate=7, detector=stub_detector, strategy=strategy, processes=2, segments=3,
+            )
+            self.assertEqual(total, 180)
+            self.assertEqual(sampled, len(expected))
+            self.assertEqual(detections, expected)
+            self.assertEqual(breakdown["cars"], sum(d["car"] for d in expected))
+
+    def test_parallel_reads_past_frame_count(self):
+        path = self.make_video_file(seconds=2, vehicles=2)
+        cap = cv2.VideoCapture(path)
+        expected = stub_detector([f for _, f in frame_sampler.iter_sampled_frames(cap, 5, frame_sampler.STRATEGY_READ)])
+        cap.release()
+
+        real_capture = cv2.VideoCapture
+
+        class Capture:
+            """Reports a wrong frame count, like some containers."""
+            def __init__(self, *args):
+                self.cap = real_capture(*args)
+
+            def __getattr__(self, name):
+                return getattr(self.cap, name)
+
+            def get(self, prop):
+                return self.reported if prop == cv2.CAP_PROP_FRAME_COUNT else self.cap.get(prop)
+
+        for reported in (0, 20):
+            Capture.reported = reported
+            with self.subTest(frame_count=reported), mock.patch("cv2.VideoCapture", Capture):
+                _, _, detections, _ = extract_and_sample_frames_parallel(
+                    path, sample_rate=5, detector=stub_detector, strategy=frame_sampler.STRATEGY_GRAB,
+                    processes=2, segments=2,
+                )
+            self.assertEqual(detections, expected)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        model_registry.clear()
+        self.addCleanup(model_registry.clear)
+
+    def test_importing_app_loads_no_model(self):
+        from .processing import detect_vehicles, yolo_detect  # noqa: F401
+        from . import services, views  # noqa: F401
+
+        self.assertEqual(model_registry.loaded_models(), [])
+
+    def test_models_load_once_and_are_shared(self):
+        loads = []
+        fake = types.SimpleNamespace(YOLO=lambda name: loads.append(name) or object())
+
+        with mock.patch.dict(sys.modules, {"ultralytics": fake}):
+            first = model_registry.get_model("a.pt")
+            self.assertIs(model_registry.get_model("a.pt"), first)
+            model_registry.get_model("b.pt")
+
+        self.assertEqual(loads, ["a.pt", "b.pt"])
+        self.assertEqual(model_registry.loaded_models(), ["a.pt", "b.pt"])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class StreamIngestTests(SyntheticVideoMixin, TestCase):
+    def test_rolling_window_expires_old_samples(self):
+        window = RollingWindow(seconds=10)
+        window.add({"car": 30}, timestamp=100)
+        window.add({"car": 2, "bus": 1}, timestamp=105)
+        window.add({"car": 4, "bus": 1}, timestamp=112)
+
+        self.assertEqual(len(window.samples), 2)
+        window.expire(now=112)
+        self.assertEqual([c["car"] for _, c in window.samples], [2, 4])
+
+    def test_looping_file_writes_snapshots(self):
+        # 1 second at 30 FPS, sampled every 5th frame: 6 frames per pass
+        path = self.make_video_file(seconds=1, vehicles=3)
+        camera = Camera.objects.create(name="cam-1", stream_url=path)
+
+        window = run_camera(
+            camera, detector=stub_detector, sample_rate=5, loop=True, realtime=False,
+            max_frames=20, snapshot_interval=0, window_seconds=3600,
+        )
+
+        self.assertGreaterEqual(len(window.samples), 20)
+        snapshots = camera.snapshots.order_by("taken_at", "id")
+        self.assertGreaterEqual(snapshots.count(), 20)
+        last = snapshots.last()
+        self.assertEqual(last.sampled_frames, len(window.samples))
+        self.assertGreater(last.avg_cars, 0)
+        self.assertEqual(last.congestion, "LOW")
+
+    def test_roi_and_lanes_apply_to_live_counts(self):
+        path = self.make_video_file(seconds=1, vehicles=3)
+        # Upper-left triangle: the frame's bounding box, so only place() can drop a box
+        camera = Camera.objects.create(name="cam-1", stream_url=path, roi=[[0, 0], [1, 0], [0, 1]])
+        Lane.objects.create(camera=camera, name="north", polygon=TOP_HALF)
+
+        def detector(frames):
+            boxes = []
+            for frame in frames:
+                h, w = frame.shape[:2]
+                boxes.append([{"type": "car", "bbox": [w * 0.1, h * 0.1, w * 0.2, h * 0.2], "conf": 1.0},
+                              {"type": "car", "bbox": [w * 0.8, h * 0.8, w * 0.9, h * 0.9], "conf": 1.0}])
+            return boxes
+
+        with mock.patch("traffic_app.streaming.publish_snapshot") as publish:
+            run_camera(camera, detector=detector, sample_rate=5, realtime=False, snapshot_interval=3600)
+        snapshot = camera.snapshots.get()
+        self.assertEqual(snapshot.avg_cars, 1.0)
+        lanes = publish.call_args.args[1]
+        self.assertEqual(lanes["north"]["avg_vehicles_per_frame"], 1.0)
+        self.assertIn("green_share", lanes["north"])
+
+
+class MotionGateTests(SimpleTestCase):
+    def counting_detector(self):
+        calls = []
+
+        def detector(frames):
+            calls.append(len(frames))
+            return [{"car": int(f.mean()), "bike": 0, "bus": 0, "truck": 0} for f in frames]
+        return detector, calls
+
+    def test_static_scene_skips_until_max_interval(self):
+        detector, calls = self.counting_detector()
+        gated = GatedDetector(detector, MotionGate(max_interval=5))
+        frames = [np.full((90, 160, 3), 50, dtype=np.uint8) for _ in range(13)]
+
+        counts = gated(frames[:7]) + gated(frames[7:])
+        self.assertEqual(gated.counters(), {"inferred_frames": 3, "skipped_frames": 10})
+        self.assertEqual(sum(calls), 3)
+        # Skipped frames carry the last inferred counts forward
+        self.assertEqual([c["car"] for c in counts], [50] * 13)
+
+    def test_scene_change_triggers_inference(self):
+        detector, _ = self.counting_detector()
+        gated = GatedDetector(detector, MotionGate(max_interval=100, count_delta=0))
+        dark = np.full((90, 160, 3), 20, dtype=np.uint8)
+        bright = np.full((90, 160, 3), 200, dtype=np.uint8)
+
+        counts = gated([dark, dark, bright, bright, dark])
+        self.assertEqual(gated.counters(), {"inferred_frames": 3, "skipped_frames": 2})
+        self.assertEqual([c["car"] for c in counts], [20, 20, 200, 200, 20])
+
+
+class BoxPostProcessingTests(SimpleTestCase):
+    def test_counts_vehicle_classes_above_threshold(self):
+        # car, bicycle, motorcycle, bus, truck, person (not a vehicle), car below threshold
+        cls = np.array([2, 1, 3, 5, 7, 0, 2])
+        conf = np.array([0.9, 0.5, 0.35, 0.8, 0.31, 0.99, 0.2], dtype=np.float32)
+
+        counts = count_vehicle_arrays(cls, conf, vehicle_conf=0.3)
+        self.assertEqual(counts, {"car": 1, "bike": 2, "bus": 1, "truck": 1})
+
+    def test_class_conf_overrides_per_type(self):
+        cls = np.array([2, 1, 3, 7])
+        conf = np.array([0.35, 0.5, 0.35, 0.35], dtype=np.float32)
+
+        counts = count_vehicle_arrays(cls, conf, vehicle_conf=0.3, class_conf={"bike": 0.4, "car": 0.2})
+        self.assertEqual(counts, {"car": 1, "bike": 1, "bus": 0, "truck": 1})
+
+    def test_unknown_and_empty_classes(self):
+        mask, _ = vehicle_mask(np.array([79, 2]), np.array([0.9, 0.9], dtype=np.float32))
+        self.assertEqual(mask.tolist(), [False, True])
+        self.assertEqual(
+            count_vehicle_arrays(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)),
+            {"car": 0, "bike": 0, "bus": 0, "truck": 0},
+        )
+
+    def test_batches_keep_frame_order_and_fail_alone(self):
+        class FakeBackend:
+            """Frame i (filled with i) has i + 1 cars; a batch holding frame 4 fails."""
+            batches = []
+
+            def predict(self, frames, conf):
+                ids = [int(frame[0, 0, 0]) for frame in frames]
+                self.batches.append(ids)
+                if 4 in ids:
+                    raise RuntimeError("CUDA out of memory")
+                return [(np.full(i + 1, 2), np.full(i + 1, 0.9, dtype=np.float32), np.zeros((i + 1, 4)))
+                        for i in ids]
+
+        backend = FakeBackend()
+        frames = [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(7)]
+        with mock.patch("traffic_app.processing.yolo_detect.get_backend", return_value=backend), \
+                mock.patch("sys.stdout", new_callable=io.StringIO):
+            counts = detect_vehicles_in_frames(frames, batch_size=3)
+
+        self.assertEqual(backend.batches, [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual([c["car"] for c in counts], [1, 2, 3, 0, 0, 0, 7])
+        self.assertEqual(counts[4], {"car": 0, "bike": 0, "bus": 0, "truck": 0})
+
+
+def write_crossing_video(path):
+    """40 frames, 160x120: one car driving right at y=20, one left at y=80."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (160, 120))
+    for t in range(40):
+        frame = np.full((120, 160, 3), 90, dtype=np.uint8)
+        cv2.rectangle(frame, (10 + 3 * t, 20), (26 + 3 * t, 32), (0, 0, 255), -1)
+        cv2.rectangle(frame, (134 - 3 * t, 80), (150 - 3 * t, 92), (255, 0, 0), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def car_box(x, y=40, w=16, h=12, vehicle_type="car"):
+    return {"type": vehicle_type, "bbox": [x, y, x + w, y + h], "conf": 0.9}
+
+
+class TrackerTests(SyntheticVideoMixin, SimpleTestCase):
+    def test_vehicle_in_view_counted_once(self):
+        tracker = VehicleTracker()
+        for step in range(10):
+            tracker.update([car_box(10 + 12 * step), car_box(100, y=80, vehicle_type="truck")])
+        self.assertEqual(tracker.unique_counts(), {"car": 1, "bike": 0, "bus": 0, "truck": 1})
+
+    def test_fast_vehicle_followed_by_prediction(self):
+        # Moves more than its own width per sample: no IoU overlap at all
+        tracker = VehicleTracker(max_distance=2.0)
+        for step in range(8):
+            tracker.update([car_box(25 * step)])
+        self.assertEqual(len(tracker.tracks), 1)
+        self.assertEqual(tracker.tracks[0].hits, 8)
+
+    def test_lost_tracks_expire_and_new_vehicles_count(self):
+        tracker = VehicleTracker(max_age=2)
+        tracker.update([car_box(10)])
+        for _ in range(3):
+            tracker.update([])
+        self.assertEqual(tracker.tracks, [])
+        tracker.update([car_box(120, y=90)])
+        self.assertEqual(tracker.unique_counts()["car"], 2)
+
+    def test_min_hits_ignores_flicker(self):
+        tracker = VehicleTracker(min_hits=2)
+        tracker.update([car_box(10), car_box(100, y=90)])
+        tracker.update([car_box(12)])
+        self.assertEqual(tracker.unique_counts()["car"], 1)
+
+    def test_line_crossings_by_direction(self):
+        tracker = VehicleTracker(line=((80, 0), (80, 120)))
+        for step in range(10):
+            tracker.update([car_box(10 + 12 * step), car_box(140 - 12 * step, y=80)])
+        self.assertEqual(tracker.crossings["car"], 2)
+        self.assertEqual(tracker.crossings_by_direction, {"positive": 1, "negative": 1})
+
+    def test_merge_adds_segment_counts(self):
+        tracker = VehicleTracker()
+        segment = tracker.spawn()
+        segment.update([car_box(10), car_box(100)])
+        tracker.merge(segment.summary())
+        self.assertEqual(tracker.unique_counts()["car"], 2)
+        self.assertEqual(tracker.frames, 1)
+
+    def test_extract_counts_unique_vehicles(self):
+        path = write_crossing_video(os.path.join(self.video_dir, "crossing.mp4"))
+
+        # min_hits=2 drops one-frame compression artefacts
+        tracker = VehicleTracker(min_hits=2, line=((80, 0), (80, 120)))
+        _, sampled, detections, breakdown = extract_and_sample_frames(
+            path, sample_rate=3, detector=stub_box_detector, tracker=tracker,
+        )
+        self.assertGreaterEqual(sum(d["car"] for d in detections), 2 * sampled)
+        self.assertEqual(breakdown, {"cars": 2, "bikes": 0, "trucks": 0, "buses": 0})
+        self.assertEqual(tracker.crossings_by_direction, {"positive": 1, "negative": 1})
+
+
+TOP_HALF = [[0, 0], [1, 0], [1, 0.5], [0, 0.5]]
+BOTTOM_HALF = [[0, 0.5], [1, 0.5], [1, 1], [0, 1]]
+
+
+class RoadLayoutTests(SyntheticVideoMixin, SimpleTestCase):
+    def test_points_in_polygon(self):
+        triangle = [[0, 0], [10, 0], [0, 10]]
+        inside = points_in_polygon([[1, 1], [6, 6], [-1, 2], [4, 5]], triangle)
+        self.assertEqual(inside.tolist(), [True, False, False, True])
+
+    def test_place_maps_crop_back_and_assigns_lanes(self):
+        layout = RoadLayout(roi=[[0.5, 0], [1, 0], [1, 1], [0.5, 1]], lanes=[
+            {"name": "north", "polygon": TOP_HALF},
+            {"name": "south", "polygon": BOTTOM_HALF},
+        ])
+        frame_layout = layout.resolve(200, 100)
+        self.assertEqual(frame_layout.rect, (100, 0, 200, 100))
+        self.assertEqual(frame_layout.crop(np.zeros((100, 200, 3))).shape, (100, 100, 3))
+
+        boxes = frame_layout.place([
+            car_box(10, y=10), car_box(10, y=70),
+            # Left of the ROI once mapped back to the full frame
+            car_box(-90, y=10),
+        ])
+        self.assertEqual([b["bbox"][0] for b in boxes], [110, 110])
+        self.assertEqual([b["lane"] for b in boxes], ["north", "south"])
+
+    def test_lane_density_and_timing(self):
+        layout = RoadLayout(lanes=[
+            {"name": "north", "polygon": TOP_HALF, "capacity": 4},
+            {"name": "south", "polygon": BOTTOM_HALF, "capacity": 4},
+        ])
+        lanes = LaneCounter(layout)
+        frame_layout = layout.resolve(160, 120)
+        for _ in range(4):
+            lanes.add(frame_layout.place([car_box(10, y=5), car_box(40, y=5), car_box(70, y=5), car_box(10, y=80)]))
+
+        stats = lanes.summary()
+        self.assertEqual(stats["north"]["avg_vehicles_per_frame"], 3.0)
+        self.assertEqual(stats["north"]["density_score"], 0.75)
+        self.assertEqual(stats["south"]["density_score"], 0.25)
+
+        timing = optimize_lane_timing(stats)
+        self.assertEqual(timing["north"]["green_extension"], 20.0)
+        self.assertEqual(timing["south"]["green_extension"], 0.0)
+        self.assertEqual(timing["north"]["green_share"], 0.75)
+
+    def test_extract_crops_to_roi(self):
+        path = write_crossing_video(os.path.join(self.video_dir, "crossing.mp4"))
+        shapes = []
+
+        def detector(frames):
+            shapes.extend(f.shape[:2] for f in frames)
+            return stub_box_detector(frames)
+
+        # ROI: top 60% of the frame, so only the car at y=20 is analysed
+        layout = RoadLayout(roi=[[0, 0], [1, 0], [1, 0.6], [0, 0.6]], lanes=[{"name": "north", "polygon": TOP_HALF}])
+        lanes = LaneCounter(layout)
+        _, sampled, detections, _ = extract_and_sample_frames(
+            path, sample_rate=3, detector=detector, layout=layout, lanes=lanes,
+        )
+        self.assertEqual(set(shapes), {(72, 160)})
+        # The car at y=80 would add another `sampled` boxes
+        self.assertLessEqual(sum(d["car"] for d in detections), sampled + 1)
+        self.assertEqual(lanes.totals["north"]["car"], sum(d["car"] for d in detections))
+        self.assertGreaterEqual(lanes.totals["north"]["car"], sampled - 1)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CameraLayoutTests(MediaRootMixin, TestCase):
+    def test_camera_layout_is_part_of_cache_key(self):
+        camera = Camera.objects.create(name="junction", roi=[[0, 0], [1, 0], [1, 1]])
+        Lane.objects.create(camera=camera, name="south", polygon=BOTTOM_HALF, position=1)
+        Lane.objects.create(camera=camera, name="north", polygon=TOP_HALF, position=0)
+
+        layout = camera_layout(camera)
+        self.assertEqual([lane["name"] for lane in layout.lanes], ["north", "south"])
+        self.assertIsNone(camera_layout(Camera.objects.create(name="plain")))
+
+        video = self.make_video()
+        plain = video_params(video)
+        video.camera = camera
+        self.assertNotEqual(
+            result_cache.cache_key("abc", plain), result_cache.cache_key("abc", video_params(video)),
+        )
+
+    @override_settings(TRACKING_ENABLED=False)
+    def test_roi_without_tracking(self):
+        handle, path = tempfile.mkstemp(suffix=".mp4")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        write_synthetic_video(path, width=160, height=120, seconds=2, vehicles=3, seed=2)
+        with open(path, "rb") as f:
+            video = self.make_video(content=f.read())
+        video.camera = Camera.objects.create(name="junction", roi=BOTTOM_HALF)
+        video.save()
+
+        def detector(batch_size=None, boxes=False):
+            return stub_box_detector if boxes else stub_detector
+
+        with mock.patch("traffic_app.services.build_detector", side_effect=detector), \
+                mock.patch("traffic_app.services.send_n8n_alert"):
+            result = analyze_video(video)
+        self.assertGreater(result.sampled_frames, 0)
+
+
+@override_settings(TRACKING_ENABLED=False, ANALYSIS_ADAPTIVE=True, ANALYSIS_PROFILER="", CACHES=LOCAL_CACHES)
+class ProfilingTests(MediaRootMixin, TestCase):
+    def make_clip(self):
+        handle, path = tempfile.mkstemp(suffix=".mp4")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        write_synthetic_video(path, width=160, height=120, seconds=3, vehicles=3, seed=2)
+        with open(path, "rb") as f:
+            return self.make_video(content=f.read())
+
+    def analyze(self, video):
+        with mock.patch("traffic_app.services.build_detector", return_value=stub_detector), \
+                mock.patch("traffic_app.services.send_n8n_alert"), \
+                self.assertLogs("traffic_app.profiling") as logs:
+            result = analyze_video(video)
+        return result, logs.records
+
+    def test_result_stores_stage_timings(self):
+        result, records = self.analyze(self.make_clip())
+        result.refresh_from_db()
+        stages = result.profile["stages"]
+
+        self.assertEqual(
+            list(stages), ["detection", "decode", "inference", "aggregate", "summarize", "db_write", "cache_store"],
+        )
+        self.assertEqual(stages["detection"]["frames"], result.sampled_frames)
+        self.assertEqual(stages["decode"]["frames"], result.sampled_frames)
+        inference = stages["inference"]
+        self.assertEqual(inference["frames"], result.sampled_frames)
+        self.assertGreaterEqual(inference["inference_calls"], 1)
+        self.assertGreater(inference["skipped"], 0)
+        self.assertGreaterEqual(result.profile["total_seconds"], stages["detection"]["seconds"])
+        self.assertIsNone(result.profile["dump"])
+
+        # One structured record, rendered as JSON by the profile log handler
+        line = json.loads(JsonFormatter().format(records[0]))
+        self.assertEqual(line["video_id"], result.video_id)
+        self.assertEqual(line["profile"]["stages"]["decode"]["frames"], result.sampled_frames)
+
+    def test_cprofile_dump_covers_pipeline_threads(self):
+        dump_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dump_dir, True)
+        with override_settings(ANALYSIS_PROFILER="cprofile", ANALYSIS_PROFILE_DIR=dump_dir):
+            result, _ = self.analyze(self.make_clip())
+
+        path = result.profile["dump"]
+        self.assertTrue(path.startswith(dump_dir))
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        # Runs in the inference thread, not the one that started the profiler
+        self.assertIn("stub_detector", functions)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class DashboardTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.camera = Camera.objects.create(name="North Gate")
+        self.now = timezone.now()
+
+    def make_result(self, congestion="LOW", camera=None, age=timedelta(0), **counts):
+        video = VideoUpload.objects.create(title=f"clip {congestion}", video_file="uploads/clip.mp4", camera=camera)
+        result = ProcessingResult.objects.create(video=video, congestion=congestion, **counts)
+        ProcessingResult.objects.filter(pk=result.pk).update(processed_at=self.now - age)
+        return result
+
+    def test_aggregates(self):
+        self.make_result("HIGH", self.camera, count_cars=6, count_buses=2)
+        self.make_result("LOW", self.camera, timedelta(days=3), count_cars=2)
+        self.make_result("MEDIUM", count_bikes=10)
+        self.make_result("HIGH", self.camera, timedelta(days=40), count_cars=100)
+
+        summary = dashboard.summary(30)
+        self.assertEqual((summary["results"], summary["low"], summary["medium"], summary["high"]), (3, 1, 1, 1))
+        self.assertEqual({item["kind"]: item["percent"] for item in summary["mix"]},
+                         {"cars": 40.0, "bikes": 50.0, "trucks": 0, "buses": 10.0})
+
+        locations = {row["location"]: row for row in dashboard.by_location(30)}
+        self.assertEqual(locations["North Gate"]["results"], 2)
+        self.assertEqual(locations["North Gate"]["high"], 1)
+        self.assertEqual(locations[None]["medium"], 1)
+
+        over_time = dashboard.congestion_over_time(30)
+        self.assertEqual(sum(row["results"] for row in over_time), 3)
+        self.assertEqual(sum(row["uploads"] for row in over_time), 4)
+
+    def test_keyset_pages_cover_every_result_once(self):
+        ages = [0, 0, 1, 1, 1, 2, 5]
+        results = [self.make_result(age=timedelta(hours=age)) for age in ages]
+        # Newest first, ties by id
+        expected = [r.pk for age, r in sorted(zip(ages, results), key=lambda pair: (pair[0], -pair[1].pk))]
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = dashboard.results_page(cursor, page_size=2)
+            seen.extend(row["id"] for row in rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(dashboard.results_page("not-a-cursor", page_size=2)[0][0]["id"], expected[0])
+
+    def test_page_is_cached_until_a_result_is_saved(self):
+        self.make_result("HIGH", self.camera)
+        url = reverse("traffic_app:dashboard")
+        self.assertEqual(self.client.get(url).context["summary"]["results"], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).context["summary"]["results"], 1)
+
+        result = self.make_result("LOW")
+        response = self.client.get(url)
+        self.assertEqual(response.context["summary"]["results"], 2)
+        self.assertContains(response, reverse("traffic_app:results", args=[result.video_id]))
+
+        result.delete()
+        self.assertEqual(self.client.get(url).context["summary"]["results"], 1)
+
+
+class QuietFileHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ApiTests(MediaRootMixin, TestCase):
+    def make_result(self, congestion="LOW", camera=None):
+        video = self.make_video(f"clip {congestion}")
+        video.camera = camera
+        video.save()
+        return ProcessingResult.objects.create(video=video, congestion=congestion, total_vehicles=7)
+
+    def test_bulk_file_submission(self):
+        camera = Camera.objects.create(name="East")
+        response = self.client.post(reverse("traffic_app:api_videos"), {
+            "video_file": [SimpleUploadedFile("a.mp4", b"first clip"), SimpleUploadedFile("b.mp4", b"second clip")],
+            "camera": camera.pk,
+        })
+        self.assertEqual(response.status_code, 202)
+        videos = response.json()["videos"]
+        self.assertEqual([v["status"] for v in videos], [AnalysisJob.STATUS_PENDING] * 2)
+        self.assertEqual(AnalysisJob.objects.filter(video__camera=camera).count(), 2)
+
+    def serve(self, directory):
+        """Base URL of a local HTTP server for directory."""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietFileHandler, directory=directory))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def test_json_submission_by_path_and_url(self):
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        with open(os.path.join(source, "north.mp4"), "wb") as f:
+            f.write(b"north clip")
+        base = self.serve(source)
+
+        videos = [
+            {"path": os.path.join(source, "north.mp4"), "title": "North"},
+            {"url": f"{base}/north.mp4"},
+            {"path": __file__},
+            {"title": "nothing"},
+        ]
+        with override_settings(API_IMPORT_DIRS=[source], API_SUBMIT_URLS=True, API_URL_HOSTS=["127.0.0.1"]):
+            response = self.client.post(reverse("traffic_app:api_videos"), json.dumps({"videos": videos}),
+                                        content_type="application/json")
+            self.assertEqual(response.status_code, 202)
+            data = response.json()["videos"]
+            self.assertEqual([("error" in item) for item in data], [False, False, True, True])
+            self.assertEqual([item["status"] for item in data[:2]], [AnalysisJob.STATUS_PENDING] * 2)
+            # Neither copied, hashed nor downloaded during the request
+            by_path, by_url = (VideoUpload.objects.get(pk=item["video_id"]) for item in data[:2])
+            self.assertEqual(by_path.source_path, os.path.realpath(os.path.join(source, "north.mp4")))
+            self.assertFalse(by_path.video_file)
+            self.assertEqual(by_path.content_hash, "")
+            self.assertFalse(by_url.video_file)
+            self.assertEqual(run_worker(once=True, analyze=lambda video: None), 2)
+
+        by_path.refresh_from_db()
+        self.assertEqual(by_path.content_hash, result_cache.hash_file(by_path.source_path))
+        # Only the downloaded copy
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, "uploads"))), 1)
+        for video in (by_path, VideoUpload.objects.get(pk=by_url.pk)):
+            with open(video.file_path, "rb") as f:
+                self.assertEqual(f.read(), b"north clip")
+
+    def test_url_submission_is_restricted(self):
+        url = reverse("traffic_app:api_videos")
+
+        def submit(video_url):
+            response = self.client.post(url, json.dumps({"videos": [{"url": video_url}]}),
+                                        content_type="application/json")
+            return response.json()["videos"][0].get("error", "")
+
+        self.assertIn("disabled", submit("http://example.com/a.mp4"))
+        with override_settings(API_SUBMIT_URLS=True, API_URL_HOSTS=[]):
+            self.assertIn("not a public address", submit("http://127.0.0.1/a.mp4"))
+            self.assertIn("not a public address", submit("http://169.254.169.254/latest/meta-data/"))
+            self.assertIn("http or https", submit("file:///etc/passwd"))
+        with override_settings(API_SUBMIT_URLS=True, API_URL_HOSTS=["cdn.example.com"]):
+            self.assertIn("not allowed", submit("http://evil.example.com/a.mp4"))
+        self.assertFalse(VideoUpload.objects.exists())
+
+    def test_redirects_are_checked(self):
+        redirect = mock.Mock(is_redirect=True, headers={"Location": "http://10.0.0.1/moved.mp4"})
+        redirect.__enter__ = mock.Mock(return_value=redirect)
+        redirect.__exit__ = mock.Mock(return_value=False)
+        with override_settings(API_SUBMIT_URLS=True, API_URL_HOSTS=[]), \
+                mock.patch("traffic_app.downloads._public", side_effect=lambda host: host == "example.com"), \
+                mock.patch("traffic_app.downloads.requests.get", return_value=redirect):
+            with self.assertRaisesMessage(downloads.DownloadError, "10.0.0.1 is not a public address"):
+                downloads.download("http://example.com/a.mp4")
+
+    def test_bulk_job_status_in_one_query(self):
+        jobs = [enqueue_analysis(self.make_video()) for _ in range(3)]
+        done = jobs[0]
+        done.status = AnalysisJob.STATUS_DONE
+        done.save()
+        ProcessingResult.objects.create(video=done.video, congestion="HIGH")
+
+        ids = ",".join(str(job.pk) for job in jobs) + ",9999"
+        with self.assertNumQueries(1):
+            data = self.client.get(reverse("traffic_app:api_jobs"), {"ids": ids}).json()
+        self.assertEqual([job["id"] for job in data["jobs"]], [job.pk for job in jobs])
+        self.assertEqual(data["jobs"][0]["result"]["congestion"], "HIGH")
+        self.assertIsNone(data["jobs"][1]["result"])
+        self.assertEqual(data["missing"], [9999])
+
+    def test_results_pages_with_selected_fields(self):
+        camera = Camera.objects.create(name="West")
+        results = [self.make_result("HIGH" if i % 2 else "LOW", camera) for i in range(5)]
+        url = reverse("traffic_app:api_results")
+
+        seen, cursor = [], None
+        while True:
+            params = {"fields": "video_id,camera,congestion", "limit": 2, **({"after": cursor} if cursor else {})}
+            with self.assertNumQueries(1):
+                data = self.client.get(url, params).json()
+            seen.extend(data["results"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual([r["video_id"] for r in seen], [r.video_id for r in reversed(results)])
+        self.assertEqual(set(seen[0]), {"video_id", "camera", "congestion", "results_url"})
+        self.assertEqual(seen[0]["camera"], "West")
+
+        high = self.client.get(url, {"congestion": "high"}).json()["results"]
+        self.assertEqual(len(high), 2)
+        self.assertEqual(self.client.get(url, {"fields": "secret"}).status_code, 400)
+
+    def test_every_field_alone(self):
+        result = self.make_result(camera=Camera.objects.create(name="North"))
+        self.make_result("HIGH")
+        for name in api.RESULT_API_FIELDS:
+            with self.subTest(field=name), self.assertNumQueries(1):
+                data = self.client.get(reverse("traffic_app:api_results"), {"fields": name}).json()
+                self.assertEqual([set(r) for r in data["results"]], [{name, "results_url"}] * 2)
+            response = self.client.get(reverse("traffic_app:api_result", args=[result.video_id]), {"fields": name})
+            self.assertEqual(response.status_code, 200, name)
+        self.assertEqual(self.client.get(reverse("traffic_app:api_results"), {"fields": "camera"}).json()
+                         ["results"][1]["camera"], "North")
+
+    def test_conditional_get(self):
+        result = self.make_result()
+        url = reverse("traffic_app:api_result", args=[result.video_id])
+        response = self.client.get(url)
+        self.assertEqual(response.json()["congestion"], "LOW")
+        etag = response["ETag"]
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        result.congestion = "HIGH"
+        result.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ArchiveImportTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        os.makedirs(os.path.join(self.root, "2024", "june"))
+        self.files = [os.path.join(self.root, "a.mp4"), os.path.join(self.root, "2024", "june", "b.MKV")]
+        for i, path in enumerate(self.files):
+            with open(path, "wb") as f:
+                f.write(b"recording %d" % i)
+        open(os.path.join(self.root, "notes.txt"), "w").close()
+
+        self.analysed = []
+        patcher = mock.patch.object(archive, "analyze_video", self.fake_analyze)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_analyze(self, video):
+        self.analysed.append(video.file_path)
+        video.processed = True
+        video.save()
+        return ProcessingResult.objects.update_or_create(video=video)[0]
+
+    def run_import(self, **options):
+        out = io.StringIO()
+        call_command("import_archive", self.root, workers=0, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_is_incremental(self):
+        output = self.run_import()
+        self.assertIn("2 new, 0 changed, 0 requeued, 0 skipped", output)
+        self.assertIn("2/2 files (0 failed)", output)
+        self.assertEqual(sorted(self.analysed), sorted(self.files))
+        video = VideoUpload.objects.get(source_path=self.files[1])
+        self.assertEqual((video.title, video.video_file.name), (os.path.join("2024", "june", "b.MKV"), ""))
+
+        self.assertIn("0 new, 0 changed, 0 requeued, 2 skipped", self.run_import())
+        self.assertEqual(len(self.analysed), 2)
+
+        with open(self.files[0], "ab") as f:
+            f.write(b" and more")
+        self.assertIn("0 new, 1 changed, 0 requeued, 1 skipped", self.run_import())
+        self.assertEqual(self.analysed[2:], [self.files[0]])
+
+    def test_resume_requeues_jobs_of_dead_workers(self):
+        self.run_import(no_analyze=True)
+        dead = subprocess.Popen([sys.executable, "-c", "pass"])
+        dead.wait()
+        crashed, running = AnalysisJob.objects.order_by("id")
+        AnalysisJob.objects.filter(pk=crashed.pk).update(
+            status=AnalysisJob.STATUS_RUNNING, worker=f"{socket.gethostname()}:{dead.pid}")
+        AnalysisJob.objects.filter(pk=running.pk).update(
+            status=AnalysisJob.STATUS_RUNNING, worker=f"{socket.gethostname()}:{os.getpid()}")
+
+        self.assertEqual(archive.requeue_orphaned_jobs(self.root), 1)
+        state = archive.progress(self.root)
+        self.assertEqual(state["remaining"]["files"], 2)
+        self.run_import()
+        self.assertEqual(self.analysed, [self.files[0]])
+
+    def test_progress_line(self):
+        start = {"done": {"files": 1, "bytes": 100}, "failed": {"files": 0, "bytes": 0},
+                 "remaining": {"files": 9, "bytes": 900}}
+        current = {"done": {"files": 4, "bytes": 400}, "failed": {"files": 1, "bytes": 100},
+                   "remaining": {"files": 5, "bytes": 500}}
+        self.assertEqual(archive.format_progress(start, current, 10.0),
+                         "5/10 files (1 failed) | 0.40 files/s, 0.0 MB/s | ETA 0:00:12")
+
+
+def train_inverted_model(path):
+    """A model that contradicts the rules: busy series are LOW, empty ones HIGH."""
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+
+    X = [[mean, 1.0, mean, hour] for mean in (0, 2, 4, 10, 12, 14, 25, 30, 35) for hour in (3, 9, 18)]
+    y = [2 if row[0] < 8 else (1 if row[0] < 20 else 0) for row in X]
+    joblib.dump(RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y), path)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CongestionClassifierTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.model_path = os.path.join(self.media_root, "congestion.joblib")
+        train_inverted_model(self.model_path)
+
+    def test_model_is_loaded_once(self):
+        model = classifier.load_model(self.model_path)
+        self.assertIs(classifier.load_model(self.model_path), model)
+        self.assertEqual(classifier.classify([30] * 10, 9, 30.0, 1.0, path=self.model_path), "LOW")
+
+    def test_falls_back_to_rules(self):
+        broken = os.path.join(self.media_root, "broken.joblib")
+        open(broken, "wb").close()
+        with self.assertLogs("traffic_app.ml.classifier", "WARNING"):
+            self.assertEqual(classifier.classify([30] * 10, 9, 30.0, 1.0, path=broken), "HIGH")
+        self.assertEqual(classifier.model_version(broken), "rules")
+        self.assertEqual(classifier.classify([30] * 10, 9, 30.0, 1.0, path="/no/such/model"), "HIGH")
+
+    def test_batch_uses_rules_for_results_without_series(self):
+        labels = classifier.classify_batch([([30] * 10, 9, 30.0, 1.0), ([], 9, 30.0, 1.0), ([0] * 5, 3, 0.0, 0.0)],
+                                           path=self.model_path)
+        self.assertEqual(labels, ["LOW", "HIGH", "HIGH"])
+
+    def test_analysis_and_stream_use_the_model(self):
+        detections = [{"car": 30}] * 10
+        with override_settings(CONGESTION_MODEL=self.model_path):
+            values = summarize_detections(300, 10, detections, {"cars": 30})
+            self.assertEqual(values["congestion"], "LOW")
+            self.assertNotEqual(result_cache.analysis_params()["congestion_model"], "rules")
+
+            window = RollingWindow(60, classify_congestion)
+            window.add({"car": 30})
+            self.assertEqual(window.summary()["congestion"], "LOW")
+        self.assertEqual(RollingWindow(60).summary()["congestion"], "LOW")
+
+    def test_reclassify_stored_results(self):
+        busy, quiet = self.make_video("busy"), self.make_video("quiet")
+        for video, count, label in ((busy, 30, "HIGH"), (quiet, 0, "LOW")):
+            result = ProcessingResult.objects.create(video=video, congestion=label,
+                                                     avg_vehicles_per_frame=count, density_score=count / 30)
+            timeseries.store_series(result, [[count, 0, 0, 0]] * 10, 30, 30.0, video.uploaded_at)
+
+        with override_settings(CONGESTION_MODEL=self.model_path):
+            with self.assertNumQueries(2):
+                labels = classify_results(ProcessingResult.objects.all())
+            self.assertEqual(labels, {busy.result.pk: "LOW", quiet.result.pk: "HIGH"})
+
+            out = io.StringIO()
+            call_command("classify_congestion", stdout=out)
+        self.assertIn("2 labels changed", out.getvalue())
+        self.assertEqual(ProcessingResult.objects.get(video=busy).congestion, "LOW")
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RetrainTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.model_dir = os.path.join(self.media_root, "versions")
+        # Stands in for the checked-in model.joblib
+        self.baseline = os.path.join(self.media_root, "model.joblib")
+        with open(self.baseline, "wb") as f:
+            f.write(b"baseline")
+        self.overrides = override_settings(CONGESTION_MODEL_DIR=self.model_dir, CONGESTION_MODEL=self.baseline)
+
+    def label(self, count, label, n=1):
+        for i in range(n):
+            video = self.make_video(f"{label}{count}-{i}")
+            result = ProcessingResult.objects.create(video=video, avg_vehicles_per_frame=count,
+                                                     density_score=count / 30, congestion_label=label,
+                                                     labelled_at=timezone.now())
+            timeseries.store_series(result, [[count + i % 3, 0, 0, 0]] * 10, 30, 30.0, video.uploaded_at)
+
+    def retrain(self, *args):
+        out = io.StringIO()
+        with self.overrides:
+            call_command("retrain_congestion", *args, "--chunk-size", "4", stdout=out)
+        return out.getvalue()
+
+    def test_warm_start_trains_on_new_labels_only(self):
+        for count, label in ((1, "LOW"), (12, "MEDIUM"), (30, "HIGH")):
+            self.label(count, label, n=5)
+        ProcessingResult.objects.create(video=self.make_video("unlabelled"))
+        self.retrain("--fresh", "--epochs", "5")
+        with self.overrides:
+            self.assertEqual(congestion_model_path(), self.baseline)
+
+        self.label(31, "HIGH", n=3)
+        output = self.retrain("--activate")
+        versions = train_model.list_versions(self.model_dir)
+        self.assertEqual([(v["version"], v["parent"], v["samples"]) for v in versions], [(1, None, 15), (2, 1, 3)])
+        self.assertEqual(versions[1]["epochs"], 1)
+        self.assertEqual(versions[1]["label_counts"], {"LOW": 0, "MEDIUM": 0, "HIGH": 3})
+        self.assertIn("Activated version 2", output)
+        with self.overrides:
+            self.assertEqual(congestion_model_path(), versions[1]["path"])
+            self.assertEqual(classify_congestion([30] * 10, 9, 30.0, 1.0), "HIGH")
+        with open(self.baseline, "rb") as f:
+            self.assertEqual(f.read(), b"baseline")
+
+        self.assertIn("nothing to train", self.retrain())
+        self.assertEqual(len(train_model.list_versions(self.model_dir)), 2)
+        report = self.retrain("--report").splitlines()
+        self.assertIn("train s", report[0])
+        self.assertEqual(len(report), 3)
+
+    def test_labelling_in_admin_sets_labelled_at(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        result = ProcessingResult.objects.create(video=self.make_video("busy"), congestion="LOW")
+        response = self.client.post(reverse("admin:traffic_app_processingresult_change", args=[result.pk]),
+                                    {"congestion_label": "HIGH"})
+        self.assertEqual(response.status_code, 302)
+        result.refresh_from_db()
+        self.assertEqual(result.congestion_label, "HIGH")
+        self.assertIsNotNone(result.labelled_at)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class MetricsTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_pipeline_and_results_are_exported(self):
+        stats = run_pipeline([np.zeros((4, 4, 3), np.uint8)] * 5, stub_detector, lambda counts: None, batch_size=2)
+        metrics.record_pipeline(stats)
+        video = self.make_video()
+        metrics.record_result(ProcessingResult(congestion="HIGH"), "cache")
+        metrics.WEBHOOK_FAILURES.inc()
+        AnalysisJob.objects.create(video=video)
+
+        text = self.client.get(reverse("traffic_app:metrics")).content.decode()
+        self.assertIn("traffic_frames_decoded_total 5\n", text)
+        self.assertIn("traffic_frames_inferred_total 5\n", text)
+        self.assertIn('traffic_inference_latency_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn("traffic_inference_latency_seconds_count 3\n", text)
+        self.assertIn('traffic_videos_processed_total{source="cache"} 1\n', text)
+        self.assertIn('traffic_congestion_total{level="HIGH"} 1\n', text)
+        self.assertIn("traffic_webhook_failures_total 1\n", text)
+        self.assertIn('traffic_analysis_jobs{status="PENDING"} 1\n', text)
+        self.assertIn("# TYPE traffic_analysis_duration_seconds histogram", text)
+
+    def test_values_are_summed_across_processes(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir, True)
+        # What another worker process left behind
+        with open(os.path.join(metrics_dir, "metrics-999999.json"), "w") as f:
+            json.dump([
+                ["traffic_frames_decoded_total", [], 10],
+                ["traffic_analysis_duration_seconds", [], [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0.5]],
+            ], f)
+
+        with override_settings(METRICS_DIR=metrics_dir):
+            metrics.FRAMES_DECODED.inc(3)
+            metrics.ANALYSIS_DURATION.observe(7)
+            metrics.flush()
+            self.assertTrue(os.path.exists(os.path.join(metrics_dir, f"metrics-{os.getpid()}.json")))
+            text = metrics.render()
+
+        self.assertIn("traffic_frames_decoded_total 13\n", text)
+        self.assertIn('traffic_analysis_duration_seconds_bucket{le="1.0"} 1\n', text)
+        self.assertIn('traffic_analysis_duration_seconds_bucket{le="10.0"} 2\n', text)
+        self.assertIn("traffic_analysis_duration_seconds_sum 7.5\n", text)
+
+
+class WebhookStandIn(BaseHTTPRequestHandler):
+    """Local stand-in for the n8n webhook; answers with server.statuses in turn."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.received.append((self.client_address, body))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class AlertOutboxTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookStandIn)
+        self.server.received = []
+        self.server.statuses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        url = f"http://127.0.0.1:{self.server.server_address[1]}/webhook/traffic-alert"
+        overrides = override_settings(N8N_WEBHOOK_URL=url, ALERT_RETRY_BASE_SECONDS=10, ALERT_MAX_ATTEMPTS=3)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # A fresh pool per test, the previous server is gone
+        alerts._session = None
+        self.addCleanup(setattr, alerts, "_session", None)
+        self.now = timezone.now()
+
+    def alert(self, location, vehicles):
+        return alerts.send_n8n_alert({"congestion": "HIGH", "total_vehicles": vehicles, "location": location})
+
+    def test_alerts_coalesce_per_location_and_share_a_connection(self):
+        self.alert("Main St", 10)
+        self.alert("Main St", 12)
+        self.alert("Harbour Rd", 7)
+        self.assertEqual(AlertOutbox.objects.count(), 2)
+        main = AlertOutbox.objects.get(location="Main St")
+        self.assertEqual((main.coalesced, main.payload["total_vehicles"]), (1, 12))
+
+        self.assertEqual(alerts.dispatch_due(now=self.now + timedelta(seconds=1)), (2, 0))
+        self.assertEqual([body["location"] for _, body in self.server.received], ["Main St", "Harbour Rd"])
+        # Kept-alive connection from the pooled session
+        self.assertEqual(len({address for address, _ in self.server.received}), 1)
+        self.assertFalse(AlertOutbox.objects.exclude(status=AlertOutbox.STATUS_SENT).exists())
+
+        # Once sent, the next alert for the location is a new one
+        self.alert("Main St", 3)
+        self.assertEqual(AlertOutbox.objects.filter(status=AlertOutbox.STATUS_PENDING).count(), 1)
+
+    def test_failed_delivery_backs_off_then_gives_up(self):
+        self.server.statuses = [500, 503, 500]
+        alert = self.alert("Main St", 10)
+
+        self.assertEqual(alerts.dispatch_due(now=self.now + timedelta(seconds=1)), (0, 1))
+        alert.refresh_from_db()
+        self.assertEqual((alert.status, alert.attempts), (AlertOutbox.STATUS_PENDING, 1))
+        self.assertIn("500", alert.last_error)
+        # Not due until the backoff has passed, then twice as long
+        self.assertEqual(alerts.dispatch_due(now=self.now + timedelta(seconds=5)), (0, 0))
+        self.assertEqual(alerts.dispatch_due(now=self.now + timedelta(seconds=12)), (0, 1))
+        alert.refresh_from_db()
+        self.assertEqual(alert.next_attempt_at, self.now + timedelta(seconds=32))
+
+        self.assertEqual(alerts.dispatch_due(now=self.now + timedelta(seconds=40)), (0, 1))
+        alert.refresh_from_db()
+        self.assertEqual((alert.status, alert.attempts), (AlertOutbox.STATUS_FAILED, 3))
+        self.assertEqual(len(self.server.received), 3)
+
+    def test_failures_reach_other_processes_metrics(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir, True)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.server.statuses = [500]
+        self.alert("Main St", 10)
+
+        with override_settings(METRICS_DIR=metrics_dir):
+            self.assertEqual(alerts.run_dispatcher(once=True), 0)
+            # What the web process serving /metrics sees
+            metrics.reset()
+            self.assertEqual(metrics.collect()[("traffic_webhook_failures_total", ())], 1)
+
+    def test_unreachable_webhook_is_retried(self):
+        self.server.shutdown()
+        self.server.server_close()
+        alert = self.alert("Main St", 10)
+        self.assertEqual(alerts.dispatch_due(now=self.now + timedelta(seconds=1)), (0, 1))
+        alert.refresh_from_db()
+        self.assertEqual(alert.status, AlertOutbox.STATUS_PENDING)
+        self.assertIn("Failed to send alert", alert.last_error)
+
+
+class StandInBroker(socketserver.ThreadingTCPServer):
+    """
+    Just enough of an MQTT 3.1.1 broker for the publisher: accepts
+    connections, acknowledges QoS 1 publishes, answers pings and records
+    (topic, payload, qos, retain) of every PUBLISH.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        self.messages = []
+        self.received = threading.Condition()
+        super().__init__(("127.0.0.1", port), StandInBrokerHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def wait_for(self, count, timeout=5.0):
+        with self.received:
+            self.received.wait_for(lambda: len(self.messages) >= count, timeout)
+        return self.messages
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StandInBrokerHandler(socketserver.BaseRequestHandler):
+    def read_exact(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def handle(self):
+        try:
+            while True:
+                header = self.read_exact(1)[0]
+                length, shift = 0, 0
+                while True:
+                    byte = self.read_exact(1)[0]
+                    length |= (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = self.read_exact(length)
+                kind = header >> 4
+                if kind == 1:  # CONNECT
+                    self.request.sendall(b"\x20\x02\x00\x00")
+                elif kind == 3:  # PUBLISH
+                    qos, retain = (header >> 1) & 3, bool(header & 1)
+                    topic_length = struct.unpack("!H", body[:2])[0]
+                    topic = body[2:2 + topic_length].decode()
+                    payload = body[2 + topic_length + (2 if qos else 0):]
+                    if qos == 1:
+                        self.request.sendall(b"\x40\x02" + body[2 + topic_length:4 + topic_length])
+                    with self.server.received:
+                        self.server.messages.append((topic, json.loads(payload), qos, retain))
+                        self.server.received.notify_all()
+                elif kind == 12:  # PINGREQ
+                    self.request.sendall(b"\xd0\x00")
+                elif kind == 14:  # DISCONNECT
+                    return
+        except (ConnectionError, OSError):
+            return
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class MqttPublisherTests(TestCase):
+    def make_publisher(self, port):
+        publisher = mqtt.MqttPublisher("127.0.0.1", port, qos=1, reconnect_delay=(0.05, 0.1), buffer_size=3)
+        self.addCleanup(publisher.close)
+        return publisher
+
+    def wait_connected(self, publisher):
+        deadline = time.monotonic() + 5
+        while not publisher.connected and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return publisher.connected
+
+    def test_publishes_result_per_camera(self):
+        broker = StandInBroker()
+        self.addCleanup(broker.stop)
+        publisher = self.make_publisher(broker.server_address[1])
+        self.assertTrue(self.wait_connected(publisher))
+
+        camera = Camera.objects.create(name="Main St North")
+        video = VideoUpload.objects.create(title="clip", video_file="uploads/clip.mp4", camera=camera)
+        result = ProcessingResult(
+            video=video, congestion="HIGH", density_score=0.8, avg_vehicles_per_frame=22.0,
+            signal_green_extension=25.0, signal_pattern="Extended green",
+            lane_stats={"north": {"green_extension": 30.0, "pattern": "Extended green", "green_share": 0.7}},
+        )
+        self.assertTrue(mqtt.publish_result(video, result, publisher))
+
+        messages = {topic: (payload, qos, retain) for topic, payload, qos, retain in broker.wait_for(2)}
+        congestion, qos, retain = messages["traffic/main-st-north/congestion"]
+        self.assertEqual((congestion["congestion"], congestion["density_score"], qos, retain), ("HIGH", 0.8, 1, True))
+        signal = messages["traffic/main-st-north/signal"][0]
+        self.assertEqual(signal["green_extension"], 25.0)
+        self.assertEqual(signal["lanes"]["north"]["green_share"], 0.7)
+
+        # Uploads without a camera have no controller to tell
+        self.assertFalse(mqtt.publish_result(VideoUpload(title="other"), result, publisher))
+
+    def test_publishing_is_timed_for_camera_videos(self):
+        camera = Camera.objects.create(name="Main St North")
+        for video_camera, stages in ((camera, {"db_write", "mqtt"}), (None, {"db_write"})):
+            video = VideoUpload.objects.create(title="clip", video_file="uploads/clip.mp4", camera=video_camera)
+            profile = AnalysisProfile(video.pk)
+            with mock.patch("traffic_app.services.mqtt.publish_result") as publish:
+                store_result(video, make_result_values(), profile)
+            self.assertEqual(set(profile.stages), stages)
+            self.assertEqual(publish.call_count, len(stages) - 1)
+
+    def test_buffers_while_broker_is_down(self):
+        port = free_port()
+        publisher = self.make_publisher(port)
+        for i in range(5):
+            self.assertFalse(publisher.publish(f"traffic/cam/{i}", {"n": i}))
+        # Bounded: the oldest messages make room
+        self.assertEqual((len(publisher.buffer), publisher.dropped), (3, 2))
+
+        broker = StandInBroker(port)
+        self.addCleanup(broker.stop)
+        messages = broker.wait_for(3)
+        self.assertEqual([payload["n"] for _, payload, _, _ in messages], [2, 3, 4])
+        self.assertTrue(publisher.connected)
+        self.assertEqual(len(publisher.buffer), 0)
+
+    def test_messages_published_during_the_flush_follow_the_buffer(self):
+        port = free_port()
+        publisher = self.make_publisher(port)
+        for i in range(2):
+            publisher.publish(f"traffic/cam/{i}", {"n": i})
+
+        send = publisher.client.publish
+
+        def publish(topic, data, **kwargs):
+            info = send(topic, data, **kwargs)
+            if topic == "traffic/cam/0":
+                # A result saved while the buffer is being sent
+                publisher.publish("traffic/cam/2", {"n": 2})
+            return info
+
+        with mock.patch.object(publisher.client, "publish", side_effect=publish):
+            broker = StandInBroker(port)
+            self.addCleanup(broker.stop)
+            messages = broker.wait_for(3)
+        self.assertEqual([payload["n"] for _, payload, _, _ in messages], [0, 1, 2])
+        self.assertTrue(publisher.connected)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+@mock.patch.object(uploads, "HASH_BLOCK_SIZE", 1000)
+class ChunkedUploadTests(MediaRootMixin, TestCase):
+    content = bytes(range(256)) * 40
+
+    def start(self, **params):
+        response = self.client.post(
+            reverse("traffic_app:upload_sessions"),
+            json.dumps(dict({"filename": "../junction.mp4", "size": len(self.content)}, **params)),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put(self, session, offset, data):
+        return self.client.put(session["url"], data, content_type="application/octet-stream",
+                               HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_chunks_are_hashed_as_they_arrive(self):
+        session = self.start(title="Junction")
+        # Chunk boundaries that do not line up with hash blocks
+        for start, end in [(0, 700), (700, 2500), (2500, 8000), (8000, len(self.content))]:
+            response = self.put(session, start, self.content[start:end])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["offset"], end)
+
+        data = response.json()
+        self.assertEqual(data["status"], UploadSession.STATUS_COMPLETE)
+        video = VideoUpload.objects.get(pk=data["video_id"])
+        self.assertEqual(video.video_file.name, "uploads/junction.mp4")
+        with open(video.video_file.path, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(video.content_hash, result_cache.hash_file(video.video_file.path, block_size=1000))
+        self.assertTrue(AnalysisJob.objects.filter(video=video).exists())
+        self.assertFalse(os.listdir(os.path.join(self.media_root, "uploads", "partial")))
+
+    def test_resume_after_dropped_connection(self):
+        session = self.start()
+        # The client promised 5000 bytes but the connection dropped after 1800
+        uploads.write_chunk(session["id"], 0, io.BytesIO(self.content[:1800]), 5000)
+
+        status = self.client.get(session["url"]).json()
+        self.assertEqual(status["offset"], 1800)
+        response = self.put(session, 0, self.content)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 1800)
+
+        self.assertEqual(self.put(session, 1800, self.content[1800:]).json()["status"], UploadSession.STATUS_COMPLETE)
+        video = VideoUpload.objects.get()
+        self.assertEqual(video.content_hash, result_cache.hash_file(video.video_file.path, block_size=1000))
+
+    def test_failed_finalisation_is_retried(self):
+        session = self.start()
+        self.put(session, 0, self.content[:8000])
+        with mock.patch("traffic_app.uploads.start_analysis", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError), self.assertLogs("django.request", "ERROR"):
+                self.put(session, 8000, self.content[8000:])
+        self.assertEqual(self.client.get(session["url"]).json()["status"], UploadSession.STATUS_UPLOADING)
+
+        for _ in range(2):
+            response = self.put(session, len(self.content), b"")
+            self.assertEqual(response.json()["status"], UploadSession.STATUS_COMPLETE)
+        video = VideoUpload.objects.get()
+        self.assertEqual(video.content_hash, result_cache.hash_file(video.video_file.path, block_size=1000))
+        self.assertEqual(AnalysisJob.objects.filter(video=video).count(), 1)
+
+    def test_chunk_is_received_outside_transactions(self):
+        session = self.start()
+        depth = len(connection.savepoint_ids)
+        depths = []
+
+        class Stream(io.BytesIO):
+            def read(self, size=-1):
+                depths.append(len(connection.savepoint_ids))
+                return super().read(size)
+
+        uploads.write_chunk(session["id"], 0, Stream(self.content[:3000]), 3000)
+        self.assertEqual(set(depths), {depth})
+        self.assertEqual(UploadSession.objects.get(pk=session["id"]).received, 3000)
+
+    def test_one_writer_at_a_time(self):
+        session = self.start()
+        with open(os.path.join(self.media_root, "uploads", "partial", f"{session['id']}.part"), "rb") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            response = self.put(session, 0, self.content[:100])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 0)
+        self.assertEqual(self.put(session, 0, self.content[:100]).json()["offset"], 100)
+
+    @override_settings(UPLOAD_PREFIX_ANALYSIS_BYTES=3000)
+    def test_prefix_analysis_starts_early(self):
+        session = self.start(analyze_prefix=True)
+        self.assertIsNone(self.put(session, 0, self.content[:2000]).json()["preview_video_id"])
+        preview_id = self.put(session, 2000, self.content[2000:4000]).json()["preview_video_id"]
+
+        preview = VideoUpload.objects.get(pk=preview_id)
+        self.assertEqual(os.path.getsize(preview.video_file.path), 4000)
+        self.assertTrue(AnalysisJob.objects.filter(video=preview).exists())
+        # One preview per upload
+        self.assertEqual(self.put(session, 4000, self.content[4000:6000]).json()["preview_video_id"], preview_id)
+
+    def test_abort_removes_partial_file(self):
+        session = self.start()
+        self.put(session, 0, self.content[:100])
+        self.assertEqual(self.client.delete(session["url"]).json()["status"], UploadSession.STATUS_ABORTED)
+        self.assertEqual(self.put(session, 100, self.content[100:200]).status_code, 409)
+        self.assertFalse(os.listdir(os.path.join(self.media_root, "uploads", "partial")))
+
+
+def has_module(name):
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+def raw_yolo_output(detections, anchors=8400):
+    """Raw YOLOv8 head output (84, anchors) with (cx, cy, w, h, cls, conf) rows set."""
+    raw = np.zeros((84, anchors), dtype=np.float32)
+    for i, (cx, cy, w, h, cls, conf) in enumerate(detections):
+        raw[:4, i] = [cx, cy, w, h]
+        raw[4 + cls, i] = conf
+    return raw
+
+
+# car, an overlapping duplicate car, a truck and a person, in 640x640 letterbox pixels
+FAKE_DETECTIONS = [
+    (320, 320, 100, 50, 2, 0.9),
+    (322, 321, 100, 50, 2, 0.8),
+    (100, 300, 80, 60, 7, 0.5),
+    (500, 330, 30, 80, 0, 0.95),
+]
+
+
+class DetectorBackendTests(SimpleTestCase):
+    def setUp(self):
+        model_registry.clear()
+        self.addCleanup(model_registry.clear)
+
+    def test_decode_output_nms_and_letterbox(self):
+        frame = np.zeros((360, 640, 3), dtype=np.uint8)
+        blob, meta = backends.letterbox(frame, (640, 640))
+        self.assertEqual(blob.shape, (3, 640, 640))
+        self.assertEqual(meta, (1.0, 0, 140))
+
+        cls, conf, xyxy = backends.decode_output(raw_yolo_output(FAKE_DETECTIONS), 0.25, meta, frame.shape)
+        self.assertEqual(cls.tolist(), [0, 2, 7])
+        np.testing.assert_allclose(xyxy[1], [270, 155, 370, 205])
+
+    @unittest.skipUnless(has_module("onnx") and has_module("onnxruntime"), "onnx and onnxruntime not installed")
+    def test_onnx_backend_behind_detect_contract(self):
+        import onnx
+        from onnx import TensorProto, helper, numpy_helper
+
+        # A "model" ignoring its input and always returning FAKE_DETECTIONS
+        raw = raw_yolo_output(FAKE_DETECTIONS)[None]
+        graph = helper.make_graph(
+            [
+                helper.make_node("ReduceMean", ["images"], ["mean"], axes=[1, 2, 3], keepdims=1),
+                helper.make_node("Reshape", ["mean", "shape"], ["mean3"]),
+                helper.make_node("Mul", ["mean3", "zero"], ["zeros"]),
+                helper.make_node("Add", ["zeros", "raw"], ["output0"]),
+            ],
+            "fake_yolo",
+            [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, 640, 640])],
+            [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["batch", 84, 8400])],
+            initializer=[
+                numpy_helper.from_array(raw, "raw"),
+                numpy_helper.from_array(np.array([-1, 1, 1], dtype=np.int64), "shape"),
+                numpy_helper.from_array(np.zeros(1, dtype=np.float32), "zero"),
+            ],
+        )
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+        model.ir_version = 8
+        path = os.path.join(tempfile.mkdtemp(), "fake.onnx")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), True)
+        onnx.save(model, path)
+
+        frames = [np.zeros((360, 640, 3), dtype=np.uint8)] * 3
+        counts = detect_vehicles_in_frames(frames, model_name=path)
+        self.assertEqual(counts, [{"car": 1, "bike": 0, "bus": 0, "truck": 1}] * 3)
+        self.assertIsInstance(model_registry.get_backend(path), backends.OnnxBackend)
+
+    @unittest.skipUnless(has_module("ultralytics") and has_module("onnxruntime"), "ultralytics and onnxruntime not installed")
+    def test_onnx_counts_match_torch(self):
+        from ultralytics.utils import ASSETS
+
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir, True)
+        onnx_path = backends.export_onnx("yolov8n.pt", output=os.path.join(export_dir, "yolov8n.onnx"))
+
+        frames = [cv2.imread(str(ASSETS / name)) for name in ("bus.jpg", "zidane.jpg")]
+        frames.append(cv2.resize(frames[0], (640, 360)))
+        torch_counts = detect_vehicles_in_frames(frames, model_name="yolov8n.pt", backend="torch")
+        onnx_counts = detect_vehicles_in_frames(frames, model_name=onnx_path, backend="onnx")
+
+        # Letterboxing differs slightly (ultralytics pads to a stride multiple,
+        # ONNX to a fixed 640x640), so allow one borderline box per type
+        for expected, actual in zip(torch_counts, onnx_counts):
+            for vehicle_type in expected:
+                self.assertLessEqual(abs(expected[vehicle_type] - actual[vehicle_type]), 1, (expected, actual))
+        self.assertEqual(torch_counts[0]["bus"], onnx_counts[0]["bus"])
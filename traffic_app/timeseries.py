@@ -0,0 +1,105 @@
+# traffic_app/timeseries.py
+"""
+Per-frame detection series stored as FrameDetection rows.
+
+Series are written in bulk once per result, and read back with range
+queries on the indexed timestamp column.
+
+Timestamps count from the start passed to store_series. Videos carry no
+recording time, so the analysis passes the upload time: for footage
+uploaded long after it was recorded, timestamps are the upload time plus
+the offset into the video, not wall-clock recording time.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+
+from .models import FrameDetection
+
+# Rows per INSERT; keeps SQLite under its variable limit
+BULK_BATCH_SIZE = 500
+
+# Compact per-frame layout used in result cache payloads
+SERIES_FIELDS = ("cars", "bikes", "trucks", "buses")
+
+
+def pack_detections(detections):
+    """
+    Convert detection dicts ({"car": n, ...}) to compact
+    [cars, bikes, trucks, buses] lists.
+    """
+    return [
+        [int(d.get("car", 0)), int(d.get("bike", 0)), int(d.get("truck", 0)), int(d.get("bus", 0))]
+        for d in detections
+    ]
+
+
+def store_series(result, series, sample_rate, fps, start):
+    """
+    Replace the stored series of a result.
+    series: packed [cars, bikes, trucks, buses] per sampled frame, where
+    sampled frame i is video frame i * sample_rate.
+    start: datetime of the first frame (the recording start if known).
+    Returns the number of rows written.
+    """
+    fps = fps or 30.0
+
+    rows = []
+    for i, (cars, bikes, trucks, buses) in enumerate(series):
+        frame_index = i * sample_rate
+        rows.append(FrameDetection(
+            result=result,
+            frame_index=frame_index,
+            timestamp=start + timedelta(seconds=frame_index / fps),
+            cars=cars,
+            bikes=bikes,
+            trucks=trucks,
+            buses=buses,
+            total=cars + bikes + trucks + buses,
+        ))
+    # Old rows stay if the new ones cannot be written
+    with transaction.atomic():
+        FrameDetection.objects.filter(result=result).delete()
+        FrameDetection.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+    return len(rows)
+
+
+def query_range(start, end, result=None):
+    """
+    Per-frame rows with start <= timestamp < end, oldest first, as
+    (timestamp, cars, bikes, trucks, buses, total) tuples.
+    Optionally limited to one result.
+    """
+    qs = FrameDetection.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    if result is not None:
+        qs = qs.filter(result=result)
+    return list(
+        qs.order_by("timestamp")
+        .values_list("timestamp", "cars", "bikes", "trucks", "buses", "total")
+    )
+
+
+def bucket_series(rows, bucket_seconds):
+    """
+    Average query_range rows into fixed time buckets for charts.
+    Returns [(bucket_start, avg_cars, avg_bikes, avg_trucks, avg_buses, avg_total), ...].
+    """
+    buckets = []
+    current = None
+    sums = None
+    n = 0
+    for timestamp, *values in rows:
+        epoch = timestamp.timestamp()
+        key = epoch - epoch % bucket_seconds
+        if key != current:
+            if current is not None:
+                buckets.append((bucket_start, *(v / n for v in sums)))
+            current = key
+            bucket_start = timestamp - timedelta(seconds=epoch - key)
+            sums = [0] * len(values)
+            n = 0
+        sums = [a + b for a, b in zip(sums, values)]
+        n += 1
+    if current is not None:
+        buckets.append((bucket_start, *(v / n for v in sums)))
+    return buckets
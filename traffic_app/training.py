@@ -0,0 +1,81 @@
+# traffic_app/training.py
+"""
+Training data for the congestion model from stored results.
+
+Samples are the results an operator labelled (congestion_label), with
+the classifier features of their per-frame series (FrameDetection rows)
+and the label as target. They are read in chunks in labelling order,
+keyset-paginated on (labelled_at, id), so only one chunk of results and
+series is in memory at a time, and a warm-started model can continue
+after the last sample its parent was trained on.
+"""
+from datetime import datetime
+from itertools import groupby
+
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
+
+from .ml import classifier
+from .models import FrameDetection, ProcessingResult
+
+LABEL_INDEX = {label: i for i, label in enumerate(classifier.LABELS)}
+
+
+def labelled_results():
+    return ProcessingResult.objects.exclude(congestion_label="").filter(labelled_at__isnull=False)
+
+
+def _after(position):
+    labelled_at, pk = position
+    return Q(labelled_at__gt=labelled_at) | Q(labelled_at=labelled_at, id__gt=pk)
+
+
+def latest_position():
+    """(labelled_at, id) of the most recently labelled result, or None."""
+    return labelled_results().order_by("-labelled_at", "-id").values_list("labelled_at", "id").first()
+
+
+def iter_chunks(since=None, until=None, chunk_size=1000):
+    """
+    Yield (X, y) arrays of labelled results after position since and up to
+    position until ((labelled_at, id) pairs, None for no bound), at most
+    chunk_size results per chunk. Results without a stored series are
+    skipped.
+    """
+    results = labelled_results().order_by("labelled_at", "id")
+    if until is not None:
+        results = results.exclude(_after(until))
+    position = since
+    while True:
+        page = results.filter(_after(position)) if position is not None else results
+        rows = list(page.values_list("id", "labelled_at", "congestion_label", "video__uploaded_at")[:chunk_size])
+        if not rows:
+            return
+        position = rows[-1][1], rows[-1][0]
+
+        series = (
+            FrameDetection.objects.filter(result_id__in=[row[0] for row in rows])
+            .order_by("result_id", "frame_index")
+            .values_list("result_id", "total")
+        )
+        counts = {pk: [total for _, total in group] for pk, group in groupby(series, key=lambda row: row[0])}
+
+        X, y = [], []
+        for pk, _, label, uploaded_at in rows:
+            if pk in counts:
+                X.append(classifier.series_features(counts[pk], timezone.localtime(uploaded_at).hour))
+                y.append(LABEL_INDEX[label])
+        if X:
+            yield np.array(X), np.array(y)
+
+
+def encode_position(position):
+    return [position[0].isoformat(), position[1]] if position else None
+
+
+def decode_position(value):
+    if not value:
+        return None
+    labelled_at, pk = value
+    return datetime.fromisoformat(labelled_at), pk
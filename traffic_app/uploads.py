@@ -0,0 +1,272 @@
+# traffic_app/uploads.py
+"""
+Chunked, resumable video uploads.
+
+    POST   /uploads/             {"filename", "size", "title"?, "camera"?, "analyze_prefix"?}
+    PUT    /uploads/<id>/        raw chunk bytes, header Upload-Offset: <byte offset>
+    GET    /uploads/<id>/        status, including the offset to resume from
+    DELETE /uploads/<id>/        abort and delete the partial file
+
+Chunks go straight from the request stream to a partial file under
+MEDIA_ROOT, in order: a chunk must start at the current offset. If the
+connection drops mid-chunk, the bytes that arrived are kept; the client
+asks for the offset and sends the rest from there.
+
+Only one chunk of an upload is written at a time: a second writer gets
+409. The lock is an exclusive flock on the partial file, held until the
+chunk is recorded. Chunks are received outside any transaction; only
+recording one is, with a conditional update.
+
+The content hash (result_cache.hash_blocks) is computed while chunks
+arrive, one digest per HASH_BLOCK_SIZE block, so a finished upload needs
+no second pass over the file. When the last byte arrives the file becomes
+a VideoUpload and is analysed (or served from the result cache) as if it
+had been posted through the form. If that fails, an empty PUT at the
+final offset retries it.
+
+With analyze_prefix, once UPLOAD_PREFIX_ANALYSIS_BYTES have arrived, that
+prefix is copied to its own VideoUpload and queued for analysis, giving
+an early estimate. This needs a container that can be read without its
+end (MPEG-TS, MKV, fragmented or "faststart" MP4).
+"""
+import fcntl
+import hashlib
+import os
+import shutil
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import enqueue_analysis
+from .models import UploadSession, VideoUpload
+from .result_cache import HASH_BLOCK_SIZE, hash_blocks
+from .services import apply_cached_result
+
+# Bytes read from the request at a time
+READ_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """A request the upload API rejects, with the HTTP status to answer."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _full_path(name):
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+
+def create_session(filename, size, title="", camera=None, analyze_prefix=False):
+    """Start an upload of `size` bytes; creates the empty partial file."""
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("size must be an integer")
+    if size <= 0:
+        raise UploadError("size must be positive")
+    if size > getattr(settings, "UPLOAD_MAX_SIZE", 20 * 1024 ** 3):
+        raise UploadError("File too large", status=413)
+    filename = os.path.basename(filename or "")
+    if not filename:
+        raise UploadError("filename is required")
+
+    session = UploadSession.objects.create(
+        filename=filename, size=size, title=title or "", camera=camera, analyze_prefix=bool(analyze_prefix),
+    )
+    path = _full_path(session.part_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    return session
+
+
+def _read_chunks(stream, length):
+    """Yield up to `length` bytes from stream; stops early if the client went away."""
+    remaining = length
+    while remaining:
+        try:
+            data = stream.read(min(READ_SIZE, remaining))
+        except OSError:
+            return
+        if not data:
+            return
+        remaining -= len(data)
+        yield data
+
+
+def _lock(f):
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise UploadError("Another chunk of this upload is being written", status=409)
+
+
+def write_chunk(session_id, offset, stream, length):
+    """
+    Write a chunk at `offset` from stream (at most `length` bytes) and
+    update the block digests. Returns the session; its `received` tells
+    how much was kept.
+    """
+    if length > getattr(settings, "UPLOAD_MAX_CHUNK_SIZE", 64 * 1024 * 1024):
+        raise UploadError("Chunk too large", status=413)
+
+    session = UploadSession.objects.get(pk=session_id)
+    if session.video_id is not None and session.status == UploadSession.STATUS_UPLOADING:
+        # All bytes are in, starting the analysis failed: retry that
+        if offset != session.received or length:
+            raise UploadError(f"Expected offset {session.received} and no data", status=409)
+        finish(session)
+        return session
+    try:
+        f = open(_full_path(session.part_path), "r+b")
+    except FileNotFoundError:
+        session.refresh_from_db()
+        raise UploadError(f"Upload is {session.status.lower()}", status=409)
+    # Closing the file releases the lock, after the chunk was recorded
+    with f:
+        _lock(f)
+        # Read and hashed outside any transaction: a slow client must not
+        # hold the database lock (all of SQLite) while its chunk arrives
+        session.refresh_from_db()
+        if session.status != UploadSession.STATUS_UPLOADING:
+            raise UploadError(f"Upload is {session.status.lower()}", status=409)
+        if offset != session.received:
+            raise UploadError(f"Expected offset {session.received}", status=409)
+        if offset + length > session.size:
+            raise UploadError("Chunk goes past the declared size")
+
+        digests = list(session.block_digests)
+        # Hash state of the unfinished block: re-read its start from disk
+        filled = offset % HASH_BLOCK_SIZE
+        f.seek(offset - filled)
+        hasher = hashlib.sha256(f.read(filled))
+        f.seek(offset)
+        f.truncate()
+
+        received = offset
+        for data in _read_chunks(stream, length):
+            f.write(data)
+            received += len(data)
+            view = memoryview(data)
+            while view:
+                take = min(HASH_BLOCK_SIZE - filled, len(view))
+                hasher.update(view[:take])
+                filled += take
+                view = view[take:]
+                if filled == HASH_BLOCK_SIZE:
+                    digests.append(hasher.hexdigest())
+                    hasher = hashlib.sha256()
+                    filled = 0
+        f.flush()
+
+        # Only by the call that received the last bytes; a retry has
+        # the digest already
+        if received == session.size and filled and received > offset:
+            digests.append(hasher.hexdigest())
+
+        with transaction.atomic():
+            # Unless aborted meanwhile; if this fails, the bytes past the
+            # recorded offset are overwritten by the client's retry
+            recorded = UploadSession.objects.filter(
+                pk=session.pk, status=UploadSession.STATUS_UPLOADING, received=offset,
+            ).update(received=received, block_digests=digests, updated_at=timezone.now())
+            if not recorded:
+                session.refresh_from_db()
+                raise UploadError(f"Upload is {session.status.lower()}", status=409)
+            session.received = received
+            session.block_digests = digests
+            if session.received == session.size and session.video_id is None:
+                complete(session)
+
+    if session.received == session.size:
+        finish(session)
+    elif session.analyze_prefix and session.preview_id is None:
+        preview = start_prefix_analysis(session)
+        if preview is not None:
+            start_analysis(preview)
+    return session
+
+
+def start_analysis(video):
+    """
+    Reuse a cached result for identical contents, or queue the analysis.
+    Returns the AnalysisJob, or None when the cached result was used.
+    """
+    if apply_cached_result(video) is None:
+        return enqueue_analysis(video)
+    return None
+
+
+def content_hash(session):
+    return hash_blocks(bytes.fromhex(digest) for digest in session.block_digests)
+
+
+def _video_name(filename, suffix=""):
+    stem, ext = os.path.splitext(filename)
+    return default_storage.get_available_name(f"uploads/{stem}{suffix}{ext}")
+
+
+def complete(session):
+    """Move the finished file into place and create its VideoUpload."""
+    name = _video_name(session.filename)
+    os.makedirs(os.path.dirname(_full_path(name)), exist_ok=True)
+    os.replace(_full_path(session.part_path), _full_path(name))
+    try:
+        video = VideoUpload.objects.create(
+            title=session.title, video_file=name, camera=session.camera, content_hash=content_hash(session),
+        )
+        session.video = video
+        session.save(update_fields=["video", "updated_at"])
+    except BaseException:
+        # Rolled back: keep the upload resumable
+        os.replace(_full_path(name), _full_path(session.part_path))
+        raise
+    return video
+
+
+def finish(session):
+    """
+    Start the analysis of a completed upload's video, unless a job or
+    result already exists, and mark the upload complete. Safe to retry.
+    """
+    video = session.video
+    if not video.processed and not video.jobs.exists():
+        start_analysis(video)
+    session.status = UploadSession.STATUS_COMPLETE
+    session.save(update_fields=["status", "updated_at"])
+
+
+def start_prefix_analysis(session):
+    """
+    Once enough has arrived, copy the received prefix to its own
+    VideoUpload and return it. None before that.
+    """
+    threshold = getattr(settings, "UPLOAD_PREFIX_ANALYSIS_BYTES", 64 * 1024 * 1024)
+    if session.received < threshold:
+        return None
+
+    name = _video_name(session.filename, "-prefix")
+    os.makedirs(os.path.dirname(_full_path(name)), exist_ok=True)
+    with open(_full_path(session.part_path), "rb") as src, open(_full_path(name), "wb") as dst:
+        shutil.copyfileobj(src, dst)
+        dst.truncate(session.received)
+
+    title = f"{session.title or session.filename} (first {session.received * 100 // session.size}%)"
+    preview = VideoUpload.objects.create(title=title, video_file=name, camera=session.camera)
+    session.preview = preview
+    session.save(update_fields=["preview", "updated_at"])
+    return preview
+
+
+def abort(session):
+    if session.status == UploadSession.STATUS_UPLOADING:
+        try:
+            os.remove(_full_path(session.part_path))
+        except FileNotFoundError:
+            pass
+        session.status = UploadSession.STATUS_ABORTED
+        session.save(update_fields=["status", "updated_at"])
+    return session
@@ -7,5 +7,14 @@ app_name = "traffic_app"
 urlpatterns = [
     path("", views.upload_view, name="upload"),
     path("processing/<int:pk>/", views.processing_view, name="processing"),
+    path("jobs/<int:pk>/status/", views.job_status_view, name="job_status"),
     path("results/<int:pk>/", views.results_view, name="results"),
+    path("dashboard/", views.dashboard_view, name="dashboard"),
+    path("metrics", views.metrics_view, name="metrics"),
+    path("uploads/", views.upload_sessions_view, name="upload_sessions"),
+    path("uploads/<uuid:upload_id>/", views.upload_session_view, name="upload_session"),
+    path("api/videos/", views.api_videos_view, name="api_videos"),
+    path("api/jobs/", views.api_jobs_view, name="api_jobs"),
+    path("api/results/", views.api_results_view, name="api_results"),
+    path("api/results/<int:video_id>/", views.api_result_view, name="api_result"),
 ]
@@ -1,64 +1,17 @@
-# traffic_app/views.py
-import os
 import json
-import requests
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
-from django.conf import settings
-from datetime import datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 
 from .forms import VideoUploadForm
-from .models import VideoUpload, ProcessingResult
-
-from .processing.extract_frames import extract_and_sample_frames
-from .processing.compute_density import analyze_sampled_frames, compute_congestion
-
-from .analysis import predict_clearing_time, traffic_signal_recommendation
-from .processing.signal_optimizer import optimize_signal_timing
-
-
-def send_n8n_alert(result_data):
-    """
-    Send alert to n8n webhook when high congestion is detected
-    """
-    # Configure your n8n webhook URL in settings or here
-    N8N_WEBHOOK_URL = getattr(settings, 'N8N_WEBHOOK_URL', 
-                               'http://localhost:5678/webhook/traffic-alert')
-    
-    try:
-        payload = {
-            "timestamp": datetime.now().isoformat(),
-            "congestion_level": result_data.get("congestion"),
-            "density_score": result_data.get("density_score"),
-            "total_vehicles": result_data.get("total_vehicles"),
-            "avg_vehicles_per_frame": result_data.get("avg_vehicles_per_frame"),
-            "clearing_time": result_data.get("clearing_time"),
-            "signal_recommendation": result_data.get("signal_recommendation"),
-            "location": result_data.get("location", "Unknown"),
-            "vehicle_breakdown": {
-                "cars": result_data.get("count_cars"),
-                "bikes": result_data.get("count_bikes"),
-                "trucks": result_data.get("count_trucks"),
-                "buses": result_data.get("count_buses")
-            }
-        }
-        
-        response = requests.post(
-            N8N_WEBHOOK_URL,
-            json=payload,
-            timeout=5
-        )
-        
-        if response.status_code == 200:
-            print("✓ Alert sent to n8n successfully")
-            return True
-        else:
-            print(f"✗ n8n webhook returned status: {response.status_code}")
-            return False
-            
-    except requests.exceptions.RequestException as e:
-        print(f"✗ Failed to send alert to n8n: {e}")
-        return False
+from .models import Camera, UploadSession, VideoUpload, AnalysisJob
+from .jobs import enqueue_analysis
+from .services import apply_cached_result
+from . import api, dashboard, metrics, uploads
 
 
 def upload_view(request):
@@ -69,69 +22,14 @@ def upload_view(request):
         if form.is_valid():
             video = form.save()
 
-            # Process video
-            total_frames, sampled_count, detections, breakdown = extract_and_sample_frames(
-                video.video_file.path
-            )
-
-            # Calculate totals
-            car_count = int(breakdown.get("cars", 0))
-            bike_count = int(breakdown.get("bikes", 0))
-            truck_count = int(breakdown.get("trucks", 0))
-            bus_count = int(breakdown.get("buses", 0))
-
-            total_vehicles = car_count + bike_count + truck_count + bus_count
-            avg_per_frame = total_vehicles / sampled_count if sampled_count else 0.0
-
-            # Density and congestion
-            per_frame_totals = [sum(d.values()) for d in (detections or [])] if detections else []
-            density = analyze_sampled_frames(per_frame_totals) if per_frame_totals else 0.0
-            congestion = compute_congestion(avg_per_frame, density)
-
-            # Predictions and recommendations
-            clearing_time = predict_clearing_time(avg_per_frame, density)
-            signal_suggestion = traffic_signal_recommendation(density)
-            green_ext, pattern = optimize_signal_timing(density, avg_per_frame)
-
-            # Save results
-            res, _ = ProcessingResult.objects.get_or_create(video=video)
-            res.total_frames = total_frames
-            res.sampled_frames = sampled_count
-            res.total_vehicles = total_vehicles
-            res.avg_vehicles_per_frame = avg_per_frame
-            res.density_score = density
-            res.congestion = congestion
-            res.count_cars = car_count
-            res.count_bikes = bike_count
-            res.count_trucks = truck_count
-            res.count_buses = bus_count
-            res.clearing_time = clearing_time
-            res.signal_recommendation = signal_suggestion
-            res.signal_green_extension = float(green_ext)
-            res.signal_pattern = pattern
-            res.save()
-
-            video.processed = True
-            video.save()
-
-            # Send alert if congestion is MEDIUM or HIGH
-            if congestion in ["MEDIUM", "HIGH"]:
-                alert_data = {
-                    "congestion": congestion,
-                    "density_score": density,
-                    "total_vehicles": total_vehicles,
-                    "avg_vehicles_per_frame": avg_per_frame,
-                    "clearing_time": clearing_time,
-                    "signal_recommendation": signal_suggestion,
-                    "count_cars": car_count,
-                    "count_bikes": bike_count,
-                    "count_trucks": truck_count,
-                    "count_buses": bus_count,
-                    "location": video.title or "Traffic Camera"
-                }
-                send_n8n_alert(alert_data)
-
-            return redirect(reverse("traffic_app:results", args=[video.id]))
+            # Same clip analysed before with the same settings: reuse the result
+            if apply_cached_result(video) is not None:
+                return redirect(reverse("traffic_app:results", args=[video.id]))
+
+            # Queue analysis for the background worker and return immediately
+            enqueue_analysis(video)
+
+            return redirect(reverse("traffic_app:processing", args=[video.id]))
 
     return render(request, "traffic_app/upload.html", {"form": form})
 
@@ -142,64 +40,21 @@ def processing_view(request, pk):
     if video.processed and hasattr(video, "result"):
         return redirect(reverse("traffic_app:results", args=[video.id]))
 
-    video_path = os.path.join(settings.MEDIA_ROOT, video.video_file.name)
-
-    total_frames, sampled_count, detections, breakdown = extract_and_sample_frames(video_path)
-
-    car_count = int(breakdown.get("cars", 0))
-    bike_count = int(breakdown.get("bikes", 0))
-    truck_count = int(breakdown.get("trucks", 0))
-    bus_count = int(breakdown.get("buses", 0))
-
-    total_vehicles = car_count + bike_count + truck_count + bus_count
-    avg_per_frame = total_vehicles / sampled_count if sampled_count else 0.0
-
-    per_frame_totals = [sum(d.values()) for d in (detections or [])] if detections else []
-    density = analyze_sampled_frames(per_frame_totals) if per_frame_totals else 0.0
-    congestion = compute_congestion(avg_per_frame, density)
-
-    clearing_time = predict_clearing_time(avg_per_frame, density)
-    signal_suggestion = traffic_signal_recommendation(density)
-    green_ext, pattern = optimize_signal_timing(density, avg_per_frame)
-
-    res, _ = ProcessingResult.objects.get_or_create(video=video)
-    res.total_frames = total_frames
-    res.sampled_frames = sampled_count
-    res.total_vehicles = total_vehicles
-    res.avg_vehicles_per_frame = avg_per_frame
-    res.density_score = density
-    res.congestion = congestion
-    res.count_cars = car_count
-    res.count_bikes = bike_count
-    res.count_trucks = truck_count
-    res.count_buses = bus_count
-    res.clearing_time = clearing_time
-    res.signal_recommendation = signal_suggestion
-    res.signal_green_extension = float(green_ext)
-    res.signal_pattern = pattern
-    res.save()
-
-    video.processed = True
-    video.save()
-
-    # Send alert if needed
-    if congestion in ["MEDIUM", "HIGH"]:
-        alert_data = {
-            "congestion": congestion,
-            "density_score": density,
-            "total_vehicles": total_vehicles,
-            "avg_vehicles_per_frame": avg_per_frame,
-            "clearing_time": clearing_time,
-            "signal_recommendation": signal_suggestion,
-            "count_cars": car_count,
-            "count_bikes": bike_count,
-            "count_trucks": truck_count,
-            "count_buses": bus_count,
-            "location": video.title or "Traffic Camera"
-        }
-        send_n8n_alert(alert_data)
+    job = video.jobs.order_by("-created_at", "-id").first()
+    if job is None:
+        job = enqueue_analysis(video)
 
-    return redirect(reverse("traffic_app:results", args=[video.id]))
+    context = {
+        "video": video,
+        "job": job,
+    }
+
+    return render(request, "traffic_app/processing.html", context)
+
+
+def job_status_view(request, pk):
+    job = get_object_or_404(AnalysisJob, pk=pk)
+    return JsonResponse(api.job_data(job))
 
 
 def results_view(request, pk):
@@ -224,4 +79,146 @@ def results_view(request, pk):
         "vehicle_percentages": vehicle_percentages
     }
     
-    return render(request, "traffic_app/results.html", context)
\ No newline at end of file
+    return render(request, "traffic_app/results.html", context)
+
+
+def dashboard_view(request):
+    """Congestion history, per-camera figures and all results, newest first."""
+    default_days = getattr(settings, "DASHBOARD_DAYS", 30)
+    try:
+        days = min(max(int(request.GET.get("days", default_days)), 1), 365)
+    except ValueError:
+        days = default_days
+    cursor = request.GET.get("after") or None
+
+    context = dashboard.dashboard_data(days, cursor)
+    context.update({"days": days, "cursor": cursor})
+    return render(request, "traffic_app/dashboard.html", context)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, summed over all processes (see metrics.py)."""
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def upload_session_data(session):
+    data = {
+        "id": str(session.pk),
+        "filename": session.filename,
+        "size": session.size,
+        "offset": session.received,
+        "status": session.status,
+        "url": reverse("traffic_app:upload_session", args=[session.pk]),
+        "video_id": session.video_id,
+        "processing_url": None,
+        "preview_video_id": session.preview_id,
+    }
+    if session.video_id:
+        data["processing_url"] = reverse("traffic_app:processing", args=[session.video_id])
+    return data
+
+
+# API clients send no CSRF token (see uploads.py for the protocol)
+@csrf_exempt
+@require_http_methods(["POST"])
+def upload_sessions_view(request):
+    if request.content_type == "application/json":
+        try:
+            params = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+    else:
+        params = request.POST
+
+    camera = None
+    if params.get("camera"):
+        camera = Camera.objects.filter(pk=params["camera"]).first()
+        if camera is None:
+            return JsonResponse({"error": "Unknown camera"}, status=400)
+    analyze_prefix = params.get("analyze_prefix") in (True, "true", "1", "on")
+
+    try:
+        session = uploads.create_session(
+            params.get("filename"), params.get("size"), params.get("title", ""), camera, analyze_prefix,
+        )
+    except uploads.UploadError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    return JsonResponse(upload_session_data(session), status=201)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "PUT", "PATCH", "DELETE"])
+def upload_session_view(request, upload_id):
+    session = get_object_or_404(UploadSession, pk=upload_id)
+
+    if request.method == "DELETE":
+        return JsonResponse(upload_session_data(uploads.abort(session)))
+    if request.method == "GET":
+        return JsonResponse(upload_session_data(session))
+
+    try:
+        offset = int(request.headers["Upload-Offset"])
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Upload-Offset and Content-Length headers are required"}, status=400)
+    try:
+        # Read from the request stream, never request.body: chunks are not buffered in memory
+        session = uploads.write_chunk(session.pk, offset, request, length)
+    except uploads.UploadError as e:
+        data = upload_session_data(UploadSession.objects.get(pk=session.pk))
+        data["error"] = str(e)
+        return JsonResponse(data, status=e.status)
+    return JsonResponse(upload_session_data(session))
+
+
+# API clients send no CSRF token (see api.py for the endpoints)
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_videos_view(request):
+    try:
+        if request.content_type == "application/json":
+            try:
+                params = json.loads(request.body or b"{}")
+            except ValueError:
+                raise api.ApiError("Invalid JSON")
+            items = params.get("videos") if isinstance(params, dict) else None
+            if not isinstance(items, list):
+                raise api.ApiError("videos must be a list")
+            submissions = [lambda item=item: api.submit_item(item) for item in items]
+        else:
+            title, camera = request.POST.get("title", ""), request.POST.get("camera")
+            submissions = [
+                lambda f=f: api.submit_file(f, title, camera) for f in request.FILES.getlist("video_file")
+            ]
+        data, status = api.submit(submissions)
+    except api.ApiError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    return JsonResponse(data, status=status)
+
+
+@require_http_methods(["GET", "HEAD"])
+def api_jobs_view(request):
+    try:
+        data = api.jobs_status(api.parse_ids(request.GET.get("ids")))
+    except api.ApiError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    return api.json_response(request, data)
+
+
+@require_http_methods(["GET", "HEAD"])
+def api_results_view(request):
+    try:
+        data = api.results_page(request.GET)
+    except api.ApiError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    return api.json_response(request, data)
+
+
+@require_http_methods(["GET", "HEAD"])
+def api_result_view(request, video_id):
+    try:
+        fields = api.parse_fields(request.GET.get("fields"))
+    except api.ApiError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    result = get_object_or_404(api.result_queryset(fields), video_id=video_id)
+    return api.json_response(request, api.result_data(result, fields))